@@ -0,0 +1,129 @@
+import functools
+import re
+from typing import Dict, Sequence, Tuple
+
+import numpy as np
+
+
+def create_column_letters(column_count: int) -> Tuple[str, ...]:
+    """Get the letters of every column up to column_count, indexed by column number from 1."""
+    column_letters = [""]
+    for column in range(1, column_count + 1):
+        column_str = ""
+        while column > 0:
+            column, remainder = divmod(column - 1, 26)
+            column_str = chr(65 + remainder) + column_str
+        column_letters.append(column_str)
+    return tuple(column_letters)
+
+
+class AddressCodec:
+    """Convert between A1 addresses and column and row numbers with precomputed tables.
+
+    Letters of all 16,384 Excel columns are computed once, addresses are parsed with a
+    compiled pattern and range strings are cached, batches go through NumPy arrays.
+    Inputs outside of these tables take the general path, with the same results.
+    """
+
+    MAX_COLUMN = 16384
+    RANGE_CACHE_SIZE = 4096
+
+    COLUMN_LETTERS: Tuple[str, ...] = create_column_letters(MAX_COLUMN)
+    COLUMN_NUMBERS: Dict[str, int] = {
+        letters: column for column, letters in enumerate(COLUMN_LETTERS) if letters
+    }
+    COLUMN_LETTER_ARRAY = np.array(COLUMN_LETTERS)
+    COORDINATE_PATTERN = re.compile(r"\$?([A-Za-z]{1,3})\$?([0-9]+)")
+
+    @staticmethod
+    def encode_column(column: int) -> str:
+        if 0 < column <= AddressCodec.MAX_COLUMN:
+            return AddressCodec.COLUMN_LETTERS[column]
+        column_str = ""
+        while column > 0:
+            column, remainder = divmod(column - 1, 26)
+            column_str = chr(65 + remainder) + column_str
+        return column_str
+
+    @staticmethod
+    def decode_column(column_str: str) -> int:
+        column = AddressCodec.COLUMN_NUMBERS.get(column_str)
+        if column is not None:
+            return column
+        column = 0
+        for char in column_str:
+            column = column * 26 + (ord(char.upper()) - ord("A") + 1)
+        return column
+
+    @staticmethod
+    def encode(column: int, row: int) -> str:
+        return f"{AddressCodec.encode_column(column)}{row}"
+
+    @staticmethod
+    def decode(cell_coordinate: str) -> Tuple[int, int]:
+        """Get the column and row of an address such as "B3" or "$B$3"."""
+        match = AddressCodec.COORDINATE_PATTERN.fullmatch(cell_coordinate)
+        if match is not None:
+            column_str, row_str = match.groups()
+        else:
+            # Keep the letters and digits of anything else, as addresses were always read
+            column_str = "".join(filter(str.isalpha, cell_coordinate))
+            row_str = "".join(filter(str.isdigit, cell_coordinate))
+        return AddressCodec.decode_column(column_str), int(row_str)
+
+    @staticmethod
+    @functools.lru_cache(maxsize=RANGE_CACHE_SIZE)
+    def decode_range(
+        cell_range: str,
+    ) -> Tuple[int, int, int, int, bool]:
+        """Get the first column and row, last column and row of a range and whether it spans whole columns.
+
+        Whole columns such as "A:B" cover rows 1 to 3, as the series they hold are found from their first rows.
+        """
+        if ":" not in cell_range:
+            cell_range = cell_range + ":" + cell_range
+
+        cell_start, cell_end = cell_range.split(":")
+
+        is_column_range = cell_start.isalpha() and cell_end.isalpha()
+        if is_column_range:
+            cell_start = cell_start + "1"
+            cell_end = cell_end + "3"
+
+        cell_start_column, cell_start_row = AddressCodec.decode(cell_start)
+        cell_end_column, cell_end_row = AddressCodec.decode(cell_end)
+        return (
+            cell_start_column,
+            cell_start_row,
+            cell_end_column,
+            cell_end_row,
+            is_column_range,
+        )
+
+    @staticmethod
+    def encode_batch(columns: Sequence[int], rows: Sequence[int]) -> np.ndarray:
+        """Get the addresses of arrays of columns and rows, as an array of strings."""
+        column_array = np.asarray(columns, dtype=np.int64)
+        row_array = np.asarray(rows, dtype=np.int64)
+        if column_array.size and (
+            column_array.min() < 1 or column_array.max() > AddressCodec.MAX_COLUMN
+        ):
+            raise ValueError(f"Columns must be between 1 and {AddressCodec.MAX_COLUMN}")
+        return np.char.add(
+            AddressCodec.COLUMN_LETTER_ARRAY[column_array], row_array.astype(str)
+        )
+
+    @staticmethod
+    def decode_batch(cell_coordinates: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """Get the columns and rows of an array of addresses such as "B3", as two integer arrays."""
+        coordinate_array = np.char.upper(
+            np.char.replace(np.asarray(cell_coordinates, dtype=str), "$", "")
+        )
+        column_strs = np.char.rstrip(coordinate_array, "0123456789")
+        row_strs = np.char.lstrip(coordinate_array, "ABCDEFGHIJKLMNOPQRSTUVWXYZ")
+        columns = np.fromiter(
+            (AddressCodec.decode_column(column_str) for column_str in column_strs),
+            dtype=np.int64,
+            count=len(column_strs),
+        )
+        return columns, row_strs.astype(np.int64)
@@ -1,5 +1,7 @@
 import xlcalculator
 
+from instrumentation import Instrumentation
+
 
 class FormulaParser:
 
@@ -7,4 +9,5 @@ class FormulaParser:
     def parse_formula(formula: str) -> xlcalculator.ast_nodes.ASTNode:
         parser = xlcalculator.parser.FormulaParser()
         ast = parser.parse(formula=formula, named_ranges={})
+        Instrumentation.count("formulas_parsed")
         return ast
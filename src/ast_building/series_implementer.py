@@ -1,70 +1,15 @@
 import xlcalculator
-from objects import Cell, Worksheet, Series, SeriesRange
+from objects import SeriesRange, SeriesRangeReference
+from ast_building.series_range_node import SeriesRangeNode
 from excel_utils import ExcelUtils
-
-from typing import Optional
-
-
-class SeriesMappingAccessor:
-    def __init__(self, series_mapping: dict[Worksheet, dict[Cell, Series]]) -> None:
-        self.series_mapping = series_mapping
-
-    def get_series_from_cell(
-        self, worksheet: Worksheet, cell: Cell
-    ) -> Optional[Series]:
-        try:
-            return self.series_mapping[worksheet][cell]
-        except KeyError:
-            return None
+from series_extraction.series_mapper import SeriesIntervalIndex
 
 
 class SeriesImplementer:
 
-    def __init__(
-        self, series_mapping: dict[Worksheet, dict[Cell, Series]], sheet_name: str
-    ) -> None:
+    def __init__(self, series_index: SeriesIntervalIndex, sheet_name: str) -> None:
         self.sheet_name = sheet_name
-        self.accessor = SeriesMappingAccessor(series_mapping)
-
-    @staticmethod
-    def get_cells_between(cell_start: Cell, cell_end: Cell) -> list[Cell]:
-        cells = [
-            Cell(row=row, column=column)
-            for row in range(cell_start.row, cell_end.row + 1)
-            for column in range(cell_start.column, cell_end.column + 1)
-        ]
-        return cells
-
-    def create_cell(self, column: int, row: int, sheet_name: str) -> Cell:
-        return Cell(
-            column=column,
-            row=row,
-            sheet_name=sheet_name,
-            coordinate=None,
-            value=None,
-            value_type=None,
-        )
-
-    def get_series_list(
-        self, cells_in_range: list[Cell], worksheet: Worksheet
-    ) -> list[Series]:
-        return [
-            self.accessor.get_series_from_cell(worksheet, cell)
-            for cell in cells_in_range
-        ]
-
-    def filter_series_list(self, series_list: list[Series]) -> list[Series]:
-        return [series for series in series_list if series is not None]
-
-    def create_series_range(
-        self, filtered_series_list: list[Series], is_column_range: bool
-    ) -> SeriesRange:
-        return SeriesRange(
-            series=[item[1] for item in filtered_series_list],
-            start_index=filtered_series_list[0][0],
-            end_index=filtered_series_list[-1][0],
-            is_column_range=is_column_range,
-        )
+        self.series_index = series_index
 
     def get_series_range_from_cell_range(
         self, sheet_name: str, cell_range: str
@@ -79,19 +24,21 @@ class SeriesImplementer:
             is_column_range,
         ) = ExcelUtils.get_coordinates_from_range(cell_range)
 
-        cell_start = self.create_cell(cell_start_column, cell_start_row, sheet_name)
-        cell_end = self.create_cell(cell_end_column, cell_end_row, sheet_name)
-
-        cells_in_range = self.get_cells_between(cell_start, cell_end)
-        worksheet = Worksheet(sheet_name=sheet_name)
-        series_list = self.get_series_list(cells_in_range, worksheet)
-        filtered_series_list = self.filter_series_list(series_list)
-        series_range = self.create_series_range(filtered_series_list, is_column_range)
+        series_range = self.series_index.get_series_range(
+            sheet_name,
+            cell_start_column,
+            cell_start_row,
+            cell_end_column,
+            cell_end_row,
+            is_column_range,
+        )
+        if series_range is None:
+            raise ValueError(f"No series in range {cell_range} of sheet {sheet_name}")
 
         return series_range
 
     @staticmethod
-    def get_series_ids_from_series_range(series_range: SeriesRange) -> str:
+    def get_series_range_reference(series_range: SeriesRange) -> SeriesRangeReference:
         series_ids = [series.series_id for series in series_range.series]
         series_ids_unique = list(set(series_ids))
 
@@ -100,25 +47,14 @@ class SeriesImplementer:
             key=lambda x: (x.series_header_cell_column, x.series_header),
         )
 
-        series_ids_sorted_strings = tuple([str(sid) for sid in series_ids_sorted])
-
         if series_range.is_column_range:
-            return str(
-                tuple(
-                    [
-                        series_ids_sorted_strings,
-                        tuple([None, None]),
-                    ]
-                )
+            return SeriesRangeReference(
+                series_ids=tuple(series_ids_sorted), indexes=(None, None)
             )
 
-        return str(
-            tuple(
-                [
-                    series_ids_sorted_strings,
-                    tuple([series_range.start_index, series_range.end_index]),
-                ]
-            )
+        return SeriesRangeReference(
+            series_ids=tuple(series_ids_sorted),
+            indexes=(series_range.start_index, series_range.end_index),
         )
 
     def update_ast(
@@ -147,13 +83,7 @@ class SeriesImplementer:
             cell_range=cell_range, sheet_name=sheet_name
         )
 
-        series_ids = self.get_series_ids_from_series_range(series_range)
-
-        return xlcalculator.ast_nodes.RangeNode(
-            xlcalculator.tokenizer.f_token(
-                tvalue=series_ids, ttype="operand", tsubtype="range"
-            )
-        )
+        return SeriesRangeNode(self.get_series_range_reference(series_range))
 
     def replace_function_node(
         self, node: xlcalculator.ast_nodes.FunctionNode
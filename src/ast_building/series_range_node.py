@@ -0,0 +1,18 @@
+import xlcalculator
+
+from objects import SeriesRangeReference
+
+
+class SeriesRangeNode(xlcalculator.ast_nodes.RangeNode):
+    """Range node whose value is a SeriesRangeReference instead of an Excel address."""
+
+    def __init__(self, reference: SeriesRangeReference):
+        super().__init__(
+            xlcalculator.tokenizer.f_token(
+                tvalue=reference, ttype="operand", tsubtype="range"
+            )
+        )
+
+    @property
+    def reference(self) -> SeriesRangeReference:
+        return self.tvalue
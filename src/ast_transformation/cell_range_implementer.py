@@ -1,17 +1,25 @@
 import xlcalculator
-import ast
-from typing import Dict, List, Tuple, Optional, Union
-
-from objects import Cell, CellRange, Column, CellRangeColumn, Series
+from typing import Dict, List, Optional, Sequence, Union
+
+from objects import (
+    Cell,
+    CellRange,
+    Column,
+    CellRangeColumn,
+    Series,
+    SeriesId,
+    SeriesRangeReference,
+)
 
 from excel_utils import ExcelUtils
-from ast_transformation.formula_generator_old import SeriesIdLoader
+from series_extraction.series_registry import SeriesRegistry
 
 
 class CellRangeImplementer:
 
     def __init__(self, series_dict: Dict[str, List[Series]]):
         self.series_dict = series_dict
+        self.series_registry = SeriesRegistry(series_dict)
 
     def merge_cell_ranges(self, cell_ranges: List[CellRange]) -> CellRange:
 
@@ -23,17 +31,11 @@ class CellRangeImplementer:
         start_cell = Cell(
             column=min_column,
             row=min_row,
-            coordinate=ExcelUtils.get_coordinate_from_column_and_row(
-                min_column, min_row
-            ),
             sheet_name=cell_ranges[0].start_cell.sheet_name,
         )
         end_cell = Cell(
             column=max_column,
             row=max_row,
-            coordinate=ExcelUtils.get_coordinate_from_column_and_row(
-                max_column, max_row
-            ),
             sheet_name=cell_ranges[0].start_cell.sheet_name,
         )
 
@@ -52,17 +54,11 @@ class CellRangeImplementer:
             start_cell=Cell(
                 row=cell_row + start_index,
                 column=cell_column,
-                coordinate=ExcelUtils.get_coordinate_from_column_and_row(
-                    cell_column, cell_row + start_index
-                ),
                 sheet_name=sheet_name,
             ),
             end_cell=Cell(
                 row=cell_row + start_index,
                 column=cell_column,
-                coordinate=ExcelUtils.get_coordinate_from_column_and_row(
-                    cell_column, cell_row + start_index
-                ),
                 sheet_name=sheet_name,
             ),
         )
@@ -79,43 +75,34 @@ class CellRangeImplementer:
             start_cell=Cell(
                 row=cell_row,
                 column=cell_column + start_index,
-                coordinate=ExcelUtils.get_coordinate_from_column_and_row(
-                    cell_column + start_index, cell_row
-                ),
                 sheet_name=sheet_name,
             ),
             end_cell=Cell(
                 row=cell_row,
                 column=cell_column + start_index,
-                coordinate=ExcelUtils.get_coordinate_from_column_and_row(
-                    cell_column + start_index, cell_row
-                ),
                 sheet_name=sheet_name,
             ),
         )
 
-    def get_cell_range_from_series_tuple(
-        self, series_tuple: Tuple[List[str], Tuple[int, int]]
+    def get_cell_range_from_series_range_reference(
+        self, reference: SeriesRangeReference
     ) -> Union[CellRange, CellRangeColumn]:
 
-        series_ids_string, indexes = series_tuple
-        series_start_index, series_end_index = indexes
+        series_start_index, series_end_index = reference.indexes
 
-        if series_start_index is None and series_end_index is None:
-            return self.process_series_columns(series_ids_string)
+        if reference.is_column_range:
+            return self.process_series_columns(reference.series_ids)
 
         return self.process_series_cells(
-            series_ids_string, series_start_index, series_end_index
+            reference.series_ids, series_start_index, series_end_index
         )
 
-    def process_series_columns(self, series_ids_string: List[str]) -> CellRangeColumn:
+    def process_series_columns(self, series_ids: Sequence[SeriesId]) -> CellRangeColumn:
         column_values = []
 
-        sheet_name = SeriesIdLoader.load_series_id_from_string(
-            series_ids_string[0]
-        ).sheet_name
-        for series_id_string in series_ids_string:
-            column_value = self.get_column_from_series_id(series_id_string)
+        sheet_name = series_ids[0].sheet_name
+        for series_id in series_ids:
+            column_value = self.get_column_from_series_id(series_id)
             column_values.append(column_value)
 
         sorted_column_values = sorted(column_values, key=lambda x: x.column_number)
@@ -125,34 +112,27 @@ class CellRangeImplementer:
             sheet_name=sheet_name,
         )
 
-    def get_column_from_series_id(self, series_id_string: str) -> Column:
-        series_id = SeriesIdLoader.load_series_id_from_string(series_id_string)
-        sheet_name = series_id.sheet_name
-        series_list = self.series_dict.get(sheet_name)
-
-        for series in series_list:
-            if series.series_id == series_id:
-                column_value = series.series_starting_cell.column
-                return Column(
-                    column_number=column_value,
-                    column_letter=ExcelUtils.get_column_letter_from_number(
-                        column_value
-                    ),
-                )
+    def get_column_from_series_id(self, series_id: SeriesId) -> Column:
+        series = self.series_registry.get_series_by_id(series_id)
+        column_value = series.series_starting_cell.column
+        return Column(
+            column_number=column_value,
+            column_letter=ExcelUtils.get_column_letter_from_number(column_value),
+        )
 
     def process_series_cells(
         self,
-        series_ids_string: List[str],
+        series_ids: Sequence[SeriesId],
         series_start_index: Optional[int],
         series_end_index: Optional[int],
     ) -> CellRange:
 
         cell_ranges = []
 
-        for series_id_string in series_ids_string:
+        for series_id in series_ids:
 
             cell_range = self.get_cell_range_for_series_id(
-                series_id_string, series_start_index, series_end_index
+                series_id, series_start_index, series_end_index
             )
             cell_ranges.append(cell_range)
 
@@ -160,19 +140,16 @@ class CellRangeImplementer:
 
     def get_cell_range_for_series_id(
         self,
-        series_id_string: str,
+        series_id: SeriesId,
         series_start_index: Optional[int],
         series_end_index: Optional[int],
     ) -> CellRange:
-        series_id = SeriesIdLoader.load_series_id_from_string(series_id_string)
-        sheet_name = series_id.sheet_name
-        series_list = self.series_dict.get(sheet_name)
-
-        for series in series_list:
-            if series.series_id == series_id:
-                return self.create_cell_range(
-                    series, series_start_index, series_end_index, sheet_name
-                )
+        return self.create_cell_range(
+            self.series_registry.get_series_by_id(series_id),
+            series_start_index,
+            series_end_index,
+            series_id.sheet_name,
+        )
 
     def create_cell_range(
         self,
@@ -204,8 +181,7 @@ class CellRangeImplementer:
         self, node: xlcalculator.ast_nodes.RangeNode
     ) -> xlcalculator.ast_nodes.RangeNode:
 
-        series_tuple = ast.literal_eval(node.tvalue)
-        cell_range = self.get_cell_range_from_series_tuple(series_tuple)
+        cell_range = self.get_cell_range_from_series_range_reference(node.reference)
 
         return xlcalculator.ast_nodes.RangeNode(
             xlcalculator.tokenizer.f_token(
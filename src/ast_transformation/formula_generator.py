@@ -1,7 +1,8 @@
+import dataclasses
 import xlcalculator
-import ast
-from typing import List, Tuple
-from objects import SeriesId
+from typing import Optional, Tuple
+from objects import SeriesRangeReference
+from ast_building.series_range_node import SeriesRangeNode
 
 
 from dataclasses import dataclass
@@ -19,34 +20,17 @@ class SeriesRangeDelta:
     end_row_index: int
 
 
-class SeriesIdLoader:
-    @staticmethod
-    def load_series_id_from_string(series_id_string: str) -> SeriesId:
-        sheet_name, series_header, series_header_cell_row, series_header_cell_column = (
-            series_id_string.split("|")
-        )
-        return SeriesId(
-            sheet_name=sheet_name,
-            series_header=series_header,
-            series_header_cell_row=int(series_header_cell_row),
-            series_header_cell_column=int(series_header_cell_column),
-        )
-
-
 class DeltaCalculator:
-    @staticmethod
-    def load_series_ids(series_ids_strings: List[str]) -> List[SeriesId]:
-        return [
-            SeriesIdLoader.load_series_id_from_string(sid) for sid in series_ids_strings
-        ]
-
     @staticmethod
     def calculate_index_deltas(
-        indexes1: Tuple[int, int], indexes2: Tuple[int, int]
-    ) -> Tuple[int, int]:
-        return tuple(
-            (y - x if x is not None and y is not None else None)
-            for x, y in zip(indexes1, indexes2)
+        indexes1: Tuple[Optional[int], Optional[int]],
+        indexes2: Tuple[Optional[int], Optional[int]],
+    ) -> Tuple[Optional[int], Optional[int]]:
+        start_1, end_1 = indexes1
+        start_2, end_2 = indexes2
+        return (
+            start_2 - start_1 if start_1 is not None and start_2 is not None else None,
+            end_2 - end_1 if end_1 is not None and end_2 is not None else None,
         )
 
 
@@ -94,33 +78,19 @@ class FormulaGenerator:
 
     @staticmethod
     def replace_range_node_with_formula(
-        node1: xlcalculator.ast_nodes.RangeNode, node2: xlcalculator.ast_nodes.RangeNode
-    ) -> xlcalculator.ast_nodes.RangeNode:
-        generic_formula = FormulaGenerator.get_generic_formula(node1, node2)
-        return xlcalculator.ast_nodes.RangeNode(
-            xlcalculator.tokenizer.f_token(
-                tvalue=generic_formula, ttype="operand", tsubtype="range"
-            )
-        )
+        node1: SeriesRangeNode, node2: SeriesRangeNode
+    ) -> SeriesRangeNode:
+        return SeriesRangeNode(FormulaGenerator.get_generic_formula(node1, node2))
 
     @staticmethod
     def get_generic_formula(
-        range_node1: xlcalculator.ast_nodes.RangeNode,
-        range_node2: xlcalculator.ast_nodes.RangeNode,
-    ) -> str:
-        node1_value = range_node1.tvalue
-        node2_value = range_node2.tvalue
-
-        node1_tuple = ast.literal_eval(node1_value)
-        node2_tuple = ast.literal_eval(node2_value)
-
-        series_ids_1, row_indexes_1 = node1_tuple
-        _, row_indexes_2 = node2_tuple
+        range_node1: SeriesRangeNode, range_node2: SeriesRangeNode
+    ) -> SeriesRangeReference:
+        reference_1 = range_node1.reference
+        reference_2 = range_node2.reference
 
         row_index_deltas = DeltaCalculator.calculate_index_deltas(
-            row_indexes_1, row_indexes_2
+            reference_1.indexes, reference_2.indexes
         )
 
-        generic_formula = (series_ids_1, row_indexes_1, row_index_deltas)
-
-        return str(generic_formula)
+        return dataclasses.replace(reference_1, deltas=row_index_deltas)
@@ -1,7 +1,7 @@
 import xlcalculator
-import ast
-from typing import List, Tuple, Optional, Callable
-from objects import Series, SeriesId
+from typing import List, Sequence, Tuple, Optional, Callable
+from objects import Series, SeriesId, SeriesRangeReference
+from ast_building.series_range_node import SeriesRangeNode
 
 
 from dataclasses import dataclass
@@ -36,14 +36,13 @@ class SeriesIdLoader:
 class DeltaCalculator:
 
     @staticmethod
-    def get_delta_between_nodes(node1_value: str, node2_value: str):
-        node1_tuple = ast.literal_eval(node1_value)
-        node2_tuple = ast.literal_eval(node2_value)
-
-        if node1_tuple[1] == (None, None) or node2_tuple[1] == (None, None):
+    def get_delta_between_nodes(
+        node1_reference: SeriesRangeReference, node2_reference: SeriesRangeReference
+    ):
+        if node1_reference.is_column_range or node2_reference.is_column_range:
             return None
         else:
-            return DeltaCalculator.calculate_deltas(node1_tuple, node2_tuple)
+            return DeltaCalculator.calculate_deltas(node1_reference, node2_reference)
 
     @staticmethod
     def load_series_ids(series_ids_strings: List[str]) -> List[SeriesId]:
@@ -59,7 +58,7 @@ class DeltaCalculator:
 
     @staticmethod
     def calculate_series_id_index_deltas(
-        series_ids1: List[SeriesId], series_ids2: List[SeriesId]
+        series_ids1: Sequence[SeriesId], series_ids2: Sequence[SeriesId]
     ) -> Tuple[int, int, int, int]:
         start_row_index_delta = (
             series_ids2[0].series_header_cell_row
@@ -84,17 +83,26 @@ class DeltaCalculator:
             end_column_index_delta,
         )
 
+    @staticmethod
+    def get_row_indexes(reference: SeriesRangeReference) -> Tuple[int, int]:
+        start_index, end_index = reference.indexes
+        if start_index is None or end_index is None:
+            raise ValueError(f"Range {reference} spans whole columns")
+        return start_index, end_index
+
     @staticmethod
     def calculate_deltas(
-        node1_tuple: Tuple[List[str], Tuple[int, int]],
-        node2_tuple: Tuple[List[str], Tuple[int, int]],
+        node1_reference: SeriesRangeReference,
+        node2_reference: SeriesRangeReference,
     ) -> SeriesRangeDelta:
-        node1_series_ids_strings, node1_row_indexes = node1_tuple
-        node2_series_ids_strings, node2_row_indexes = node2_tuple
-
-        # Load SeriesId objects from strings
-        node1_series_ids = DeltaCalculator.load_series_ids(node1_series_ids_strings)
-        node2_series_ids = DeltaCalculator.load_series_ids(node2_series_ids_strings)
+        node1_series_ids, node1_row_indexes = (
+            node1_reference.series_ids,
+            DeltaCalculator.get_row_indexes(node1_reference),
+        )
+        node2_series_ids, node2_row_indexes = (
+            node2_reference.series_ids,
+            DeltaCalculator.get_row_indexes(node2_reference),
+        )
 
         # Calculate row index deltas
         row_index_deltas = DeltaCalculator.calculate_index_deltas(
@@ -124,7 +132,7 @@ class NodeProcessor:
         n: int,
     ) -> xlcalculator.ast_nodes.RangeNode:
         series_range_delta = DeltaCalculator.get_delta_between_nodes(
-            node1.tvalue, node2.tvalue
+            node1.reference, node2.reference
         )
         if series_range_delta:
             return self.apply_delta_to_node(node1, series_range_delta, n)
@@ -211,7 +219,7 @@ class NodeProcessor:
 
     def update_range_node(
         self,
-        node1: xlcalculator.ast_nodes.RangeNode,
+        node1: SeriesRangeNode,
         start_row_index_delta: int,
         end_row_index_delta: int,
         series_id_start_row_index_delta: int,
@@ -221,38 +229,26 @@ class NodeProcessor:
         start_row_index: int,
         end_row_index: int,
         n: int,
-    ) -> xlcalculator.ast_nodes.RangeNode:
-
-        series_ids_string = ast.literal_eval(node1.tvalue)[0]
-        series_ids = [
-            SeriesIdLoader.load_series_id_from_string(sid) for sid in series_ids_string
-        ]
+    ) -> SeriesRangeNode:
 
         new_series_ids = [
-            str(
-                self.series_updater.add_column_delta_to_series_id(
-                    sid,
-                    series_id_start_row_index_delta * (n - 1),
-                    series_id_start_column_index_delta * (n - 1),
-                )
+            self.series_updater.add_column_delta_to_series_id(
+                sid,
+                series_id_start_row_index_delta * (n - 1),
+                series_id_start_column_index_delta * (n - 1),
             )
-            for sid in series_ids
+            for sid in node1.reference.series_ids
         ]
 
-        new_tvalue = str(
-            (
-                tuple(new_series_ids),
-                (
+        return SeriesRangeNode(
+            SeriesRangeReference(
+                series_ids=tuple(new_series_ids),
+                indexes=(
                     start_row_index + start_row_index_delta * (n - 1),
                     end_row_index + end_row_index_delta * (n - 1),
                 ),
             )
         )
-        return xlcalculator.ast_nodes.RangeNode(
-            xlcalculator.tokenizer.f_token(
-                tvalue=new_tvalue, ttype="operand", tsubtype="range"
-            )
-        )
 
 
 class SeriesUpdater:
@@ -1,96 +1,215 @@
-import ast
-import xlcalculator
-import copy
-from xlcalculator.ast_nodes import RangeNode, FunctionNode, OperatorNode
-from xlcalculator.tokenizer import f_token
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+from formulas.functions import Array
+from xlcalculator.ast_nodes import ASTNode, FunctionNode, OperatorNode, RangeNode
+
+from ast_transformation.vectorized_evaluator import (
+    UnsupportedFormulaError,
+    VectorizedEvaluator,
+)
+from objects import SeriesRangeReference
+
+
+@dataclass(frozen=True)
+class FormulaTemplate:
+    """Generic formula text whose ranges are named inputs, input_references[i] is the range read by input_names[i]."""
+
+    formula_string: str
+    input_names: Tuple[str, ...]
+    input_references: Tuple[SeriesRangeReference, ...]
+
+
+@dataclass(frozen=True)
+class RangeSlot:
+    """Range of a generic formula resolved once, row_span is None for whole columns.
+
+    row_span holds the first and last index the range reads on the first row and the
+    rows it moves by on each following row.
+    """
+
+    series_values: Tuple[Optional[Sequence[Any]], ...]
+    row_span: Optional[Tuple[int, int, int]]
 
 
 class FormulaListGenerator:
-    def __init__(self, formula_ast, series_values_dict):
+    """Write out the rows of a generic formula, its ranges replaced with ARRAY literals of the row's values.
+
+    The AST is split once into text parts and range slots, so a row is only the
+    substitution of its values into the text.
+    """
+
+    # Not a valid cell reference, so the formula parser reads it as a name
+    INPUT_NAME_PREFIX = "_RANGE_"
+
+    def __init__(
+        self, formula_ast: ASTNode, series_values_dict: Dict[str, List[Any]]
+    ) -> None:
         self.formula_ast = formula_ast
         self.series_values_dict = series_values_dict
+        self.range_references: List[SeriesRangeReference] = []
+        # Text of the formula with an int part in place of each range, the index of its slot
+        self.formula_parts = self.merge_text_parts(self.split_formula(formula_ast))
+        self.range_slots = [
+            self.resolve_range_slot(reference) for reference in self.range_references
+        ]
 
-    def update_ast(self, node, index_increment):
+    def split_formula(self, node: ASTNode) -> List[Union[str, int]]:
+        """Split the text of a node around its ranges, mirroring the way xlcalculator nodes print."""
         if isinstance(node, RangeNode):
-            return self.replace_range_node(node, index_increment)
+            self.range_references.append(node.reference)
+            return [len(self.range_references) - 1]
         elif isinstance(node, FunctionNode):
-            return self.replace_function_node(node, index_increment)
+            parts: List[Union[str, int]] = [f"{node.tvalue}("]
+            for index, arg in enumerate(node.args):
+                if index:
+                    parts.append(", ")
+                parts.extend(self.split_formula(arg))
+            parts.append(")")
+            return parts
         elif isinstance(node, OperatorNode):
-            return self.replace_operator_node(node, index_increment)
-        return node
-
-    def replace_range_node(self, node, index_increment):
-        parts = ast.literal_eval(node.tvalue)
-        series_tuple, indexes, deltas = parts
-
-        if indexes == (None, None):
-            array_values = [
-                self.series_values_dict.get(series_id) for series_id in series_tuple
-            ]
-        else:
-
-            start_new_index, end_new_index = (
-                indexes[0] + deltas[0] * index_increment,
-                indexes[1] + deltas[0] * index_increment,
-            )
-
-            array_values = [
-                self.series_values_dict.get(series_id)[
-                    start_new_index : end_new_index + 1
-                ]
-                for series_id in series_tuple
-            ]
-
-        array_row_nodes = []
-        for row in array_values:
-            row_node = FunctionNode(
-                f_token(tvalue="ARRAYROW", ttype="function", tsubtype="")
-            )
-            row_node_args = []
-            for value in row:
-                if isinstance(value, str):
-                    value = f'"{value}"'
-                if value is None:
-                    value = ""
-                row_node_args.append(value)
-
-            row_node.args = row_node_args
-            array_row_nodes.append(row_node)
-
-        array_node = FunctionNode(
-            f_token(tvalue="ARRAY", ttype="function", tsubtype="")
+            parts = []
+            if node.left:
+                parts += ["(", *self.split_formula(node.left), ") "]
+            parts.append(str(node.tvalue))
+            if node.right:
+                parts += [" (", *self.split_formula(node.right), ")"]
+            return parts
+        return [str(node)]
+
+    @staticmethod
+    def merge_text_parts(parts: List[Union[str, int]]) -> List[Union[str, int]]:
+        merged_parts: List[Union[str, int]] = []
+        for part in parts:
+            last_part = merged_parts[-1] if merged_parts else None
+            if isinstance(part, str) and isinstance(last_part, str):
+                merged_parts[-1] = last_part + part
+            else:
+                merged_parts.append(part)
+        return merged_parts
+
+    def resolve_range_slot(self, reference: SeriesRangeReference) -> RangeSlot:
+        series_values = tuple(
+            self.series_values_dict.get(series_id)
+            for series_id in reference.series_id_strings
         )
-        array_node.args = array_row_nodes
-
-        return array_node
-
-    def replace_function_node(self, node, index_increment):
-        modified_args = [self.update_ast(arg, index_increment) for arg in node.args]
-        modified_function_node = FunctionNode(node.token)
-        modified_function_node.args = modified_args
-        return modified_function_node
-
-    def replace_operator_node(self, node, index_increment):
-        modified_left = (
-            self.update_ast(node.left, index_increment) if node.left else None
+        if reference.is_column_range:
+            return RangeSlot(series_values, None)
+        start_index, end_index = reference.indexes
+        row_delta = reference.deltas[0] if reference.deltas is not None else None
+        if start_index is None or end_index is None or row_delta is None:
+            raise ValueError(f"Range {reference} is not generic over the rows")
+        return RangeSlot(series_values, (start_index, end_index, row_delta))
+
+    @staticmethod
+    def get_slot_rows(
+        range_slot: RangeSlot, index_increment: int
+    ) -> Sequence[Sequence[Any]]:
+        """Get the values a range holds for a row, one sequence per series."""
+        series_values = [
+            values for values in range_slot.series_values if values is not None
+        ]
+        if len(series_values) != len(range_slot.series_values):
+            raise ValueError("Range reads a series without values")
+        if range_slot.row_span is None:
+            return series_values
+
+        start_index, end_index, row_delta = range_slot.row_span
+        start_new_index, end_new_index = (
+            start_index + row_delta * index_increment,
+            end_index + row_delta * index_increment,
         )
-        modified_right = (
-            self.update_ast(node.right, index_increment) if node.right else None
+        return [values[start_new_index : end_new_index + 1] for values in series_values]
+
+    @staticmethod
+    def format_value(value: Any) -> str:
+        if isinstance(value, str):
+            return f'"{value}"'
+        if value is None:
+            return ""
+        return str(value)
+
+    @staticmethod
+    def format_range(rows: Sequence[Sequence[Any]]) -> str:
+        array_rows = ", ".join(
+            "ARRAYROW("
+            + ", ".join(FormulaListGenerator.format_value(value) for value in row)
+            + ")"
+            for row in rows
         )
-        modified_operator_node = OperatorNode(node.token)
-        modified_operator_node.left = modified_left
-        modified_operator_node.right = modified_right
-        return modified_operator_node
-
-    def adjust_indices(self, ast, index_increment):
-        return self.update_ast(ast, index_increment)
+        return f"ARRAY({array_rows})"
 
-    def generate_formula_list(self, start_index: int, end_index: int):
+    def generate_formula_list(self, start_index: int, end_index: int) -> List[str]:
         return [
             self.generate_single_formula(i) for i in range(start_index, end_index + 1)
         ]
 
-    def generate_single_formula(self, index_increment):
-        new_ast = copy.deepcopy(self.formula_ast)
-        new_ast = self.adjust_indices(new_ast, index_increment)
-        return new_ast
+    def generate_single_formula(self, index_increment: int) -> str:
+        """Get the formula text of a row, without the leading '=' sign."""
+        return "".join(
+            (
+                part
+                if isinstance(part, str)
+                else self.format_range(
+                    self.get_slot_rows(self.range_slots[part], index_increment)
+                )
+            )
+            for part in self.formula_parts
+        )
+
+    def generate_template(self) -> FormulaTemplate:
+        """Replace every range of the generic AST with a named input, to compile the formula once for all rows."""
+        input_names = tuple(
+            f"{self.INPUT_NAME_PREFIX}{index}"
+            for index in range(len(self.range_references))
+        )
+        formula_string = "".join(
+            part if isinstance(part, str) else input_names[part]
+            for part in self.formula_parts
+        )
+        return FormulaTemplate(
+            formula_string=f"={formula_string}",
+            input_names=input_names,
+            input_references=tuple(self.range_references),
+        )
+
+    def generate_template_inputs(
+        self, template: FormulaTemplate, index_increment: int
+    ) -> Optional[Dict[str, Any]]:
+        """Get the value of each template input for a row, as the ARRAY literals of generate_single_formula evaluate.
+
+        Returns None when a range holds values that only evaluate correctly as formula text.
+        """
+        template_inputs = {}
+        for input_name, range_slot in zip(template.input_names, self.range_slots):
+            if any(values is None for values in range_slot.series_values):
+                return None
+            input_value = self.create_range_array(
+                self.get_slot_rows(range_slot, index_increment)
+            )
+            if input_value is None:
+                return None
+            template_inputs[input_name] = input_value
+        return template_inputs
+
+    @staticmethod
+    def create_range_array(rows: Sequence[Sequence[Any]]) -> Optional[Array]:
+        """Build the array an ARRAY of ARRAYROW literals evaluates to, None when it would not match."""
+        widths = {len(row) for row in rows}
+        if len(widths) != 1 or 0 in widths:
+            return None
+        if any(all(value is None for value in row) for row in rows):
+            # Empty arguments only become zeros next to other values
+            return None
+
+        range_array = np.empty((len(rows), widths.pop()), dtype=object)
+        try:
+            for row_index, row in enumerate(rows):
+                for column_index, value in enumerate(row):
+                    range_array[row_index, column_index] = (
+                        VectorizedEvaluator.convert_input_value(value)
+                    )
+        except UnsupportedFormulaError:
+            return None
+        return range_array.view(Array)
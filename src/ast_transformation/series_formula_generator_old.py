@@ -1,3 +1,5 @@
+import dataclasses
+
 from ast_transformation.cell_range_implementer import CellRangeImplementer
 from ast_transformation.formula_checker import FormulaChecker
 from ast_transformation.formula_generator_old import FormulaGenerator
@@ -52,8 +54,12 @@ class SeriesFormulaGenerator:
             formula_2_ast_new
         )
 
-        series.formulas = [
-            f"={formula_1_ast_new_cell_ranges}",
-            f"={formula_2_ast_new_cell_ranges}",
-        ]
-        series_list_new.append(series)
+        series_list_new.append(
+            dataclasses.replace(
+                series,
+                formulas=[
+                    f"={formula_1_ast_new_cell_ranges}",
+                    f"={formula_2_ast_new_cell_ranges}",
+                ],
+            )
+        )
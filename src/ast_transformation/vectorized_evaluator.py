@@ -0,0 +1,636 @@
+import functools
+import math
+from dataclasses import dataclass
+from enum import Enum
+from typing import Any, Callable, Dict, List, Mapping, Optional, Sequence, Tuple
+
+import formulas
+import numpy as np
+import xlcalculator
+from formulas.errors import FoundError
+from formulas.functions import COMPILING, Array, xfilter
+from formulas.functions.math import xsum
+from formulas.functions.operators import OPERATORS
+from formulas.functions.stat import xaverage
+
+from objects import SeriesId
+
+
+class UnsupportedFormulaError(Exception):
+    """Raised when a generic formula cannot be evaluated column-at-a-time."""
+
+
+class VectorizedValueKind(Enum):
+    CONSTANT = "constant"
+    COLUMN = "column"
+    WINDOWS = "windows"
+
+
+@dataclass
+class VectorizedValue:
+    """Result of evaluating an AST node over every row of a series.
+
+    CONSTANT holds the value shared by all rows, COLUMN holds an array of shape
+    (1, rows) with one scalar per row and WINDOWS holds an array of shape
+    (rows, series, width) with the range each row refers to.
+    """
+
+    kind: VectorizedValueKind
+    value: Any
+    is_numeric: bool = False
+
+
+class VectorizedEvaluator:
+    """Evaluates generic series ASTs over whole columns instead of row by row."""
+
+    ELEMENTWISE_FUNCTIONS = {
+        "IF",
+        "ROUND",
+        "ROUNDDOWN",
+        "ROUNDUP",
+        "LEFT",
+        "RIGHT",
+        "LEN",
+        "TRIM",
+        "LOWER",
+        "UPPER",
+        "REPLACE",
+        "DATE",
+        "DAY",
+    }
+    NUMERIC_AGGREGATE_FUNCTIONS = {"SUM", "AVERAGE", "MAX", "MIN"}
+    # Reductions formulas applies to the cells matching the criterion of each function
+    CONDITIONAL_AGGREGATE_FUNCTIONS: Dict[str, Callable[[np.ndarray], Any]] = {
+        "SUMIF": xsum,
+        "AVERAGEIF": xaverage,
+        "COUNTIF": len,
+    }
+    NUMERIC_OPERATORS = {"+", "-", "*", "/"}
+    PREFIX_OPERATORS = {"-": "U-", "+": "U+"}
+
+    def __init__(self, series_values_dict: Mapping[str, Sequence[Any]]):
+        self.series_values_dict = series_values_dict
+        self.formula_parser = formulas.Parser()
+        self.functions = formulas.get_functions()
+        self.series_arrays: Dict[str, np.ndarray] = {}
+        self.series_empty_masks: Dict[str, np.ndarray] = {}
+
+    def evaluate_series(
+        self,
+        series_id: SeriesId,
+        formula_ast: xlcalculator.ast_nodes.ASTNode,
+    ) -> List[Any]:
+        """Evaluate a generic formula AST for every row of the given series."""
+        row_count = len(self.series_values_dict[str(series_id)])
+        return self.evaluate_rows(formula_ast, 0, row_count)
+
+    def evaluate_rows(
+        self,
+        formula_ast: xlcalculator.ast_nodes.ASTNode,
+        first_row: int,
+        row_count: int,
+    ) -> List[Any]:
+        """Evaluate a generic formula AST for a block of consecutive rows of its series."""
+        if row_count == 0:
+            return []
+
+        result = self.evaluate_node(formula_ast, row_count, first_row)
+        return self.to_values(result, row_count)
+
+    def invalidate_series(self, series_id_string: str) -> None:
+        """Forget the cached arrays of a series after its values changed."""
+        self.series_arrays.pop(series_id_string, None)
+        self.series_empty_masks.pop(series_id_string, None)
+
+    def to_values(self, result: VectorizedValue, row_count: int) -> List[Any]:
+        """Convert the evaluated root of a formula into one value per row."""
+        if result.kind == VectorizedValueKind.WINDOWS:
+            raise UnsupportedFormulaError("Formula evaluates to a range per row")
+        if result.kind == VectorizedValueKind.CONSTANT:
+            return [self.unwrap_result(result.value)] * row_count
+        return result.value[0].tolist()
+
+    @staticmethod
+    def unwrap_result(result: Any) -> Any:
+        """Unwrap a result the same way FormulaEvaluator.evaluate_formula does."""
+        if isinstance(result, Array):
+            if result.shape == ():
+                return result.item()
+            return result[0][0]
+        return result
+
+    def evaluate_node(
+        self, node: xlcalculator.ast_nodes.ASTNode, row_count: int, first_row: int = 0
+    ) -> VectorizedValue:
+        if isinstance(node, xlcalculator.ast_nodes.RangeNode):
+            return self.evaluate_range_node(node, row_count, first_row)
+        elif isinstance(node, xlcalculator.ast_nodes.FunctionNode):
+            return self.evaluate_function_node(node, row_count, first_row)
+        elif isinstance(node, xlcalculator.ast_nodes.OperatorNode):
+            return self.evaluate_operator_node(node, row_count, first_row)
+        return self.evaluate_constant(node)
+
+    def evaluate_constant(
+        self, node: xlcalculator.ast_nodes.ASTNode
+    ) -> VectorizedValue:
+        return self.load_constant(str(node))
+
+    def load_constant(self, formula_text: str) -> VectorizedValue:
+        """Evaluate a subtree without range references once for all rows."""
+        function = self.formula_parser.ast(f"={formula_text}")[1].compile()
+        value = function()
+        return VectorizedValue(
+            kind=VectorizedValueKind.CONSTANT,
+            value=value,
+            is_numeric=self.is_number(value),
+        )
+
+    def get_series_array(self, series_id_string: str) -> np.ndarray:
+        """Get the values of a series as an object array, in the form the ARRAY formulas see them."""
+        if series_id_string not in self.series_arrays:
+            values = self.series_values_dict.get(series_id_string)
+            if values is None:
+                raise UnsupportedFormulaError(f"No values for {series_id_string}")
+            if isinstance(values, np.ndarray) and values.dtype.kind in "if":
+                array = self.convert_numeric_array(values)
+                empty_mask = np.zeros(len(values), dtype=bool)
+            else:
+                array = np.empty(len(values), dtype=object)
+                empty_mask = np.zeros(len(values), dtype=bool)
+                for index, value in enumerate(values):
+                    array[index] = self.convert_input_value(value)
+                    empty_mask[index] = value is None
+            self.series_arrays[series_id_string] = array
+            self.series_empty_masks[series_id_string] = empty_mask
+        return self.series_arrays[series_id_string]
+
+    @staticmethod
+    def convert_input_value(value: Any) -> Any:
+        """Convert a cell value as FormulaListGenerator and the formula parser would."""
+        if value is None:
+            return 0
+        if isinstance(value, bool):
+            return value
+        if isinstance(value, (int, float, np.integer, np.floating)):
+            if not math.isfinite(value):
+                raise UnsupportedFormulaError(f"Non-finite value {value}")
+            value = value.item() if isinstance(value, np.generic) else value
+            if value < 0:
+                # A negative literal is parsed as a negation, which yields a 0-d array
+                return np.array(float(value), dtype=object).view(Array)
+            return value
+        if isinstance(value, str):
+            if '"' in value:
+                raise UnsupportedFormulaError("Quoted text cannot be inlined")
+            return value
+        raise UnsupportedFormulaError(f"Unsupported value type {type(value).__name__}")
+
+    @staticmethod
+    def convert_numeric_array(values: np.ndarray) -> np.ndarray:
+        """Convert a numeric array at once, as convert_input_value would convert each of its values."""
+        if values.dtype.kind == "f" and not np.isfinite(values).all():
+            raise UnsupportedFormulaError("Non-finite value")
+        array = values.astype(object)
+        for index in np.flatnonzero(values < 0):
+            array[index] = VectorizedEvaluator.convert_input_value(array[index])
+        return array
+
+    @staticmethod
+    def check_no_empty_rows(empty_table: np.ndarray) -> None:
+        """Empty cells only become zeros next to other values, so a fully empty ARRAYROW is not supported."""
+        if empty_table.all(axis=-1).any():
+            raise UnsupportedFormulaError("Range has an array row without values")
+
+    @staticmethod
+    def is_number(value: Any) -> bool:
+        if isinstance(value, Array) and value.shape == ():
+            value = value.item()
+        return type(value) in (int, float)
+
+    @staticmethod
+    def is_numeric_array(array: np.ndarray) -> bool:
+        return all(VectorizedEvaluator.is_number(value) for value in array.flat)
+
+    def evaluate_range_node(
+        self, node: xlcalculator.ast_nodes.RangeNode, row_count: int, first_row: int = 0
+    ) -> VectorizedValue:
+        reference = node.reference
+        return self.load_range(
+            reference.series_id_strings,
+            reference.indexes,
+            reference.deltas,
+            row_count,
+            first_row,
+        )
+
+    def load_range(
+        self,
+        series_tuple: Tuple[str, ...],
+        indexes: Tuple[Optional[int], Optional[int]],
+        deltas: Optional[Tuple[Optional[int], Optional[int]]],
+        row_count: int,
+        first_row: int = 0,
+    ) -> VectorizedValue:
+        """Load the values a generic range refers to for every row, starting at first_row."""
+        arrays = [self.get_series_array(series_id) for series_id in series_tuple]
+
+        if len({len(array) for array in arrays}) != 1:
+            raise UnsupportedFormulaError("Range spans series of different lengths")
+        series_length = len(arrays[0])
+        table = np.stack(arrays)
+        empty_table = np.stack(
+            [self.series_empty_masks[series_id] for series_id in series_tuple]
+        )
+
+        if indexes == (None, None):
+            if series_length == 0:
+                raise UnsupportedFormulaError("Empty column range")
+            self.check_no_empty_rows(empty_table)
+            return VectorizedValue(
+                kind=VectorizedValueKind.CONSTANT,
+                value=table.view(Array),
+                is_numeric=self.is_numeric_array(table),
+            )
+
+        start_index, end_index = indexes
+        delta = deltas[0] if deltas is not None else None
+        if start_index is None or end_index is None or delta is None:
+            raise UnsupportedFormulaError("Range is not generic over the rows")
+        width = end_index - start_index + 1
+        row_starts = start_index + delta * (first_row + np.arange(row_count))
+        first_start_index, last_start_index = row_starts[0], row_starts[-1]
+        if (
+            width < 1
+            or min(first_start_index, last_start_index) < 0
+            or max(first_start_index, last_start_index) + width > series_length
+        ):
+            raise UnsupportedFormulaError("Range moves outside of the series")
+
+        if delta == 0:
+            window = table[:, start_index : end_index + 1]
+            self.check_no_empty_rows(empty_table[:, start_index : end_index + 1])
+            return VectorizedValue(
+                kind=VectorizedValueKind.CONSTANT,
+                value=window.view(Array),
+                is_numeric=self.is_numeric_array(window),
+            )
+
+        empty_windows = np.lib.stride_tricks.sliding_window_view(
+            empty_table, width, axis=1
+        )
+        self.check_no_empty_rows(empty_windows[:, row_starts, :])
+
+        if len(arrays) == 1 and width == 1:
+            column = arrays[0][row_starts].reshape(1, row_count)
+            return VectorizedValue(
+                kind=VectorizedValueKind.COLUMN,
+                value=column,
+                is_numeric=self.is_numeric_array(column),
+            )
+
+        windows = np.lib.stride_tricks.sliding_window_view(table, width, axis=1)
+        windows = windows[:, row_starts, :].transpose(1, 0, 2)
+        return VectorizedValue(
+            kind=VectorizedValueKind.WINDOWS,
+            value=windows,
+            is_numeric=self.is_numeric_array(windows),
+        )
+
+    def get_function(self, function_name: str) -> Callable[..., Any]:
+        function = self.functions.get(function_name.upper().replace("_XLFN.", ""))
+        if function is None:
+            raise UnsupportedFormulaError(f"Unknown function {function_name}")
+        if isinstance(function, dict):
+            extra_inputs = function.get("extra_inputs", {})
+            function = function["function"]
+            if set(extra_inputs) - {COMPILING}:
+                raise UnsupportedFormulaError(f"{function_name} needs cell context")
+            if extra_inputs:
+                return functools.partial(function, False)
+        return function
+
+    def evaluate_function_node(
+        self,
+        node: xlcalculator.ast_nodes.FunctionNode,
+        row_count: int,
+        first_row: int = 0,
+    ) -> VectorizedValue:
+        args = [self.evaluate_node(arg, row_count, first_row) for arg in node.args]
+        return self.call_function(node.tvalue, args, row_count)
+
+    def call_function(
+        self, function_name: str, args: List[VectorizedValue], row_count: int
+    ) -> VectorizedValue:
+        function_name = function_name.upper()
+        function = self.get_function(function_name)
+
+        if all(arg.kind == VectorizedValueKind.CONSTANT for arg in args):
+            return self.apply_once(function, args)
+
+        if function_name in self.NUMERIC_AGGREGATE_FUNCTIONS:
+            aggregated = self.aggregate_numeric(function_name, args, row_count)
+            if aggregated is not None:
+                return aggregated
+
+        if function_name in self.ELEMENTWISE_FUNCTIONS and self.can_broadcast(args):
+            return self.apply_once(function, args)
+
+        if function_name in self.CONDITIONAL_AGGREGATE_FUNCTIONS:
+            aggregated = self.aggregate_conditional(function_name, args)
+            if aggregated is not None:
+                return aggregated
+
+        return self.apply_per_row(function, args, row_count)
+
+    def evaluate_operator_node(
+        self,
+        node: xlcalculator.ast_nodes.OperatorNode,
+        row_count: int,
+        first_row: int = 0,
+    ) -> VectorizedValue:
+        if node.ttype == "operator-prefix":
+            args = [self.evaluate_node(node.right, row_count, first_row)]
+        elif node.ttype == "operator-postfix":
+            args = [self.evaluate_node(node.left, row_count, first_row)]
+        else:
+            args = [
+                self.evaluate_node(node.left, row_count, first_row),
+                self.evaluate_node(node.right, row_count, first_row),
+            ]
+        return self.call_operator(node.tvalue, node.ttype, args, row_count)
+
+    def call_operator(
+        self,
+        operator_symbol: str,
+        operator_type: str,
+        args: List[VectorizedValue],
+        row_count: int,
+    ) -> VectorizedValue:
+        if operator_type == "operator-prefix":
+            operator = OPERATORS[self.PREFIX_OPERATORS[operator_symbol]]
+        else:
+            operator = OPERATORS[operator_symbol]
+            if len(args) == 2 and operator_symbol in self.NUMERIC_OPERATORS:
+                combined = self.combine_numeric(operator_symbol, *args)
+                if combined is not None:
+                    return combined
+
+        if self.can_broadcast(args):
+            return self.apply_once(operator, args)
+        return self.apply_per_row(operator, args, row_count)
+
+    @staticmethod
+    def can_broadcast(args: List[VectorizedValue]) -> bool:
+        """Only single values can be broadcast against a column, ranges are evaluated per row."""
+        for arg in args:
+            if arg.kind == VectorizedValueKind.WINDOWS:
+                return False
+            if isinstance(arg.value, np.ndarray) and arg.value.size > 1:
+                if arg.kind == VectorizedValueKind.CONSTANT:
+                    return False
+        return True
+
+    def apply_once(
+        self, function: Callable[..., Any], args: List[VectorizedValue]
+    ) -> VectorizedValue:
+        """Call a function a single time on whole columns, relying on its elementwise broadcasting."""
+        kind = (
+            VectorizedValueKind.COLUMN
+            if any(arg.kind == VectorizedValueKind.COLUMN for arg in args)
+            else VectorizedValueKind.CONSTANT
+        )
+        result = function(*[self.as_function_argument(arg) for arg in args])
+        if kind == VectorizedValueKind.CONSTANT:
+            return VectorizedValue(
+                kind=kind, value=result, is_numeric=self.is_number(result)
+            )
+        column = np.asarray(result, dtype=object)
+        if column.shape != (1, self.get_row_count(args)):
+            raise UnsupportedFormulaError("Function did not broadcast over the column")
+        return VectorizedValue(
+            kind=kind, value=column, is_numeric=self.is_numeric_array(column)
+        )
+
+    @staticmethod
+    def get_row_count(args: List[VectorizedValue]) -> int:
+        for arg in args:
+            if arg.kind == VectorizedValueKind.COLUMN:
+                return arg.value.shape[1]
+            if arg.kind == VectorizedValueKind.WINDOWS:
+                return arg.value.shape[0]
+        return 1
+
+    @staticmethod
+    def as_function_argument(arg: VectorizedValue) -> Any:
+        if arg.kind == VectorizedValueKind.COLUMN:
+            return np.asarray(arg.value, dtype=object).view(Array)
+        return arg.value
+
+    def apply_per_row(
+        self, function: Callable[..., Any], args: List[VectorizedValue], row_count: int
+    ) -> VectorizedValue:
+        """Call a function once per row with that row's arguments, skipping formula parsing."""
+        column = np.empty((1, row_count), dtype=object)
+        for row in range(row_count):
+            row_args = [self.get_row_argument(arg, row) for arg in args]
+            result = function(*row_args)
+            if isinstance(result, Array):
+                if result.size != 1:
+                    raise UnsupportedFormulaError("Function returned a range per row")
+                result = result.ravel()[0]
+            column[0, row] = result
+        return VectorizedValue(
+            kind=VectorizedValueKind.COLUMN,
+            value=column,
+            is_numeric=self.is_numeric_array(column),
+        )
+
+    @staticmethod
+    def get_row_argument(arg: VectorizedValue, row: int) -> Any:
+        if arg.kind == VectorizedValueKind.COLUMN:
+            return np.asarray(arg.value[:, row : row + 1], dtype=object).view(Array)
+        if arg.kind == VectorizedValueKind.WINDOWS:
+            return arg.value[row].view(Array)
+        return arg.value
+
+    @staticmethod
+    def as_float_array(arg: VectorizedValue) -> Any:
+        if arg.kind == VectorizedValueKind.CONSTANT:
+            value = arg.value
+            if isinstance(value, Array):
+                if value.size != 1:
+                    return None
+                value = value.ravel()[0]
+            return float(value)
+        return np.asarray(arg.value, dtype=np.float64)
+
+    def combine_numeric(
+        self, operator: str, left: VectorizedValue, right: VectorizedValue
+    ) -> Optional[VectorizedValue]:
+        """Apply an arithmetic operator with NumPy when both operands are plain numbers."""
+        if not (left.is_numeric and right.is_numeric):
+            return None
+        if VectorizedValueKind.WINDOWS in (left.kind, right.kind):
+            return None
+        if VectorizedValueKind.COLUMN not in (left.kind, right.kind):
+            return None
+
+        left_array = self.as_float_array(left)
+        right_array = self.as_float_array(right)
+        if left_array is None or right_array is None:
+            return None
+
+        with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+            if operator == "+":
+                result = left_array + right_array
+            elif operator == "-":
+                result = left_array - right_array
+            elif operator == "*":
+                result = left_array * right_array
+            else:
+                result = left_array / right_array
+
+        result = np.broadcast_to(result, np.broadcast(left_array, right_array).shape)
+        division_by_zero = (
+            np.broadcast_to(right_array == 0, result.shape)
+            if operator == "/"
+            else np.zeros(result.shape, dtype=bool)
+        )
+        if not np.isfinite(result[~division_by_zero]).all():
+            return None
+
+        column = result.astype(object)
+        is_numeric = True
+        if division_by_zero.any():
+            column[division_by_zero] = formulas.functions.Error.errors["#DIV/0!"]
+            is_numeric = False
+        return VectorizedValue(
+            kind=VectorizedValueKind.COLUMN, value=column, is_numeric=is_numeric
+        )
+
+    def aggregate_numeric(
+        self, function_name: str, args: List[VectorizedValue], row_count: int
+    ) -> Optional[VectorizedValue]:
+        """Reduce numeric ranges of every row with NumPy."""
+        if not all(arg.is_numeric for arg in args):
+            return None
+
+        per_row_parts = []
+        for arg in args:
+            if arg.kind == VectorizedValueKind.WINDOWS:
+                part = np.asarray(arg.value, dtype=np.float64).reshape(row_count, -1)
+            elif arg.kind == VectorizedValueKind.COLUMN:
+                part = np.asarray(arg.value, dtype=np.float64).reshape(row_count, 1)
+            else:
+                constant = np.asarray(arg.value, dtype=np.float64).reshape(1, -1)
+                part = np.broadcast_to(constant, (row_count, constant.shape[1]))
+            per_row_parts.append(part)
+        values = np.concatenate(per_row_parts, axis=1)
+
+        if function_name == "SUM":
+            result = values.sum(axis=1)
+        elif function_name == "AVERAGE":
+            result = values.mean(axis=1)
+        elif function_name == "MAX":
+            result = values.max(axis=1)
+        else:
+            result = values.min(axis=1)
+
+        return VectorizedValue(
+            kind=VectorizedValueKind.COLUMN,
+            value=result.reshape(1, row_count).astype(object),
+            is_numeric=True,
+        )
+
+    def aggregate_conditional(
+        self, function_name: str, args: List[VectorizedValue]
+    ) -> Optional[VectorizedValue]:
+        """Reduce a fixed range under a criterion given per row, grouping the range and the criteria once.
+
+        The distinct criteria are matched against the distinct values of the range in a
+        single call of formulas, then each distinct criterion reduces the cells it selects,
+        instead of filtering the whole range again for every row.
+        """
+        if len(args) not in (2, 3) or args[1].kind != VectorizedValueKind.COLUMN:
+            return None
+        ranges = [args[0], *args[2:]]
+        if any(arg.kind != VectorizedValueKind.CONSTANT for arg in ranges):
+            return None
+        test_range = np.asarray(args[0].value, dtype=object)
+        operating_range = np.asarray(ranges[-1].value, dtype=object)
+        if test_range.ndim != 2 or operating_range.shape != test_range.shape:
+            return None
+
+        value_groups = self.group_values(test_range.ravel())
+        condition_groups = self.group_values(args[1].value.ravel())
+        if value_groups is None or condition_groups is None:
+            return None
+        distinct_values, value_positions = value_groups
+        distinct_conditions, condition_positions = condition_groups
+
+        try:
+            # Each criterion selects the positions of the distinct values it matches
+            matches = xfilter(
+                lambda positions: positions,
+                distinct_values.reshape(1, -1).view(Array),
+                distinct_conditions.reshape(1, -1).view(Array),
+                np.arange(len(distinct_values)).reshape(1, -1),
+            )
+        except Exception:
+            return None
+
+        accumulator = self.CONDITIONAL_AGGREGATE_FUNCTIONS[function_name]
+        operating_values = operating_range.ravel()
+        results = np.empty(len(distinct_conditions), dtype=object)
+        for position, matched_positions in enumerate(matches.ravel()):
+            if not isinstance(matched_positions, np.ndarray):
+                # The criterion itself evaluated to an error
+                results[position] = matched_positions
+                continue
+            value_mask = np.zeros(len(distinct_values), dtype=bool)
+            value_mask[matched_positions] = True
+            try:
+                results[position] = accumulator(
+                    operating_values[value_mask[value_positions]]
+                )
+            except FoundError as ex:
+                results[position] = ex.err
+            except Exception:
+                # Left to the per row call, which reports the failure as formulas does
+                return None
+
+        column = results[condition_positions].reshape(1, -1)
+        return VectorizedValue(
+            kind=VectorizedValueKind.COLUMN,
+            value=column,
+            is_numeric=self.is_numeric_array(column),
+        )
+
+    @staticmethod
+    def group_values(values: np.ndarray) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """Get the distinct values of an array, told apart by type, and the position of each value among them.
+
+        Returns None when a value cannot be hashed.
+        """
+        positions: Dict[Any, int] = {}
+        distinct_values: List[Any] = []
+        value_positions = np.empty(len(values), dtype=np.intp)
+        for index, value in enumerate(values):
+            if isinstance(value, np.ndarray):
+                if value.shape != ():
+                    return None
+                key: Any = (np.ndarray, type(value.item()), value.item())
+            else:
+                key = (type(value), value)
+            try:
+                position = positions.setdefault(key, len(distinct_values))
+            except TypeError:
+                return None
+            if position == len(distinct_values):
+                distinct_values.append(value)
+            value_positions[index] = position
+
+        distinct_array = np.empty(len(distinct_values), dtype=object)
+        for position, value in enumerate(distinct_values):
+            distinct_array[position] = value
+        return distinct_array, value_positions
@@ -0,0 +1,438 @@
+"""Convert many workbooks on a pool of worker processes and report timings and failures.
+
+Run from the src directory:
+python -m batch_converter ../data/excel_files_raw --output-directory converted
+
+Each workbook is validated, converted to its series computed in Python and, unless
+--no-check is given, checked against the cached values of the source workbook. Every
+file runs in its own process, killed when it exceeds --timeout, with its address space
+capped by --max-memory-mb. With --table-format, the series values are also written
+to one csv, parquet or arrow file per sheet.
+"""
+
+import argparse
+import glob
+import json
+import os
+import platform
+import resource
+import time
+import traceback
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+from enum import Enum
+from multiprocessing import Pipe, Process
+from multiprocessing.connection import Connection, wait
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from excel_builder import ExcelBuilder
+from excel_checker import ExcelChecker
+from excel_data_extractor import ExcelDataExtractor
+from instrumentation import Instrumentation, MemorySink
+from pipeline_building.model_compiler import ModelCompiler
+from pipeline_building.pipeline_builder import PipelineBuilder
+from series_extraction.excel_cleaner import ExcelCleaner
+from series_extraction.excel_loader import ExcelLoader
+from series_extraction.excel_validator import ExcelValidator
+
+OUTPUT_FILE_SUFFIX = "_series_python.xlsx"
+TABLE_DIRECTORY_SUFFIX = "_series_tables"
+
+
+class ConversionStatus(Enum):
+    CONVERTED = "converted"
+    NOT_EQUIVALENT = "not_equivalent"
+    INVALID = "invalid"
+    FAILED = "failed"
+    TIMEOUT = "timeout"
+    CRASHED = "crashed"
+
+
+@dataclass
+class ConversionResult:
+    file_path: str
+    status: ConversionStatus
+    seconds: float = 0.0
+    stages: Dict[str, float] = field(default_factory=dict)
+    # Instrumentation counters of the child process converting the workbook
+    counters: Dict[str, int] = field(default_factory=dict)
+    output_path: Optional[str] = None
+    table_paths: List[str] = field(default_factory=list)
+    error: Optional[str] = None
+    traceback: Optional[str] = None
+    # Differing cells per sheet against the source workbook
+    difference_counts: Dict[str, int] = field(default_factory=dict)
+
+    def to_dict(self) -> Dict[str, Any]:
+        result = asdict(self)
+        result["status"] = self.status.value
+        return result
+
+
+class BatchConverter:
+    """Run the conversion of each workbook in a child process, at most max_workers at a time."""
+
+    def __init__(
+        self,
+        output_directory: str,
+        max_workers: Optional[int] = None,
+        timeout_seconds: Optional[float] = None,
+        max_memory_bytes: Optional[int] = None,
+        check_equivalence: bool = True,
+        table_format: Optional[str] = None,
+    ) -> None:
+        self.output_directory = output_directory
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.timeout_seconds = timeout_seconds
+        self.max_memory_bytes = max_memory_bytes
+        self.check_equivalence = check_equivalence
+        self.table_format = table_format
+
+    @staticmethod
+    def find_workbooks(inputs: List[str]) -> List[str]:
+        """Expand directories and glob patterns into the workbooks they hold, skipping Excel lock files."""
+        file_paths: Set[str] = set()
+        for input_path in inputs:
+            if os.path.isdir(input_path):
+                matches = glob.glob(os.path.join(input_path, "*.xlsx"))
+            else:
+                matches = glob.glob(input_path)
+            file_paths.update(
+                match
+                for match in matches
+                if os.path.isfile(match)
+                and not os.path.basename(match).startswith("~$")
+            )
+        return sorted(file_paths)
+
+    def convert_files(self, file_paths: List[str]) -> List[ConversionResult]:
+        """Convert the workbooks, the results are in the order of file_paths."""
+        os.makedirs(self.output_directory, exist_ok=True)
+        pending = list(enumerate(file_paths))
+        pending.reverse()
+        results: List[Optional[ConversionResult]] = [None] * len(file_paths)
+        # Running jobs by process sentinel: index, process, connection and start time
+        running: Dict[int, Tuple[int, Process, Connection, float]] = {}
+
+        while pending or running:
+            while pending and len(running) < self.max_workers:
+                index, file_path = pending.pop()
+                process, connection = self.start_conversion(file_path)
+                running[process.sentinel] = (
+                    index,
+                    process,
+                    connection,
+                    time.perf_counter(),
+                )
+
+            ready_sentinels = wait(
+                list(running), timeout=self.get_wait_timeout(running)
+            )
+            now = time.perf_counter()
+            for sentinel, (index, process, connection, start) in list(running.items()):
+                if sentinel in ready_sentinels:
+                    results[index] = self.collect_conversion(
+                        file_paths[index], process, connection, now - start
+                    )
+                elif (
+                    self.timeout_seconds is not None
+                    and now - start >= self.timeout_seconds
+                ):
+                    process.kill()
+                    process.join()
+                    connection.close()
+                    results[index] = ConversionResult(
+                        file_path=file_paths[index],
+                        status=ConversionStatus.TIMEOUT,
+                        seconds=now - start,
+                        error=f"Timed out after {self.timeout_seconds} seconds",
+                    )
+                else:
+                    continue
+                del running[sentinel]
+
+        # Every job ends collected or timed out, so each index holds a result
+        return [result for result in results if result is not None]
+
+    def get_wait_timeout(
+        self, running: Dict[int, Tuple[int, Process, Connection, float]]
+    ) -> Optional[float]:
+        """Wait until the earliest deadline of the running jobs, or until one finishes when there is no timeout."""
+        if self.timeout_seconds is None:
+            return None
+        earliest_start = min(start for _, _, _, start in running.values())
+        return max(0.0, earliest_start + self.timeout_seconds - time.perf_counter())
+
+    def start_conversion(self, file_path: str) -> Tuple[Process, Connection]:
+        receiving_connection, sending_connection = Pipe(duplex=False)
+        process = Process(
+            target=BatchConverter.run_conversion,
+            args=(
+                sending_connection,
+                file_path,
+                self.output_directory,
+                self.max_memory_bytes,
+                self.check_equivalence,
+                self.table_format,
+            ),
+            daemon=True,
+        )
+        process.start()
+        sending_connection.close()
+        return process, receiving_connection
+
+    @staticmethod
+    def collect_conversion(
+        file_path: str, process: Process, connection: Connection, seconds: float
+    ) -> ConversionResult:
+        """Read the result a finished child sent, a child that died without one crashed."""
+        try:
+            result = connection.recv() if connection.poll() else None
+        except EOFError:
+            result = None
+        finally:
+            connection.close()
+        process.join()
+        if result is None:
+            return ConversionResult(
+                file_path=file_path,
+                status=ConversionStatus.CRASHED,
+                seconds=seconds,
+                error=f"Worker exited with code {process.exitcode}",
+            )
+        return result
+
+    @staticmethod
+    def run_conversion(
+        connection: Connection,
+        file_path: str,
+        output_directory: str,
+        max_memory_bytes: Optional[int],
+        check_equivalence: bool,
+        table_format: Optional[str],
+    ) -> None:
+        """Entry point of a child process, sends back the result of converting one workbook."""
+        if max_memory_bytes is not None:
+            resource.setrlimit(resource.RLIMIT_AS, (max_memory_bytes, max_memory_bytes))
+        result = BatchConverter.convert_file(
+            file_path, output_directory, check_equivalence, table_format
+        )
+        connection.send(result)
+        connection.close()
+
+    @staticmethod
+    def convert_file(
+        file_path: str,
+        output_directory: str,
+        check_equivalence: bool = True,
+        table_format: Optional[str] = None,
+    ) -> ConversionResult:
+        """Validate, convert and check a workbook holding both its formulas and their cached values."""
+        sink = MemorySink()
+        Instrumentation.enable(sink)
+        start = time.perf_counter()
+        result = ConversionResult(file_path=file_path, status=ConversionStatus.FAILED)
+        try:
+            excel_file = ExcelLoader.load_file(file_path)
+            if not ExcelValidator.validate_excel(excel_file):
+                result.status = ConversionStatus.INVALID
+                result.error = "Sheet titles must not contain spaces"
+                return result
+
+            excel_file = ExcelCleaner.clean_excel(excel_file)
+            with Instrumentation.span("compilation"):
+                compiled_model = ModelCompiler.compile_model(excel_file)
+            series_values_dict = ExcelDataExtractor.extract_series_data_from_excel(
+                excel_file.workbook_with_values, compiled_model.series_list
+            )
+            series_list = PipelineBuilder.create_series_list(
+                compiled_model.sorted_dag,
+                compiled_model.generic_formula_dictionary,
+                compiled_model.series_dict,
+                series_values_dict,
+                compiled_model.series_list_with_values,
+                series_registry=compiled_model.series_registry,
+            )
+
+            file_name = os.path.splitext(os.path.basename(file_path))[0]
+            output_path = os.path.join(
+                output_directory, f"{file_name}{OUTPUT_FILE_SUFFIX}"
+            )
+            ExcelBuilder.create_excel_from_series(
+                series_list, output_path, values_only=True, write_only=True
+            )
+            result.output_path = output_path
+            if table_format is not None:
+                result.table_paths = ExcelBuilder.write_series_tables(
+                    series_list,
+                    os.path.join(
+                        output_directory, f"{file_name}{TABLE_DIRECTORY_SUFFIX}"
+                    ),
+                    table_format,
+                )
+
+            result.status = ConversionStatus.CONVERTED
+            if check_equivalence:
+                with Instrumentation.span("equivalence_check"):
+                    workbook_difference = ExcelChecker.compare_workbooks(
+                        output_path, file_path
+                    )
+                result.difference_counts = workbook_difference.difference_counts
+                if not workbook_difference.is_equivalent:
+                    result.status = ConversionStatus.NOT_EQUIVALENT
+                    result.error = "; ".join(
+                        line.strip() for line in workbook_difference.describe(1)
+                    )
+        except Exception as error:
+            result.status = ConversionStatus.FAILED
+            result.error = f"{type(error).__name__}: {error}"
+            result.traceback = traceback.format_exc()
+        finally:
+            result.counters.update(Instrumentation.counters)
+            Instrumentation.disable()
+            result.seconds = time.perf_counter() - start
+            result.stages.update(BatchConverter.get_stage_seconds(sink))
+        return result
+
+    @staticmethod
+    def get_stage_seconds(sink: MemorySink) -> Dict[str, float]:
+        """Sum the seconds of the outermost spans by name."""
+        stage_seconds: Dict[str, float] = {}
+        for record in sink.get_spans():
+            if record["path"] == record["name"]:
+                stage_seconds[record["name"]] = (
+                    stage_seconds.get(record["name"], 0.0) + record["seconds"]
+                )
+        return stage_seconds
+
+
+def create_report(
+    results: List[ConversionResult], settings: Dict[str, Any]
+) -> Dict[str, Any]:
+    status_counts = {status.value: 0 for status in ConversionStatus}
+    for result in results:
+        status_counts[result.status.value] += 1
+    return {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "python_version": platform.python_version(),
+        "platform": platform.platform(),
+        "settings": settings,
+        "file_count": len(results),
+        "status_counts": status_counts,
+        "total_seconds": sum(result.seconds for result in results),
+        "results": [result.to_dict() for result in results],
+    }
+
+
+def main(
+    inputs: List[str],
+    output_directory: str,
+    report_path: Optional[str],
+    max_workers: Optional[int],
+    timeout_seconds: Optional[float],
+    max_memory_mb: Optional[int],
+    check_equivalence: bool,
+    table_format: Optional[str],
+) -> int:
+    file_paths = BatchConverter.find_workbooks(inputs)
+    if not file_paths:
+        print("No workbooks found")
+        return 1
+
+    batch_converter = BatchConverter(
+        output_directory,
+        max_workers,
+        timeout_seconds,
+        max_memory_mb * 1024 * 1024 if max_memory_mb is not None else None,
+        check_equivalence,
+        table_format,
+    )
+    start = time.perf_counter()
+    results = batch_converter.convert_files(file_paths)
+    wall_seconds = time.perf_counter() - start
+
+    print(f"{'file':>40} {'status':>15} {'seconds':>10}  error")
+    for result in results:
+        print(
+            f"{os.path.basename(result.file_path):>40} {result.status.value:>15} "
+            f"{result.seconds:>10.3f}  {result.error or ''}"
+        )
+
+    report = create_report(
+        results,
+        {
+            "inputs": inputs,
+            "output_directory": output_directory,
+            "max_workers": batch_converter.max_workers,
+            "timeout_seconds": timeout_seconds,
+            "max_memory_mb": max_memory_mb,
+            "check_equivalence": check_equivalence,
+            "table_format": table_format,
+        },
+    )
+    report["wall_seconds"] = wall_seconds
+    report_path = report_path or os.path.join(output_directory, "batch_report.json")
+    with open(report_path, "w", encoding="utf-8") as file:
+        json.dump(report, file, indent=2)
+
+    print(
+        ", ".join(
+            f"{count} {status}" for status, count in report["status_counts"].items()
+        )
+        + f" in {wall_seconds:.1f} s, report written to {report_path}"
+    )
+    converted = report["status_counts"][ConversionStatus.CONVERTED.value]
+    return 0 if converted == len(results) else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "inputs",
+        nargs="+",
+        help="Workbooks, directories of workbooks or glob patterns.",
+    )
+    parser.add_argument("--output-directory", required=True)
+    parser.add_argument(
+        "--report",
+        help="Path of the JSON report, batch_report.json in the output directory by default.",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        help="Workbooks converted at the same time. Defaults to the CPU count.",
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=600,
+        help="Seconds after which the conversion of a workbook is killed.",
+    )
+    parser.add_argument(
+        "--max-memory-mb",
+        type=int,
+        help="Address space limit of each worker process, in megabytes.",
+    )
+    parser.add_argument(
+        "--no-check",
+        action="store_true",
+        help="Skip checking the converted values against the source workbook.",
+    )
+    parser.add_argument(
+        "--table-format",
+        choices=sorted(ExcelBuilder.TABLE_FORMAT_EXTENSIONS),
+        help="Also write the series values to a table file per sheet, parquet and arrow need pyarrow.",
+    )
+    arguments = parser.parse_args()
+    raise SystemExit(
+        main(
+            arguments.inputs,
+            arguments.output_directory,
+            arguments.report,
+            arguments.workers,
+            arguments.timeout,
+            arguments.max_memory_mb,
+            not arguments.no_check,
+            arguments.table_format,
+        )
+    )
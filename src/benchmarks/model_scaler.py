@@ -0,0 +1,155 @@
+"""Scale the tables of a workbook to more rows and columns for benchmarking.
+
+Rows are added by repeating the data rows of each table, translating their formulas
+to the new cells. Columns are added by repeating every sheet side by side with the
+same offset, so references to other sheets land in the matching copy.
+"""
+
+import math
+from typing import Dict, List, Optional, Tuple
+
+from openpyxl.formula.translate import Translator
+from openpyxl.utils import get_column_letter
+
+from objects import ExcelFile, Table
+from series_extraction.table_extractor import TableExtractor
+
+# (first row, last row, first column, last column) of a table
+TableBounds = Tuple[int, int, int, int]
+
+
+def get_table_bounds(excel_file: ExcelFile) -> Dict[str, List[TableBounds]]:
+    extracted_tables, _ = TableExtractor.extract_tables(excel_file)
+    table_bounds = {}
+    for worksheet, tables in extracted_tables.items():
+        table_bounds[worksheet.sheet_name] = [get_bounds(table) for table in tables]
+    return table_bounds
+
+
+def get_bounds(table: Table) -> TableBounds:
+    start_cell, end_cell = table.range.start_cell, table.range.end_cell
+    return start_cell.row, end_cell.row, start_cell.column, end_cell.column
+
+
+def can_grow_downwards(bounds: TableBounds, sheet_tables: List[TableBounds]) -> bool:
+    """A table can only get more rows when no other table sits below it in the same columns."""
+    first_row, last_row, first_column, last_column = bounds
+    return not any(
+        other[0] > last_row and other[2] <= last_column and other[3] >= first_column
+        for other in sheet_tables
+        if other != bounds
+    )
+
+
+def copy_cell(
+    excel_file: ExcelFile,
+    sheet_name: str,
+    source: Tuple[int, int],
+    destination: Tuple[int, int],
+    translators: Dict[Tuple[str, Tuple[int, int]], Translator],
+    header_suffix: Optional[str] = None,
+) -> None:
+    """Copy a cell in both views, translating its formula and appending a suffix to text headers.
+
+    Formulas are tokenized once per source cell, translators holds them across copies.
+    """
+    formula_sheet = excel_file.workbook_with_formulas[sheet_name]
+    value_sheet = excel_file.workbook_with_values[sheet_name]
+
+    formula_value = formula_sheet.cell(*source).value
+    value = value_sheet.cell(*source).value
+    if isinstance(formula_value, str) and formula_value.startswith("="):
+        translator_key = (sheet_name, source)
+        if translator_key not in translators:
+            origin = f"{get_column_letter(source[1])}{source[0]}"
+            translators[translator_key] = Translator(formula_value, origin=origin)
+        target = f"{get_column_letter(destination[1])}{destination[0]}"
+        formula_value = translators[translator_key].translate_formula(target)
+    elif header_suffix is not None and isinstance(value, str):
+        formula_value, value = formula_value + header_suffix, value + header_suffix
+
+    formula_sheet.cell(*destination).value = formula_value
+    value_sheet.cell(*destination).value = value
+
+
+def scale_rows(
+    excel_file: ExcelFile,
+    table_bounds: Dict[str, List[TableBounds]],
+    row_count: int,
+) -> Dict[str, List[TableBounds]]:
+    """Repeat the data rows of each table until it has row_count data rows."""
+    translators: Dict[Tuple[str, Tuple[int, int]], Translator] = {}
+    scaled_bounds: Dict[str, List[TableBounds]] = {}
+    for sheet_name, sheet_tables in table_bounds.items():
+        scaled_bounds[sheet_name] = []
+        for bounds in sheet_tables:
+            first_row, last_row, first_column, last_column = bounds
+            data_row_count = last_row - first_row
+            if data_row_count < 1 or not can_grow_downwards(bounds, sheet_tables):
+                scaled_bounds[sheet_name].append(bounds)
+                continue
+            for data_row in range(data_row_count, row_count):
+                source_row = first_row + 1 + data_row % data_row_count
+                for column in range(first_column, last_column + 1):
+                    copy_cell(
+                        excel_file,
+                        sheet_name,
+                        (source_row, column),
+                        (first_row + 1 + data_row, column),
+                        translators,
+                    )
+            scaled_bounds[sheet_name].append(
+                (
+                    first_row,
+                    max(last_row, first_row + row_count),
+                    first_column,
+                    last_column,
+                )
+            )
+    return scaled_bounds
+
+
+def scale_columns(
+    excel_file: ExcelFile,
+    table_bounds: Dict[str, List[TableBounds]],
+    column_count: int,
+) -> None:
+    """Repeat every sheet to the right, separated by an empty column, until the widest sheet has column_count columns."""
+    block_width = 1 + max(
+        (
+            bounds[3]
+            for sheet_tables in table_bounds.values()
+            for bounds in sheet_tables
+        ),
+        default=0,
+    )
+    copy_count = math.ceil(column_count / block_width)
+    translators: Dict[Tuple[str, Tuple[int, int]], Translator] = {}
+    for copy_index in range(1, copy_count):
+        offset = copy_index * block_width
+        for sheet_name, sheet_tables in table_bounds.items():
+            for first_row, last_row, first_column, last_column in sheet_tables:
+                for row in range(first_row, last_row + 1):
+                    for column in range(first_column, last_column + 1):
+                        copy_cell(
+                            excel_file,
+                            sheet_name,
+                            (row, column),
+                            (row, column + offset),
+                            translators,
+                            f" {copy_index}" if row == first_row else None,
+                        )
+
+
+def scale_model(
+    excel_file: ExcelFile,
+    row_count: Optional[int] = None,
+    column_count: Optional[int] = None,
+) -> ExcelFile:
+    """Scale the tables of a cleaned workbook in place, both views are updated so cached values stay available."""
+    table_bounds = get_table_bounds(excel_file)
+    if row_count is not None:
+        table_bounds = scale_rows(excel_file, table_bounds, row_count)
+    if column_count is not None:
+        scale_columns(excel_file, table_bounds, column_count)
+    return excel_file
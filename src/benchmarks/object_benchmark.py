@@ -0,0 +1,184 @@
+"""Measure the memory and construction time of Cell, SeriesId and CellRange objects.
+
+Run from the src directory: python -m benchmarks.object_benchmark
+
+The slotted classes of objects.py are compared with the plain frozen dataclasses they
+replaced, which computed the coordinate of every cell on construction.
+"""
+
+import argparse
+import time
+import tracemalloc
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Union
+
+from excel_utils import ExcelUtils
+from objects import Cell, CellRange, SeriesId
+
+
+@dataclass(frozen=True)
+class DataclassCell:
+    column: int
+    row: int
+    coordinate: Optional[str] = None
+    sheet_name: Optional[str] = None
+    value: Optional[Union[int, str, float, bool]] = None
+    value_type: Optional[str] = None
+    formula: Optional[str] = None
+
+    def __post_init__(self) -> None:
+        object.__setattr__(self, "coordinate", self.calculate_coordinate())
+
+    def calculate_coordinate(self) -> Optional[str]:
+        if self.column and self.row:
+            return f"{ExcelUtils.get_column_letter_from_number(self.column)}{self.row}"
+        return None
+
+
+@dataclass(frozen=True)
+class DataclassSeriesId:
+    sheet_name: str
+    series_header: str
+    series_header_cell_row: int
+    series_header_cell_column: int
+
+    def __str__(self) -> str:
+        return "|".join(
+            [
+                self.sheet_name,
+                self.series_header,
+                str(self.series_header_cell_row),
+                str(self.series_header_cell_column),
+            ]
+        )
+
+
+@dataclass
+class DataclassCellRange:
+    start_cell: DataclassCell
+    end_cell: DataclassCell
+
+
+def create_cells(cell_class: type, count: int) -> List:
+    # Names are built at run time as they are when read from a workbook, so they are not shared
+    return [
+        cell_class(
+            column=index % 50 + 1, row=index // 50 + 1, sheet_name="".join("Sheet1")
+        )
+        for index in range(count)
+    ]
+
+
+def create_series_ids(series_id_class: type, count: int) -> List:
+    return [
+        series_id_class(
+            sheet_name="".join("Sheet1"),
+            series_header="".join(f"Header {index % 50}"),
+            series_header_cell_row=1,
+            series_header_cell_column=index % 50 + 1,
+        )
+        for index in range(count)
+    ]
+
+
+def create_cell_ranges(cell_class: type, cell_range_class: type, count: int) -> List:
+    return [
+        cell_range_class(
+            start_cell=cell_class(column=1, row=index + 1, sheet_name="Sheet1"),
+            end_cell=cell_class(column=10, row=index + 1, sheet_name="Sheet1"),
+        )
+        for index in range(count)
+    ]
+
+
+def use_cells(cells: List) -> None:
+    """Hash each cell and read its coordinate, as the pipeline does with cells it looks up."""
+    for cell in cells:
+        hash(cell)
+        cell.coordinate
+
+
+def use_series_ids(series_ids: List) -> None:
+    """Hash each series id and get its string, as value dictionaries are keyed by it."""
+    for series_id in series_ids:
+        hash(series_id)
+        str(series_id)
+
+
+def measure(
+    create: Callable[[], List], use: Optional[Callable[[List], None]], count: int
+) -> Dict[str, float]:
+    """Get the bytes per object, and the microseconds per construction and per use of a batch.
+
+    Objects are used once before timing a second use, which is served by the caches of the slotted classes.
+    """
+    start = time.perf_counter()
+    objects = create()
+    construction_seconds = time.perf_counter() - start
+
+    use_seconds = 0.0
+    if use is not None:
+        use(objects)
+        start = time.perf_counter()
+        use(objects)
+        use_seconds = time.perf_counter() - start
+    del objects
+
+    tracemalloc.start()
+    objects = create()
+    allocated_bytes, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "bytes": allocated_bytes / count,
+        "construction_us": construction_seconds / count * 1e6,
+        "use_us": use_seconds / count * 1e6,
+    }
+
+
+def main(count: int) -> None:
+    # The previous CellRange was a mutable dataclass, so it could not be hashed
+    cases = [
+        ("Cell", "dataclass", lambda: create_cells(DataclassCell, count), use_cells),
+        ("Cell", "slotted", lambda: create_cells(Cell, count), use_cells),
+        (
+            "SeriesId",
+            "dataclass",
+            lambda: create_series_ids(DataclassSeriesId, count),
+            use_series_ids,
+        ),
+        (
+            "SeriesId",
+            "slotted",
+            lambda: create_series_ids(SeriesId, count),
+            use_series_ids,
+        ),
+        (
+            "CellRange",
+            "dataclass",
+            lambda: create_cell_ranges(DataclassCell, DataclassCellRange, count),
+            None,
+        ),
+        (
+            "CellRange",
+            "slotted",
+            lambda: create_cell_ranges(Cell, CellRange, count),
+            None,
+        ),
+    ]
+    print(
+        f"{'object':>10} {'version':>10} {'bytes':>8} {'build us':>9} {'reuse us':>9}"
+    )
+    for name, version, create, use in cases:
+        result = measure(create, use, count)
+        print(
+            f"{name:>10} {version:>10} {result['bytes']:>8.1f} "
+            f"{result['construction_us']:>9.3f} {result['use_us']:>9.3f}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--count", type=int, default=100_000, help="Objects created of each class."
+    )
+    main(parser.parse_args().count)
@@ -0,0 +1,309 @@
+"""Time every pipeline stage on the data workbooks and on scaled copies of them.
+
+Run from the src directory: python -m benchmarks.pipeline_benchmark --output results.json
+
+Models are run from data/excel_files_reduced and data/excel_files_raw rather than the
+reduced_clean workbooks, which openpyxl saved without the cached values of their
+formulas, so cleaning is timed as a stage. Scaled models grow the raw workbook.
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from benchmarks.model_scaler import scale_model
+from excel_builder import ExcelBuilder
+from excel_data_extractor import ExcelDataExtractor
+from instrumentation import Instrumentation, MemorySink
+from objects import ExcelFile
+from pipeline_building.dag_sorter import DAGSorter
+from pipeline_building.model_compiler import ModelCompiler
+from pipeline_building.pipeline_builder import PipelineBuilder
+from pipeline_building.series_dependencies_builder import SeriesDependenciesBuilder
+from series_extraction.excel_cleaner import ExcelCleaner
+from series_extraction.excel_loader import ExcelLoader
+from series_extraction.series_extractor import SeriesExtractor
+from series_extraction.series_iterator import SeriesIterator
+from series_extraction.series_mapper import SeriesMapper
+from series_extraction.table_extractor import TableExtractor
+
+DEFAULT_DATA_DIRECTORY = os.path.join(os.path.dirname(__file__), "..", "..", "data")
+REDUCED_FILE_SUFFIX = "_reduced.xlsx"
+
+
+class StageRecorder:
+    """Record the wall time and peak traced memory of each stage of one benchmark run."""
+
+    def __init__(self, trace_memory: bool = True):
+        self.trace_memory = trace_memory
+        self.stages: Dict[str, Dict[str, Any]] = {}
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+            memory_before, _ = tracemalloc.get_traced_memory()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            result = {"seconds": time.perf_counter() - start}
+            if self.trace_memory:
+                _, peak_memory = tracemalloc.get_traced_memory()
+                result["peak_memory_bytes"] = peak_memory - memory_before
+            self.stages[name] = result
+
+
+def run_pipeline(
+    recorder: StageRecorder,
+    excel_reduced: ExcelFile,
+    excel_raw: ExcelFile,
+    output_directory: str,
+) -> None:
+    """Run the pipeline stages as the notebook does, series come from the reduced workbook and values from the raw one."""
+    with recorder.stage("clean"):
+        excel_reduced = ExcelCleaner.clean_excel(excel_reduced)
+
+    with recorder.stage("table_extraction"):
+        extracted_tables, workbook_data = TableExtractor.extract_tables(excel_reduced)
+
+    with recorder.stage("series_extraction"):
+        series_dict = SeriesExtractor.extract_series(
+            extracted_tables=extracted_tables, workbook_data=workbook_data
+        )
+        series_index = SeriesMapper.map_series(series_dict)
+        series_list = list(SeriesIterator.iterate_series(series_dict))
+
+    with recorder.stage("ast_generation"):
+        generic_formula_dictionary = {}
+        for series in series_list:
+            if series.formulas == [None, None]:
+                continue
+            generic_formula_ast = ModelCompiler.build_generic_formula_ast(
+                series, series_index
+            )
+            if generic_formula_ast is not None:
+                generic_formula_dictionary[series.series_id] = generic_formula_ast
+
+    with recorder.stage("dependency_build"):
+        series_dependencies = SeriesDependenciesBuilder.build_dependencies(
+            generic_formula_dictionary
+        )
+
+    with recorder.stage("dag_sort"):
+        sorted_dag = DAGSorter.sort_dag(series_dependencies)
+
+    with recorder.stage("value_extraction"):
+        series_values_dict = ExcelDataExtractor.extract_series_data_from_excel(
+            excel_raw.workbook_with_values, series_list
+        )
+
+    with recorder.stage("evaluation"):
+        series_list_with_values = [
+            series for series in series_list if series.formulas == [None, None]
+        ]
+        series_list_updated = PipelineBuilder.create_series_list(
+            sorted_dag,
+            generic_formula_dictionary,
+            series_dict,
+            series_values_dict,
+            series_list_with_values,
+        )
+
+    with recorder.stage("excel_output"):
+        ExcelBuilder.create_excel_from_series(
+            series_list_updated,
+            os.path.join(output_directory, "output.xlsx"),
+            values_only=True,
+        )
+
+
+def load_scaled_model(
+    recorder: StageRecorder,
+    file_path: str,
+    row_count: Optional[int],
+    column_count: Optional[int],
+    output_directory: str,
+) -> ExcelFile:
+    """Scale a workbook, then save and reload it to time the load stage.
+
+    openpyxl cannot write cached values, so the reloaded formulas are paired with the
+    scaled values kept in memory.
+    """
+    excel_file = scale_model(ExcelLoader.load_file(file_path), row_count, column_count)
+    scaled_file_path = os.path.join(output_directory, "scaled.xlsx")
+    excel_file.workbook_with_formulas.save(scaled_file_path)
+    with recorder.stage("load"):
+        loaded_file = ExcelLoader.load_file(scaled_file_path)
+    return ExcelFile(
+        file_path=scaled_file_path,
+        workbook_with_formulas=loaded_file.workbook_with_formulas,
+        workbook_with_values=excel_file.workbook_with_values,
+    )
+
+
+def benchmark_model(
+    data_directory: str,
+    model_name: str,
+    row_count: Optional[int] = None,
+    column_count: Optional[int] = None,
+    trace_memory: bool = True,
+) -> Dict[str, Any]:
+    """Benchmark a model on its reduced and raw workbooks, or on its raw workbook scaled when a row or column count is given."""
+    recorder = StageRecorder(trace_memory)
+    result: Dict[str, Any] = {
+        "model": model_name,
+        "rows": row_count,
+        "columns": column_count,
+        "stages": recorder.stages,
+        "error": None,
+    }
+    reduced_file_path = os.path.join(
+        data_directory, "excel_files_reduced", f"{model_name}_reduced.xlsx"
+    )
+    raw_file_path = os.path.join(
+        data_directory, "excel_files_raw", f"{model_name}_raw.xlsx"
+    )
+    if trace_memory:
+        tracemalloc.start()
+    # The recorder measures memory, the instrumentation only collects the work counters
+    sink = MemorySink()
+    Instrumentation.enable(sink)
+    try:
+        with tempfile.TemporaryDirectory() as output_directory:
+            if row_count is None and column_count is None:
+                with recorder.stage("load"):
+                    excel_reduced = ExcelLoader.load_file(reduced_file_path)
+                    excel_raw = ExcelLoader.load_file(raw_file_path)
+            else:
+                excel_reduced = excel_raw = load_scaled_model(
+                    recorder, raw_file_path, row_count, column_count, output_directory
+                )
+            run_pipeline(recorder, excel_reduced, excel_raw, output_directory)
+    except Exception as error:
+        result["error"] = f"{type(error).__name__}: {error}"
+    finally:
+        Instrumentation.disable()
+        if trace_memory:
+            tracemalloc.stop()
+    result["counters"] = sink.records[-1]["counters"]
+    result["total_seconds"] = sum(
+        stage["seconds"] for stage in recorder.stages.values()
+    )
+    return result
+
+
+def get_model_names(data_directory: str) -> List[str]:
+    """Get the models of the data directory, those with a reduced workbook."""
+    return sorted(
+        file_name[: -len(REDUCED_FILE_SUFFIX)]
+        for file_name in os.listdir(os.path.join(data_directory, "excel_files_reduced"))
+        if file_name.endswith(REDUCED_FILE_SUFFIX) and not file_name.startswith("~$")
+    )
+
+
+def get_git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=os.path.dirname(__file__),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(
+    data_directory: str,
+    models: Optional[List[str]],
+    row_counts: List[int],
+    column_counts: List[int],
+    output_path: str,
+    trace_memory: bool,
+) -> None:
+    model_names = models or get_model_names(data_directory)
+
+    scales: List[Tuple[Optional[int], Optional[int]]] = [(None, None)]
+    scales += [(row_count, None) for row_count in row_counts]
+    scales += [(None, column_count) for column_count in column_counts]
+
+    results = []
+    print(f"{'model':>20} {'rows':>8} {'columns':>8} {'seconds':>10}  error")
+    for model_name in model_names:
+        for row_count, column_count in scales:
+            result = benchmark_model(
+                data_directory,
+                model_name,
+                row_count,
+                column_count,
+                trace_memory,
+            )
+            results.append(result)
+            print(
+                f"{result['model']:>20} {str(row_count or ''):>8} "
+                f"{str(column_count or ''):>8} {result['total_seconds']:>10.3f}  "
+                f"{result['error'] or ''}"
+            )
+            if result["error"] and (row_count, column_count) == (None, None):
+                # Scaling a model the pipeline cannot run only repeats the error
+                break
+
+    report = {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "git_commit": get_git_commit(),
+        "python_version": platform.python_version(),
+        "platform": platform.platform(),
+        "trace_memory": trace_memory,
+        "results": results,
+    }
+    with open(output_path, "w", encoding="utf-8") as file:
+        json.dump(report, file, indent=2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--data-directory", default=DEFAULT_DATA_DIRECTORY)
+    parser.add_argument(
+        "--models",
+        nargs="+",
+        help="Names of the models to run, e.g. vehicle_data. Defaults to all of them.",
+    )
+    parser.add_argument(
+        "--rows",
+        type=int,
+        nargs="*",
+        default=[10_000, 100_000, 1_000_000],
+        help="Data rows per table of the scaled models.",
+    )
+    parser.add_argument(
+        "--columns",
+        type=int,
+        nargs="*",
+        default=[1_000],
+        help="Columns of the widest sheet of the scaled models.",
+    )
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument(
+        "--no-memory",
+        action="store_true",
+        help="Skip tracemalloc, which slows the stages down, to measure time only.",
+    )
+    arguments = parser.parse_args()
+    main(
+        arguments.data_directory,
+        arguments.models,
+        arguments.rows,
+        arguments.columns,
+        arguments.output,
+        not arguments.no_memory,
+    )
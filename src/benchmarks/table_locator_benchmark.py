@@ -0,0 +1,68 @@
+"""Time TableLocator on synthetic sheets of growing size.
+
+Run from the src directory: python -m benchmarks.table_locator_benchmark
+"""
+
+import argparse
+import time
+from typing import List, Tuple
+
+from objects import SheetData
+from series_extraction.table_extractor import TableLocator
+
+
+def create_synthetic_sheet(
+    cell_count: int, table_rows: int = 1000, table_columns: int = 10
+) -> SheetData:
+    """Create a sheet of equally sized tables laid out side by side, separated by an empty column."""
+    rows: List[int] = []
+    columns: List[int] = []
+    table_size = table_rows * table_columns
+    table_count = max(1, cell_count // table_size)
+    for table_index in range(table_count):
+        first_column = table_index * (table_columns + 1) + 1
+        for row in range(1, table_rows + 1):
+            for column in range(first_column, first_column + table_columns):
+                rows.append(row)
+                columns.append(column)
+    return SheetData.from_cells(
+        sheet_name="Sheet1",
+        max_row=table_rows,
+        max_column=table_count * (table_columns + 1) - 1,
+        rows=rows,
+        columns=columns,
+        values=list(rows),
+        formulas=[None] * len(rows),
+    )
+
+
+def time_table_location(sheet_data: SheetData) -> Tuple[float, int]:
+    """Return the seconds taken to locate the tables of a sheet and the number found."""
+    start = time.perf_counter()
+    tables = TableLocator._find_table_boundaries("Sheet1", sheet_data)
+    return time.perf_counter() - start, len(tables)
+
+
+def main(cell_counts: List[int]) -> None:
+    print(f"{'cells':>10} {'tables':>8} {'seconds':>10} {'us/cell':>10}")
+    for cell_count in cell_counts:
+        sheet_data = create_synthetic_sheet(cell_count)
+        seconds, table_count = time_table_location(sheet_data)
+        sheet_cell_count = len(sheet_data.get_non_empty_positions())
+        microseconds_per_cell = seconds / sheet_cell_count * 1e6
+        print(
+            f"{sheet_cell_count:>10} {table_count:>8} {seconds:>10.3f} "
+            f"{microseconds_per_cell:>10.3f}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--cells",
+        type=int,
+        nargs="+",
+        default=[10_000, 100_000, 1_000_000],
+        help="Number of non-empty cells of each synthetic sheet.",
+    )
+    main(parser.parse_args().cells)
@@ -1,26 +1,56 @@
+import os
 import openpyxl
-from typing import Dict, List
+from typing import Any, Dict, List, Tuple
 from objects import Series
+from excel_data_extractor import ExcelDataExtractor
+from instrumentation import Instrumentation
 
 
 class ExcelBuilder:
+    # File extension of each table format, parquet and arrow need pyarrow installed
+    TABLE_FORMAT_EXTENSIONS = {"csv": "csv", "parquet": "parquet", "arrow": "arrow"}
+
     @staticmethod
     def create_excel_from_workbook(
-        workbook: openpyxl.Workbook, output_file_path: str
+        workbook: openpyxl.Workbook, output_file_path: str, write_only: bool = False
     ) -> None:
-        """Creates a new Excel workbook by duplicating all sheets and their cell contents from the given workbook."""
+        """Creates a new Excel workbook by duplicating all sheets and their cell contents from the given workbook.
+
+        write_only streams the rows into the file instead of building the workbook in memory.
+        """
+        if write_only:
+            new_workbook = openpyxl.Workbook(write_only=True)
+            for sheet in workbook:
+                new_sheet = new_workbook.create_sheet(title=sheet.title)
+                for row_values in sheet.iter_rows(values_only=True):
+                    new_sheet.append(row_values)
+            new_workbook.save(output_file_path)
+            return
+
         new_workbook = openpyxl.Workbook()
         ExcelBuilder._remove_default_sheet(new_workbook)
         ExcelBuilder._copy_sheets_and_contents(workbook, new_workbook)
         new_workbook.save(output_file_path)
 
     @staticmethod
+    @Instrumentation.instrumented("excel_output")
     def create_excel_from_series(
         series_collection: List[Series],
         output_file_path: str,
         values_only: bool = False,
+        write_only: bool = False,
     ) -> None:
-        """Create an Excel file from a list of series, optionally using only values or formulas."""
+        """Create an Excel file from a list of series, optionally using only values or formulas.
+
+        write_only collects the cells of each sheet, sorts them by row and streams the rows
+        into the file, rather than setting cells one at a time on a workbook in memory.
+        """
+        if write_only:
+            ExcelBuilder._write_series_rows(
+                series_collection, output_file_path, values_only
+            )
+            return
+
         new_workbook = openpyxl.Workbook()
         ExcelBuilder._remove_default_sheet(new_workbook)
         worksheets_dictionary: Dict[str, openpyxl.worksheet.worksheet.Worksheet] = {}
@@ -36,6 +66,98 @@ class ExcelBuilder:
 
         new_workbook.save(output_file_path)
 
+    @staticmethod
+    @Instrumentation.instrumented("table_output")
+    def write_series_tables(
+        series_collection: List[Series], output_directory: str, table_format: str
+    ) -> List[str]:
+        """Write the values of the series to one csv, parquet or arrow file per sheet, with a column per series.
+
+        Columns are named by SeriesId string and typed as ExcelDataExtractor types them.
+        Returns the paths of the files written.
+        """
+        if table_format not in ExcelBuilder.TABLE_FORMAT_EXTENSIONS:
+            raise ValueError(f"Unsupported table format {table_format}")
+        extension = ExcelBuilder.TABLE_FORMAT_EXTENSIONS[table_format]
+
+        sheet_series_values: Dict[str, Dict[str, List[Any]]] = {}
+        for series in series_collection:
+            sheet_series_values.setdefault(series.series_id.sheet_name, {})[
+                str(series.series_id)
+            ] = [
+                ExcelBuilder._get_table_value(value)
+                for value in series.values[: series.series_length]
+            ]
+
+        os.makedirs(output_directory, exist_ok=True)
+        output_file_paths = []
+        for sheet_name, series_values in sheet_series_values.items():
+            dataframe = ExcelDataExtractor.create_sheet_dataframe(series_values)
+            output_file_path = os.path.join(
+                output_directory, f"{sheet_name}.{extension}"
+            )
+            if table_format == "csv":
+                dataframe.to_csv(output_file_path, index=False)
+            elif table_format == "parquet":
+                dataframe.to_parquet(output_file_path, index=False)
+            else:
+                dataframe.to_feather(output_file_path)
+            output_file_paths.append(output_file_path)
+        return output_file_paths
+
+    @staticmethod
+    def _get_table_value(value: Any) -> Any:
+        """Keep the values table formats can store, write others such as Excel errors as their text."""
+        if value is None or isinstance(value, (bool, int, float, str)):
+            return value
+        return str(value)
+
+    @staticmethod
+    def _write_series_rows(
+        series_collection: List[Series], output_file_path: str, values_only: bool
+    ) -> None:
+        # Cells of each sheet by position, later series overwrite earlier ones as cell by cell writing does
+        sheet_cells: Dict[str, Dict[Tuple[int, int], Any]] = {}
+        for series_item in series_collection:
+            cells = sheet_cells.setdefault(series_item.series_id.sheet_name, {})
+            cells[
+                (
+                    series_item.series_id.series_header_cell_row,
+                    series_item.series_id.series_header_cell_column,
+                )
+            ] = series_item.series_header
+            start_row = series_item.series_starting_cell.row
+            start_col = series_item.series_starting_cell.column
+            for i, value in enumerate(
+                ExcelBuilder._get_cell_values(series_item, values_only)
+            ):
+                cells[(start_row + i, start_col)] = value
+
+        new_workbook = openpyxl.Workbook(write_only=True)
+        for sheet_name, cells in sheet_cells.items():
+            worksheet = new_workbook.create_sheet(title=sheet_name)
+            row_values: List[Any] = []
+            current_row = 1
+            for (row, column), value in sorted(cells.items()):
+                while current_row < row:
+                    worksheet.append(row_values)
+                    row_values = []
+                    current_row += 1
+                row_values.extend([None] * (column - len(row_values) - 1))
+                row_values.append(value)
+            worksheet.append(row_values)
+        new_workbook.save(output_file_path)
+
+    @staticmethod
+    def _get_cell_values(series: Series, values_only: bool) -> List[Any]:
+        """Get the values to write below the header of a series, either formulas or values."""
+        formulas = series.formulas
+        values = series.values
+        return [
+            (formulas[i] if not values_only and formulas != [None, None] else values[i])
+            for i in range(series.series_length)
+        ]
+
     @staticmethod
     def _remove_default_sheet(workbook: openpyxl.Workbook) -> None:
         """Removes the default sheet from a new workbook to start with a clean slate."""
@@ -77,16 +199,9 @@ class ExcelBuilder:
         """Fill worksheet cells with data from a series, either formulas or values."""
         start_row = series.series_starting_cell.row
         start_col = series.series_starting_cell.column
-        formulas = series.formulas
-        values = series.values
 
-        for i in range(series.series_length):
-            row = start_row + i
-            cell = worksheet.cell(row=row, column=start_col)
-            if not values_only:
-                cell.value = formulas[i] if formulas != [None, None] else values[i]
-            else:
-                cell.value = values[i]
+        for i, value in enumerate(ExcelBuilder._get_cell_values(series, values_only)):
+            worksheet.cell(row=start_row + i, column=start_col, value=value)
 
     @staticmethod
     def _copy_sheets_and_contents(
@@ -1,47 +1,241 @@
-import openpyxl
-import math
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from address_codec import AddressCodec
+from objects import SheetCellBuffer
+from series_extraction.excel_loader import ExcelLoader
+
+
+@dataclass(frozen=True)
+class CellDifference:
+    row: int
+    column: int
+    value_1: Any
+    value_2: Any
+
+    @property
+    def coordinate(self) -> str:
+        return AddressCodec.encode(self.column, self.row)
+
+
+@dataclass
+class SheetDifference:
+    sheet_name: str
+    shape_1: Tuple[int, int]
+    shape_2: Tuple[int, int]
+    cell_differences: List[CellDifference] = field(default_factory=list)
+
+    @property
+    def difference_count(self) -> int:
+        return len(self.cell_differences)
+
+
+@dataclass
+class WorkbookDifference:
+    """Every difference between the cached values of two workbooks."""
+
+    file_1_path: str
+    file_2_path: str
+    sheets_only_in_1: List[str] = field(default_factory=list)
+    sheets_only_in_2: List[str] = field(default_factory=list)
+    sheet_differences: Dict[str, SheetDifference] = field(default_factory=dict)
+
+    @property
+    def is_equivalent(self) -> bool:
+        return (
+            not self.sheets_only_in_1
+            and not self.sheets_only_in_2
+            and all(
+                sheet_difference.difference_count == 0
+                for sheet_difference in self.sheet_differences.values()
+            )
+        )
+
+    @property
+    def difference_counts(self) -> Dict[str, int]:
+        return {
+            sheet_name: sheet_difference.difference_count
+            for sheet_name, sheet_difference in self.sheet_differences.items()
+        }
+
+    def describe(self, max_cells_per_sheet: int = 5) -> List[str]:
+        """Describe the differences in readable lines, listing the first cells of each sheet."""
+        lines = []
+        if self.sheets_only_in_1:
+            lines.append(f"Sheets only in {self.file_1_path}: {self.sheets_only_in_1}")
+        if self.sheets_only_in_2:
+            lines.append(f"Sheets only in {self.file_2_path}: {self.sheets_only_in_2}")
+        for sheet_name, sheet_difference in self.sheet_differences.items():
+            if sheet_difference.difference_count == 0:
+                continue
+            lines.append(
+                f"Values in sheet '{sheet_name}' differ in "
+                f"{sheet_difference.difference_count} cells"
+            )
+            for cell_difference in sheet_difference.cell_differences[
+                :max_cells_per_sheet
+            ]:
+                lines.append(
+                    f"  {cell_difference.coordinate}: {cell_difference.value_1!r} "
+                    f"!= {cell_difference.value_2!r}"
+                )
+        return lines
+
+
+@dataclass
+class SheetArrays:
+    """Values of a sheet from A1 with the kind of each cell, numbers as floats and texts as hashes."""
+
+    values: np.ndarray
+    kinds: np.ndarray
+    numbers: np.ndarray
+    text_hashes: np.ndarray
 
 
 class ExcelChecker:
+    EMPTY_KIND = 0
+    NUMBER_KIND = 1
+    TEXT_KIND = 2
+    OTHER_KIND = 3
+
+    @staticmethod
+    def excels_are_equivalent(
+        file1_path: str,
+        file2_path: str,
+        abs_tol: float = 0.0001,
+        rel_tol: float = 0.0,
+    ) -> bool:
+        workbook_difference = ExcelChecker.compare_workbooks(
+            file1_path, file2_path, abs_tol, rel_tol
+        )
+        for line in workbook_difference.describe():
+            print(line)
+        return workbook_difference.is_equivalent
+
     @staticmethod
-    def excels_are_equivalent(file1_path: str, file2_path: str):
-        # Load the workbooks
-        wb1 = openpyxl.load_workbook(file1_path, data_only=True)
-        wb2 = openpyxl.load_workbook(file2_path, data_only=True)
-
-        # Check if the number of sheets is the same
-        if len(wb1.sheetnames) != len(wb2.sheetnames):
-            print("Number of sheets is different")
-            return False
-
-        # Create dictionaries to store sheet data
-        wb1_sheets = {sheet: wb1[sheet].values for sheet in wb1.sheetnames}
-        wb2_sheets = {sheet: wb2[sheet].values for sheet in wb2.sheetnames}
-
-        # Check if the sheet names are the same
-        if set(wb1_sheets.keys()) != set(wb2_sheets.keys()):
-            print("Sheet names are different")
-            return False
-
-        # Compare the values in each sheet
-        for sheet in wb1_sheets:
-            wb1_values = list(wb1_sheets[sheet])
-            wb2_values = list(wb2_sheets[sheet])
-
-            for row1, row2 in zip(wb1_values, wb2_values):
-                if row1 != row2:
-                    for cell1, cell2 in zip(row1, row2):
-                        if type(cell1) == float and type(cell2) == float:
-                            if not math.isclose(cell1, cell2, abs_tol=0.0001):
-                                print(
-                                    f"Numerical values in sheet '{sheet}' differ more than 0.0001 tolerance."
-                                )
-                                return False
-                        elif cell1 != cell2:
-                            print(f"Values in sheet '{sheet}' are different")
-                            print(f"wb1: {cell1}")
-                            print(f"wb2: {cell2}")
-                            return False
-
-        # If all checks pass, the workbooks are equivalent
-        return True
+    def compare_workbooks(
+        file1_path: str,
+        file2_path: str,
+        abs_tol: float = 0.0001,
+        rel_tol: float = 0.0,
+    ) -> WorkbookDifference:
+        """Compare the cached values of two workbooks sheet by sheet, streaming each one into arrays.
+
+        Numbers, booleans included, match within the tolerances as math.isclose computes them, other values must be equal.
+        """
+        sheet_buffers_1 = {
+            sheet_buffer.sheet_name: sheet_buffer
+            for sheet_buffer in ExcelLoader.stream_file(
+                file1_path, include_formulas=False
+            )
+        }
+        workbook_difference = WorkbookDifference(file1_path, file2_path)
+        sheet_names_2 = []
+        for sheet_buffer_2 in ExcelLoader.stream_file(
+            file2_path, include_formulas=False
+        ):
+            sheet_names_2.append(sheet_buffer_2.sheet_name)
+            sheet_buffer_1 = sheet_buffers_1.get(sheet_buffer_2.sheet_name)
+            if sheet_buffer_1 is None:
+                workbook_difference.sheets_only_in_2.append(sheet_buffer_2.sheet_name)
+                continue
+            workbook_difference.sheet_differences[sheet_buffer_2.sheet_name] = (
+                ExcelChecker.compare_sheets(
+                    sheet_buffer_1, sheet_buffer_2, abs_tol, rel_tol
+                )
+            )
+        workbook_difference.sheets_only_in_1 = [
+            sheet_name
+            for sheet_name in sheet_buffers_1
+            if sheet_name not in sheet_names_2
+        ]
+        return workbook_difference
+
+    @staticmethod
+    def compare_sheets(
+        sheet_buffer_1: SheetCellBuffer,
+        sheet_buffer_2: SheetCellBuffer,
+        abs_tol: float = 0.0001,
+        rel_tol: float = 0.0,
+    ) -> SheetDifference:
+        """Compare two sheets over the range covering both, a cell only one of them holds is a difference."""
+        shape = (
+            max(sheet_buffer_1.max_row, sheet_buffer_2.max_row),
+            max(sheet_buffer_1.max_column, sheet_buffer_2.max_column),
+        )
+        arrays_1 = ExcelChecker.create_sheet_arrays(sheet_buffer_1, shape)
+        arrays_2 = ExcelChecker.create_sheet_arrays(sheet_buffer_2, shape)
+
+        same_kind = arrays_1.kinds == arrays_2.kinds
+        equal = same_kind & (arrays_1.kinds == ExcelChecker.EMPTY_KIND)
+
+        numbers = same_kind & (arrays_1.kinds == ExcelChecker.NUMBER_KIND)
+        number_1, number_2 = arrays_1.numbers[numbers], arrays_2.numbers[numbers]
+        with np.errstate(invalid="ignore"):
+            tolerance = np.maximum(
+                rel_tol * np.maximum(np.abs(number_1), np.abs(number_2)), abs_tol
+            )
+            equal[numbers] = (number_1 == number_2) | (
+                np.abs(number_1 - number_2) <= tolerance
+            )
+
+        texts = same_kind & (arrays_1.kinds == ExcelChecker.TEXT_KIND)
+        equal[texts] = arrays_1.text_hashes[texts] == arrays_2.text_hashes[texts]
+
+        others = same_kind & (arrays_1.kinds == ExcelChecker.OTHER_KIND)
+        equal[others] = [
+            value_1 == value_2
+            for value_1, value_2 in zip(
+                arrays_1.values[others], arrays_2.values[others]
+            )
+        ]
+
+        differing_rows, differing_columns = np.nonzero(~equal)
+        return SheetDifference(
+            sheet_name=sheet_buffer_2.sheet_name,
+            shape_1=(sheet_buffer_1.max_row, sheet_buffer_1.max_column),
+            shape_2=(sheet_buffer_2.max_row, sheet_buffer_2.max_column),
+            cell_differences=[
+                CellDifference(
+                    row=row + 1,
+                    column=column + 1,
+                    value_1=arrays_1.values[row, column],
+                    value_2=arrays_2.values[row, column],
+                )
+                for row, column in zip(
+                    differing_rows.tolist(), differing_columns.tolist()
+                )
+            ],
+        )
+
+    @staticmethod
+    def create_sheet_arrays(
+        sheet_buffer: SheetCellBuffer, shape: Tuple[int, int]
+    ) -> SheetArrays:
+        values = np.full(shape, None, dtype=object)
+        kinds = np.full(shape, ExcelChecker.EMPTY_KIND, dtype=np.int8)
+        numbers = np.zeros(shape, dtype=np.float64)
+        for row, column, value in zip(
+            sheet_buffer.rows, sheet_buffer.columns, sheet_buffer.values
+        ):
+            if value is None:
+                continue
+            index = (row - 1, column - 1)
+            values[index] = value
+            # Booleans are numbers as well, True equals 1 and False 0 as they do under ==
+            if isinstance(value, (int, float)):
+                kinds[index] = ExcelChecker.NUMBER_KIND
+                numbers[index] = value
+            elif isinstance(value, str):
+                kinds[index] = ExcelChecker.TEXT_KIND
+            else:
+                kinds[index] = ExcelChecker.OTHER_KIND
+
+        text_hashes = np.zeros(shape, dtype=np.uint64)
+        texts = kinds == ExcelChecker.TEXT_KIND
+        if texts.any():
+            text_hashes[texts] = pd.util.hash_array(values[texts])
+        return SheetArrays(values, kinds, numbers, text_hashes)
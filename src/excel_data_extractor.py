@@ -1,33 +1,289 @@
+import numpy as np
 import openpyxl
+import pandas as pd
 
-from typing import List
-from objects import Series
+from typing import Any, Dict, Iterable, List, Tuple
+from openpyxl.worksheet.worksheet import Worksheet
+from objects import Series, SeriesId, SheetCellBuffer
+from instrumentation import Instrumentation
 
 
 class ExcelDataExtractor:
     @staticmethod
+    @Instrumentation.instrumented("value_extraction")
     def extract_series_data_from_excel(
         workbook: openpyxl.workbook.workbook, series_list: List[Series]
-    ):
+    ) -> Dict[str, List[Any]]:
+        """Extract the values below each series header down to the last row of its sheet, one pass per sheet."""
         series_values_dict_raw = {}
 
+        for sheet_name, sheet_series in ExcelDataExtractor._group_series_by_sheet(
+            series_list
+        ).items():
+            column_values, first_row, max_row = (
+                ExcelDataExtractor._read_worksheet_columns(
+                    workbook[sheet_name], sheet_series
+                )
+            )
+            series_values_dict_raw.update(
+                ExcelDataExtractor._slice_series_columns(
+                    sheet_series, column_values, first_row, max_row
+                )
+            )
+
+        return ExcelDataExtractor._order_by_series_list(
+            series_values_dict_raw, series_list
+        )
+
+    @staticmethod
+    @Instrumentation.instrumented("value_extraction")
+    def extract_series_data_from_buffers(
+        sheet_buffers: Iterable[SheetCellBuffer], series_list: List[Series]
+    ) -> Dict[str, List[Any]]:
+        """Extract series values from streamed sheet buffers, one sheet in memory at a time."""
+        series_by_sheet = ExcelDataExtractor._group_series_by_sheet(series_list)
+
+        series_values_dict_raw = {}
+
+        for sheet_buffer in sheet_buffers:
+            sheet_series = series_by_sheet.get(sheet_buffer.sheet_name, [])
+            if not sheet_series:
+                continue
+
+            column_values, first_row = ExcelDataExtractor._read_buffer_columns(
+                sheet_buffer, sheet_series
+            )
+            series_values_dict_raw.update(
+                ExcelDataExtractor._slice_series_columns(
+                    sheet_series, column_values, first_row, sheet_buffer.max_row
+                )
+            )
+
+        return ExcelDataExtractor._order_by_series_list(
+            series_values_dict_raw, series_list
+        )
+
+    @staticmethod
+    @Instrumentation.instrumented("value_extraction")
+    def extract_series_dataframes(
+        workbook: openpyxl.workbook.workbook, series_list: List[Series]
+    ) -> Dict[str, pd.DataFrame]:
+        """Extract a DataFrame per sheet with one typed column per series, bounded by the real length of each series.
+
+        Shorter columns are padded with missing values, their lengths are in attrs["series_lengths"].
+        """
+        dataframes = {}
+        for sheet_name, sheet_series in ExcelDataExtractor._group_series_by_sheet(
+            series_list
+        ).items():
+            column_values, first_row, max_row = (
+                ExcelDataExtractor._read_worksheet_columns(
+                    workbook[sheet_name], sheet_series
+                )
+            )
+            dataframes[sheet_name] = ExcelDataExtractor.create_sheet_dataframe(
+                ExcelDataExtractor._slice_series_columns(
+                    sheet_series, column_values, first_row, max_row, bounded=True
+                )
+            )
+        return dataframes
+
+    @staticmethod
+    @Instrumentation.instrumented("value_extraction")
+    def extract_series_dataframes_from_buffers(
+        sheet_buffers: Iterable[SheetCellBuffer], series_list: List[Series]
+    ) -> Dict[str, pd.DataFrame]:
+        """Extract a DataFrame per sheet as extract_series_dataframes does, from streamed sheet buffers."""
+        series_by_sheet = ExcelDataExtractor._group_series_by_sheet(series_list)
+
+        dataframes = {}
+        for sheet_buffer in sheet_buffers:
+            sheet_series = series_by_sheet.get(sheet_buffer.sheet_name, [])
+            if not sheet_series:
+                continue
+
+            column_values, first_row = ExcelDataExtractor._read_buffer_columns(
+                sheet_buffer, sheet_series
+            )
+            dataframes[sheet_buffer.sheet_name] = (
+                ExcelDataExtractor.create_sheet_dataframe(
+                    ExcelDataExtractor._slice_series_columns(
+                        sheet_series,
+                        column_values,
+                        first_row,
+                        sheet_buffer.max_row,
+                        bounded=True,
+                    )
+                )
+            )
+        return dataframes
+
+    @staticmethod
+    def get_series_values_dict(
+        dataframes: Dict[str, pd.DataFrame]
+    ) -> Dict[str, List[Any]]:
+        """Convert the DataFrames of extract_series_dataframes back to lists of values keyed by SeriesId string."""
+        series_values_dict = {}
+        for dataframe in dataframes.values():
+            series_lengths = dataframe.attrs["series_lengths"]
+            for series_id_string in dataframe.columns:
+                values = dataframe[series_id_string].iloc[
+                    : series_lengths[series_id_string]
+                ]
+                series_values_dict[series_id_string] = [
+                    None if value is pd.NA else value for value in values.tolist()
+                ]
+        return series_values_dict
+
+    @staticmethod
+    def _group_series_by_sheet(series_list: List[Series]) -> Dict[str, List[Series]]:
+        series_by_sheet: Dict[str, List[Series]] = {}
         for series in series_list:
-            series_id = series.series_id
+            series_by_sheet.setdefault(series.series_id.sheet_name, []).append(series)
+        return series_by_sheet
+
+    @staticmethod
+    def _order_by_series_list(
+        series_values_dict_raw: Dict[str, List[Any]], series_list: List[Series]
+    ) -> Dict[str, List[Any]]:
+        return {
+            str(series.series_id): series_values_dict_raw[str(series.series_id)]
+            for series in series_list
+            if str(series.series_id) in series_values_dict_raw
+        }
+
+    @staticmethod
+    def _read_worksheet_columns(
+        worksheet: Worksheet, sheet_series: List[Series]
+    ) -> Tuple[Dict[int, List[Any]], int, int]:
+        """Read the columns of the series of a sheet in a single pass over its rows.
+
+        Returns the values of each column from the first data row, that first row and the last row of the sheet.
+        """
+        # max_row scans every cell of the sheet, read it once rather than per row
+        max_row = worksheet.max_row
+        columns = {
+            series.series_id.series_header_cell_column for series in sheet_series
+        }
+        first_row = min(
+            series.series_id.series_header_cell_row + 1 for series in sheet_series
+        )
+        min_column = min(columns)
+
+        column_values: Dict[int, List[Any]] = {column: [] for column in columns}
+        for row_values in worksheet.iter_rows(
+            min_row=first_row,
+            max_row=max_row,
+            min_col=min_column,
+            max_col=max(columns),
+            values_only=True,
+        ):
+            for column, values in column_values.items():
+                values.append(row_values[column - min_column])
+
+        return column_values, first_row, max_row
 
-            sheet_name = series_id.sheet_name
-            series_header_cell_row = series_id.series_header_cell_row
-            series_header_cell_column = series_id.series_header_cell_column
+    @staticmethod
+    def _read_buffer_columns(
+        sheet_buffer: SheetCellBuffer, sheet_series: List[Series]
+    ) -> Tuple[Dict[int, List[Any]], int]:
+        columns = {
+            series.series_id.series_header_cell_column for series in sheet_series
+        }
+        first_row = min(
+            series.series_id.series_header_cell_row + 1 for series in sheet_series
+        )
+        row_count = max(0, sheet_buffer.max_row - first_row + 1)
+
+        column_values: Dict[int, List[Any]] = {
+            column: [None] * row_count for column in columns
+        }
+        for row, column, value in zip(
+            sheet_buffer.rows, sheet_buffer.columns, sheet_buffer.values
+        ):
+            if column in column_values and row >= first_row:
+                column_values[column][row - first_row] = value
 
-            # Access the sheet
-            sheet = workbook[sheet_name]
+        return column_values, first_row
 
-            data = []
-            row = series_header_cell_row + 1
-            while row <= sheet.max_row:
-                cell_value = sheet.cell(row=row, column=series_header_cell_column).value
-                data.append(cell_value)
-                row += 1
+    @staticmethod
+    def _slice_series_columns(
+        sheet_series: List[Series],
+        column_values: Dict[int, List[Any]],
+        first_row: int,
+        max_row: int,
+        bounded: bool = False,
+    ) -> Dict[str, List[Any]]:
+        """Slice the values of each series out of its column.
 
-            series_values_dict_raw[str(series_id)] = data
+        Unbounded series run to the last row of the sheet. Bounded series stop before the next
+        series header in the same column and drop their trailing empty cells.
+        """
+        end_rows = {series.series_id: max_row for series in sheet_series}
+        if bounded:
+            series_by_column: Dict[int, List[SeriesId]] = {}
+            for series in sheet_series:
+                series_by_column.setdefault(
+                    series.series_id.series_header_cell_column, []
+                ).append(series.series_id)
+            for series_ids in series_by_column.values():
+                series_ids.sort(key=lambda series_id: series_id.series_header_cell_row)
+                for series_id, next_series_id in zip(series_ids, series_ids[1:]):
+                    end_rows[series_id] = min(
+                        max_row, next_series_id.series_header_cell_row - 1
+                    )
+
+        series_values = {}
+        for series in sheet_series:
+            series_id = series.series_id
+            values = column_values[series_id.series_header_cell_column]
+            start = series_id.series_header_cell_row + 1 - first_row
+            end = max(start, end_rows[series_id] - first_row + 1)
+            if bounded:
+                while end > start and values[end - 1] is None:
+                    end -= 1
+            series_values[str(series_id)] = values[start:end]
+        return series_values
+
+    @staticmethod
+    def create_sheet_dataframe(series_values: Dict[str, List[Any]]) -> pd.DataFrame:
+        """Build a DataFrame with a typed column per series, padded to the longest series."""
+        row_count = max((len(values) for values in series_values.values()), default=0)
+        dataframe = pd.DataFrame(
+            {
+                series_id_string: ExcelDataExtractor._create_typed_column(
+                    values, row_count
+                )
+                for series_id_string, values in series_values.items()
+            },
+            index=pd.RangeIndex(row_count),
+        )
+        dataframe.attrs["series_lengths"] = {
+            series_id_string: len(values)
+            for series_id_string, values in series_values.items()
+        }
+        return dataframe
+
+    @staticmethod
+    def _create_typed_column(
+        values: List[Any], row_count: int
+    ) -> pd.api.extensions.ExtensionArray:
+        """Store a column with a nullable dtype when all its values share a type, otherwise as objects."""
+        padded_values = values + [None] * (row_count - len(values))
+        value_types = {type(value) for value in values if value is not None}
+        int64_info = np.iinfo(np.int64)
 
-        return series_values_dict_raw
+        if value_types == {bool}:
+            dtype = "boolean"
+        elif value_types == {int} and all(
+            value is None or int64_info.min <= value <= int64_info.max
+            for value in values
+        ):
+            dtype = "Int64"
+        elif value_types == {float}:
+            dtype = "Float64"
+        elif value_types == {str}:
+            dtype = "string"
+        else:
+            return pd.array(padded_values, dtype=object)
+        return pd.array(padded_values, dtype=dtype)
@@ -1,38 +1,25 @@
-from typing import Tuple, Optional
+from typing import Tuple
+
+from address_codec import AddressCodec
 
 
 class ExcelUtils:
 
     @staticmethod
     def get_column_letter_from_number(column: int) -> str:
-        column_str = ""
-        while column > 0:
-            column, remainder = divmod(column - 1, 26)
-            column_str = chr(65 + remainder) + column_str
-        return column_str
+        return AddressCodec.encode_column(column)
 
     @staticmethod
     def get_number_from_column_letter(column_str: str) -> int:
-        column = 0
-        for char in column_str:
-            column = column * 26 + (ord(char.upper()) - ord("A") + 1)
-        return column
+        return AddressCodec.decode_column(column_str)
 
     @staticmethod
     def get_column_and_row_from_coordinate(cell_coordinate: str):
-
-        column_str = "".join(filter(str.isalpha, cell_coordinate))
-        row_str = "".join(filter(str.isdigit, cell_coordinate))
-
-        column = ExcelUtils.get_number_from_column_letter(column_str)
-        row = int(row_str)
-
-        return (column, row)
+        return AddressCodec.decode(cell_coordinate)
 
     @staticmethod
     def get_coordinate_from_column_and_row(column: int, row: int) -> str:
-        column_str = ExcelUtils.get_column_letter_from_number(column)
-        return f"{column_str}{row}"
+        return AddressCodec.encode(column, row)
 
     @staticmethod
     def extract_cell_ranges_from_string(cell_range_string: str):
@@ -52,35 +39,6 @@ class ExcelUtils:
     @staticmethod
     def get_coordinates_from_range(
         cell_range: str,
-    ) -> Tuple[int, Optional[int], int, Optional[int], bool]:
+    ) -> Tuple[int, int, int, int, bool]:
         """Convert Excel-style cell range reference Eg. "A1:B3" or "A1" to numerical row and column indices."""
-
-        if not ":" in cell_range:
-            cell_range = cell_range + ":" + cell_range
-
-        cell_start, cell_end = cell_range.split(":")
-
-        is_column_range = False
-
-        def check_is_column(cell_str: str):
-            return cell_str.isalpha()
-
-        if check_is_column(cell_start) and check_is_column(cell_end):
-            cell_start = cell_start + "1"
-            cell_end = cell_end + "3"
-            is_column_range = True
-
-        cell_start_column, cell_start_row = (
-            ExcelUtils.get_column_and_row_from_coordinate(cell_start)
-        )
-        cell_end_column, cell_end_row = ExcelUtils.get_column_and_row_from_coordinate(
-            cell_end
-        )
-
-        return (
-            cell_start_column,
-            cell_start_row,
-            cell_end_column,
-            cell_end_row,
-            is_column_range,
-        )
+        return AddressCodec.decode_range(cell_range)
@@ -0,0 +1,226 @@
+import abc
+import functools
+import json
+import logging
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from typing import (
+    Any,
+    Callable,
+    ClassVar,
+    ContextManager,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+)
+
+
+class InstrumentationSink(abc.ABC):
+    """Receives the span and counter records of Instrumentation."""
+
+    @abc.abstractmethod
+    def emit(self, record: Dict[str, Any]) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+class LoggingSink(InstrumentationSink):
+    def __init__(self, logger_name: str = "excel2python.instrumentation") -> None:
+        self.logger = logging.getLogger(logger_name)
+
+    def emit(self, record: Dict[str, Any]) -> None:
+        self.logger.info(json.dumps(record, default=str))
+
+
+class JsonFileSink(InstrumentationSink):
+    """Append one JSON object per line to a file."""
+
+    def __init__(self, file_path: str) -> None:
+        self.file = open(file_path, "a", encoding="utf-8")
+
+    def emit(self, record: Dict[str, Any]) -> None:
+        self.file.write(json.dumps(record, default=str) + "\n")
+        self.file.flush()
+
+    def close(self) -> None:
+        self.file.close()
+
+
+class MemorySink(InstrumentationSink):
+    """Keep the records in a list, to inspect them in tests and notebooks."""
+
+    def __init__(self) -> None:
+        self.records: List[Dict[str, Any]] = []
+
+    def emit(self, record: Dict[str, Any]) -> None:
+        self.records.append(record)
+
+    def get_spans(self, name: Optional[str] = None) -> List[Dict[str, Any]]:
+        return [
+            record
+            for record in self.records
+            if record["type"] == "span" and (name is None or record["name"] == name)
+        ]
+
+
+class Instrumentation:
+    """Spans around pipeline stages and counters of the work they do, reported to a sink.
+
+    Disabled by default, spans are then a shared null context and counters return at once.
+
+    State is per process. Pool workers call enable_in_worker, which counts without a
+    sink, and send take_counters back with their results for the parent to
+    merge_counters, so counts cover the workers while spans are the parent's only.
+    """
+
+    enabled: ClassVar[bool] = False
+    sink: ClassVar[Optional[InstrumentationSink]] = None
+    trace_memory: ClassVar[bool] = False
+    counters: ClassVar[Dict[str, int]] = {}
+    span_names: ClassVar[List[str]] = []
+    # Peak traced memory seen by each open span before its children reset the peak
+    span_peaks: ClassVar[List[int]] = []
+    started_tracemalloc: ClassVar[bool] = False
+
+    NULL_SPAN: ClassVar[ContextManager[None]] = nullcontext()
+
+    @staticmethod
+    def enable(sink: InstrumentationSink, trace_memory: bool = False) -> None:
+        Instrumentation.disable()
+        Instrumentation.sink = sink
+        Instrumentation.trace_memory = trace_memory
+        Instrumentation.counters = {}
+        Instrumentation.span_names = []
+        Instrumentation.span_peaks = []
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            Instrumentation.started_tracemalloc = True
+        Instrumentation.enabled = True
+
+    @staticmethod
+    def disable() -> None:
+        """Report the counters, close the sink and stop the tracemalloc started by enable."""
+        if not Instrumentation.enabled:
+            return
+        Instrumentation.flush()
+        Instrumentation.enabled = False
+        if Instrumentation.started_tracemalloc:
+            tracemalloc.stop()
+            Instrumentation.started_tracemalloc = False
+        if Instrumentation.sink is not None:
+            Instrumentation.sink.close()
+        Instrumentation.sink = None
+
+    @staticmethod
+    def enable_in_worker(enabled: bool) -> None:
+        """Initialize a pool worker to count when the parent does, without the sink it may have inherited."""
+        Instrumentation.sink = None
+        Instrumentation.trace_memory = False
+        Instrumentation.counters = {}
+        Instrumentation.span_names = []
+        Instrumentation.span_peaks = []
+        Instrumentation.started_tracemalloc = False
+        Instrumentation.enabled = enabled
+
+    @staticmethod
+    def take_counters() -> Dict[str, int]:
+        """Get the counters accumulated since the last call and reset them, to send them from a worker."""
+        counters = Instrumentation.counters
+        Instrumentation.counters = {}
+        return counters
+
+    @staticmethod
+    def merge_counters(counters: Dict[str, int]) -> None:
+        """Add the counters a worker took to those of this process."""
+        for name, amount in counters.items():
+            Instrumentation.count(name, amount)
+
+    @staticmethod
+    def count(name: str, amount: int = 1) -> None:
+        if not Instrumentation.enabled:
+            return
+        Instrumentation.counters[name] = Instrumentation.counters.get(name, 0) + amount
+
+    @staticmethod
+    def span(name: str) -> ContextManager[None]:
+        if not Instrumentation.enabled:
+            return Instrumentation.NULL_SPAN
+        return Instrumentation._record_span(name)
+
+    @staticmethod
+    @contextmanager
+    def _record_span(name: str) -> Iterator[None]:
+        counters_before = dict(Instrumentation.counters)
+        if Instrumentation.trace_memory:
+            memory_before, peak_before = tracemalloc.get_traced_memory()
+            if Instrumentation.span_peaks:
+                Instrumentation.span_peaks[-1] = max(
+                    Instrumentation.span_peaks[-1], peak_before
+                )
+            Instrumentation.span_peaks.append(memory_before)
+            tracemalloc.reset_peak()
+
+        Instrumentation.span_names.append(name)
+        start = time.perf_counter()
+        error = None
+        try:
+            yield
+        except BaseException as exception:
+            error = type(exception).__name__
+            raise
+        finally:
+            record = {
+                "type": "span",
+                "name": name,
+                "path": "/".join(Instrumentation.span_names),
+                "seconds": time.perf_counter() - start,
+                "counters": {
+                    counter: value - counters_before.get(counter, 0)
+                    for counter, value in Instrumentation.counters.items()
+                    if value != counters_before.get(counter, 0)
+                },
+                "error": error,
+            }
+            Instrumentation.span_names.pop()
+            if Instrumentation.trace_memory:
+                _, peak = tracemalloc.get_traced_memory()
+                peak = max(peak, Instrumentation.span_peaks.pop())
+                record["peak_memory_bytes"] = peak - memory_before
+                if Instrumentation.span_peaks:
+                    Instrumentation.span_peaks[-1] = max(
+                        Instrumentation.span_peaks[-1], peak
+                    )
+            Instrumentation._emit(record)
+
+    @staticmethod
+    def _emit(record: Dict[str, Any]) -> None:
+        if Instrumentation.sink is not None:
+            Instrumentation.sink.emit(record)
+
+    @staticmethod
+    def flush() -> None:
+        """Report the counters accumulated since enable."""
+        if Instrumentation.enabled:
+            Instrumentation._emit(
+                {"type": "counters", "counters": dict(Instrumentation.counters)}
+            )
+
+    @staticmethod
+    def instrumented(name: str) -> Callable[[Callable], Callable]:
+        """Decorate a function to run it in a span of the given name."""
+
+        def decorator(function: Callable) -> Callable:
+            @functools.wraps(function)
+            def wrapper(*args: Any, **kwargs: Any) -> Any:
+                if not Instrumentation.enabled:
+                    return function(*args, **kwargs)
+                with Instrumentation._record_span(name):
+                    return function(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
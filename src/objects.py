@@ -1,8 +1,12 @@
+import sys
+from array import array
 from dataclasses import dataclass, field
-from typing import Optional, List, Union, Dict
+from functools import cached_property
+from typing import Any, ClassVar, Optional, List, Sequence, Tuple, Union, Dict
 from enum import Enum
 from excel_utils import ExcelUtils
 
+import numpy as np
 import openpyxl
 
 
@@ -20,39 +24,268 @@ class Worksheet:
     worksheet: Optional[openpyxl.worksheet.worksheet.Worksheet] = None
 
 
-@dataclass(frozen=True)
+def intern_text(text: Optional[str]) -> Optional[str]:
+    """Share one copy of repeated names such as sheet names and headers."""
+    return sys.intern(text) if type(text) is str else text
+
+
+def get_state_without_caches(instance: Any) -> Dict[str, Any]:
+    """Pickle the fields of a slotted object but not its cached hash, string hashes differ between processes."""
+    return {
+        name: getattr(instance, name)
+        for name in instance.__slots__
+        if not name.startswith("_")
+    }
+
+
+def set_state(instance: Any, state: Dict[str, Any]) -> None:
+    for name in instance.__slots__:
+        object.__setattr__(instance, name, state.get(name))
+
+
+@dataclass(frozen=True, slots=True, init=False)
 class Cell:
+    """Slotted cell whose coordinate is computed on first use and whose hash is computed once."""
+
     column: int
     row: int
-    coordinate: Optional[str] = None
     sheet_name: Optional[str] = None
     value: Optional[Union[int, str, float, bool]] = None
     value_type: Optional[str] = None
     formula: Optional[str] = None
-
-    def __post_init__(self):
-        object.__setattr__(self, "coordinate", self.calculate_coordinate())
-
-    def calculate_coordinate(self) -> str:
+    _coordinate: Optional[str] = field(
+        default=None, init=False, compare=False, repr=False
+    )
+    _hash: Optional[int] = field(default=None, init=False, compare=False, repr=False)
+
+    def __init__(
+        self,
+        column: int,
+        row: int,
+        sheet_name: Optional[str] = None,
+        value: Optional[Union[int, str, float, bool]] = None,
+        value_type: Optional[str] = None,
+        formula: Optional[str] = None,
+    ) -> None:
+        object.__setattr__(self, "column", column)
+        object.__setattr__(self, "row", row)
+        object.__setattr__(self, "sheet_name", intern_text(sheet_name))
+        object.__setattr__(self, "value", value)
+        object.__setattr__(self, "value_type", value_type)
+        object.__setattr__(self, "formula", formula)
+        object.__setattr__(self, "_coordinate", None)
+        object.__setattr__(self, "_hash", None)
+
+    @property
+    def coordinate(self) -> Optional[str]:
+        if self._coordinate is None:
+            object.__setattr__(self, "_coordinate", self.calculate_coordinate())
+        return self._coordinate
+
+    def calculate_coordinate(self) -> Optional[str]:
         if self.column and self.row:
             return f"{ExcelUtils.get_column_letter_from_number(self.column)}{self.row}"
         return None
 
+    def __hash__(self) -> int:
+        cell_hash = self._hash
+        if cell_hash is None:
+            cell_hash = hash(
+                (
+                    self.column,
+                    self.row,
+                    self.sheet_name,
+                    self.value,
+                    self.value_type,
+                    self.formula,
+                )
+            )
+            object.__setattr__(self, "_hash", cell_hash)
+        return cell_hash
+
+    __getstate__ = get_state_without_caches
+    __setstate__ = set_state
+
+
+@dataclass
+class SheetCellBuffer:
+    """Non-empty cells of a worksheet stored column-wise, with the bounds of the used range."""
+
+    sheet_name: str
+    rows: array = field(default_factory=lambda: array("i"))
+    columns: array = field(default_factory=lambda: array("i"))
+    values: List[Optional[Union[int, str, float, bool]]] = field(default_factory=list)
+    formulas: List[Optional[str]] = field(default_factory=list)
+    min_row: int = 1
+    max_row: int = 1
+    min_column: int = 1
+    max_column: int = 1
+
+
+@dataclass
+class SheetData:
+    """Populated cells of a worksheet sorted in sheet order, formulas and value types are interned in tables.
+
+    rows and columns hold the position of each populated cell, values, formula_ids and
+    type_codes are parallel to them, so memory grows with the cells and not the area.
+    """
+
+    EMPTY_TYPE_CODE: ClassVar[int] = 0
+    NO_FORMULA_ID: ClassVar[int] = -1
+    # Excel has 16,384 columns, so keys of (row, column) shifted by this keep row-major order
+    COLUMN_BITS: ClassVar[int] = 15
+
+    sheet_name: str
+    max_row: int
+    max_column: int
+    rows: np.ndarray
+    columns: np.ndarray
+    values: np.ndarray
+    formula_ids: np.ndarray
+    type_codes: np.ndarray
+    formulas: List[str] = field(default_factory=list)
+    value_types: List[str] = field(default_factory=lambda: ["NoneType"])
+    # Row-major position of each cell, sorted, to find a cell by bisection
+    position_keys: np.ndarray = field(init=False, repr=False)
+
+    def __post_init__(self) -> None:
+        self.position_keys = self.get_position_keys(self.rows, self.columns)
+
+    @classmethod
+    def from_cells(
+        cls,
+        sheet_name: str,
+        max_row: int,
+        max_column: int,
+        rows: Sequence[int],
+        columns: Sequence[int],
+        values: Sequence[Optional[Union[int, str, float, bool]]],
+        formulas: Sequence[Optional[str]],
+    ) -> "SheetData":
+        """Build the arrays of a sheet from the cells that have a value or a formula."""
+        row_array = np.asarray(rows, dtype=np.int64)
+        column_array = np.asarray(columns, dtype=np.int64)
+        order = np.lexsort((column_array, row_array))
+        cell_count = len(order)
+
+        sheet_values = np.empty(cell_count, dtype=object)
+        formula_ids = np.full(cell_count, cls.NO_FORMULA_ID, dtype=np.int32)
+        type_codes = np.full(cell_count, cls.EMPTY_TYPE_CODE, dtype=np.int8)
+        sheet_formulas: List[str] = []
+        value_types = ["NoneType"]
+        formula_id_by_text: Dict[str, int] = {}
+        type_code_by_name = {"NoneType": cls.EMPTY_TYPE_CODE}
+        for index, cell_index in enumerate(order.tolist()):
+            value = values[cell_index]
+            formula = formulas[cell_index]
+            sheet_values[index] = value
+            type_name = type(value).__name__
+            if type_name not in type_code_by_name:
+                type_code_by_name[type_name] = len(value_types)
+                value_types.append(type_name)
+            type_codes[index] = type_code_by_name[type_name]
+            if formula is not None:
+                if formula not in formula_id_by_text:
+                    formula_id_by_text[formula] = len(sheet_formulas)
+                    sheet_formulas.append(formula)
+                formula_ids[index] = formula_id_by_text[formula]
+
+        return cls(
+            sheet_name=sheet_name,
+            max_row=max_row,
+            max_column=max_column,
+            rows=row_array[order].astype(np.int32),
+            columns=column_array[order].astype(np.int32),
+            values=sheet_values,
+            formula_ids=formula_ids,
+            type_codes=type_codes,
+            formulas=sheet_formulas,
+            value_types=value_types,
+        )
+
+    @staticmethod
+    def get_position_keys(rows: np.ndarray, columns: np.ndarray) -> np.ndarray:
+        return (rows.astype(np.int64) << SheetData.COLUMN_BITS) | columns.astype(
+            np.int64
+        )
+
+    def contains(self, row: int, column: int) -> bool:
+        return 1 <= row <= self.max_row and 1 <= column <= self.max_column
+
+    def find_cell(self, row: int, column: int) -> Optional[int]:
+        """Get the index of a populated cell in the parallel arrays, or None for an empty one."""
+        if not self.contains(row, column):
+            return None
+        key = (row << self.COLUMN_BITS) | column
+        index = int(np.searchsorted(self.position_keys, key))
+        if index < len(self.position_keys) and self.position_keys[index] == key:
+            return index
+        return None
+
+    def get_value(
+        self, row: int, column: int
+    ) -> Optional[Union[int, str, float, bool]]:
+        index = self.find_cell(row, column)
+        return None if index is None else self.values[index]
+
+    def get_value_type(self, row: int, column: int) -> str:
+        index = self.find_cell(row, column)
+        if index is None:
+            return "NoneType"
+        return self.value_types[self.type_codes[index]]
+
+    def get_formula(self, row: int, column: int) -> Optional[str]:
+        index = self.find_cell(row, column)
+        if index is None:
+            return None
+        formula_id = self.formula_ids[index]
+        return None if formula_id == self.NO_FORMULA_ID else self.formulas[formula_id]
+
+    def get_cell(self, row: int, column: int) -> Optional[Cell]:
+        """Materialise the cell at a position, or None outside of the sheet."""
+        if not self.contains(row, column):
+            return None
+        return Cell(
+            column=column,
+            row=row,
+            sheet_name=self.sheet_name,
+            value=self.get_value(row, column),
+            value_type=self.get_value_type(row, column),
+            formula=self.get_formula(row, column),
+        )
+
+    def get(self, coordinate: str) -> Optional[Cell]:
+        column, row = ExcelUtils.get_column_and_row_from_coordinate(coordinate)
+        return self.get_cell(row, column)
+
+    def __getitem__(self, coordinate: str) -> Cell:
+        cell = self.get(coordinate)
+        if cell is None:
+            raise KeyError(coordinate)
+        return cell
+
+    def get_non_empty_positions(self) -> List[Tuple[int, int]]:
+        """Get the (row, column) positions of cells with a value, in sheet order."""
+        has_value = self.type_codes != self.EMPTY_TYPE_CODE
+        return list(
+            zip(self.rows[has_value].tolist(), self.columns[has_value].tolist())
+        )
+
 
 @dataclass
 class WorkbookData:
-    data: Dict[str, Dict[str, Cell]] = field(default_factory=dict)
+    data: Dict[str, SheetData] = field(default_factory=dict)
 
-    def add_sheet_data(self, sheet_name: str, sheet_data: Dict[str, Cell]):
+    def add_sheet_data(self, sheet_name: str, sheet_data: SheetData):
         """Add or update the data for a specific worksheet."""
         self.data[sheet_name] = sheet_data
 
-    def get_sheet_data(self, sheet_name: str) -> Optional[Dict[str, Cell]]:
-        """Retrieve the data for a specific worksheet."""
-        return self.data.get(sheet_name)
+    def get_sheet_data(self, sheet_name: str) -> SheetData:
+        """Retrieve the data for a specific worksheet, raising KeyError for an unknown sheet."""
+        return self.data[sheet_name]
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class CellRange:
     start_cell: "Cell"
     end_cell: "Cell"
@@ -100,31 +333,60 @@ class SeriesDataType(Enum):
     TIME = "time"
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class SeriesId:
+    """Slotted series key with interned names, its hash and string are computed once."""
+
     sheet_name: str
     series_header: str
     series_header_cell_row: int
     series_header_cell_column: int
-
-    def __str__(self):
-        return "|".join(
-            [
-                self.sheet_name,
-                self.series_header,
-                str(self.series_header_cell_row),
-                str(self.series_header_cell_column),
-            ]
-        )
+    _string: Optional[str] = field(default=None, init=False, compare=False, repr=False)
+    _hash: Optional[int] = field(default=None, init=False, compare=False, repr=False)
+
+    def __post_init__(self) -> None:
+        object.__setattr__(self, "sheet_name", intern_text(self.sheet_name))
+        object.__setattr__(self, "series_header", intern_text(self.series_header))
+
+    def __str__(self) -> str:
+        string = self._string
+        if string is None:
+            string = "|".join(
+                [
+                    self.sheet_name,
+                    self.series_header,
+                    str(self.series_header_cell_row),
+                    str(self.series_header_cell_column),
+                ]
+            )
+            object.__setattr__(self, "_string", string)
+        return string
+
+    def __hash__(self) -> int:
+        series_id_hash = self._hash
+        if series_id_hash is None:
+            series_id_hash = hash(
+                (
+                    self.sheet_name,
+                    self.series_header,
+                    self.series_header_cell_row,
+                    self.series_header_cell_column,
+                )
+            )
+            object.__setattr__(self, "_hash", series_id_hash)
+        return series_id_hash
+
+    __getstate__ = get_state_without_caches
+    __setstate__ = set_state
 
 
-@dataclass
+@dataclass(frozen=True)
 class Series:
     series_id: SeriesId
     worksheet: Worksheet
     series_header: str
     formulas: List[str]
-    values: List[Union[int, str, float, bool]]
+    values: Sequence[Union[int, str, float, bool]]
     series_starting_cell: Cell
     series_length: int
     series_data_type: SeriesDataType
@@ -136,3 +398,25 @@ class SeriesRange:
     start_index: Optional[int]
     end_index: Optional[int]
     is_column_range: bool = False
+
+
+@dataclass(frozen=True)
+class SeriesRangeReference:
+    """Range over series rows, indexes are (None, None) for whole columns and deltas are set once the range is generic."""
+
+    series_ids: Tuple[SeriesId, ...]
+    indexes: Tuple[Optional[int], Optional[int]]
+    deltas: Optional[Tuple[Optional[int], Optional[int]]] = None
+
+    @property
+    def is_column_range(self) -> bool:
+        return self.indexes == (None, None)
+
+    @cached_property
+    def series_id_strings(self) -> Tuple[str, ...]:
+        return tuple(str(series_id) for series_id in self.series_ids)
+
+    def __str__(self):
+        if self.deltas is None:
+            return str((self.series_id_strings, self.indexes))
+        return str((self.series_id_strings, self.indexes, self.deltas))
@@ -1,5 +1,12 @@
+from typing import Dict, List, Mapping, Sequence
+
+from instrumentation import Instrumentation
+from objects import SeriesId
+
+
 class DAGSorter:
     @staticmethod
+    @Instrumentation.instrumented("dag_sort")
     def sort_dag(graph):
         visited = set()
         sorted_nodes = []
@@ -16,3 +23,22 @@ class DAGSorter:
             visit(node)
 
         return sorted_nodes
+
+    @staticmethod
+    def sort_dag_levels(
+        graph: Mapping[SeriesId, Sequence[SeriesId]],
+    ) -> List[List[SeriesId]]:
+        """Group the nodes into levels, each node only depends on nodes of earlier levels."""
+        node_levels: Dict[SeriesId, int] = {}
+        for node in DAGSorter.sort_dag(graph):
+            dependency_levels = [
+                node_levels[neighbor] for neighbor in graph.get(node, [])
+            ]
+            node_levels[node] = max(dependency_levels, default=-1) + 1
+
+        levels: List[List[SeriesId]] = [
+            [] for _ in range(max(node_levels.values(), default=-1) + 1)
+        ]
+        for node, level in node_levels.items():
+            levels[level].append(node)
+        return levels
@@ -0,0 +1,195 @@
+import math
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import xlcalculator
+
+from ast_transformation.vectorized_evaluator import VectorizedEvaluator
+from objects import SeriesId
+from pipeline_building.dag_sorter import DAGSorter
+from pipeline_building.pipeline_builder import PipelineBuilder
+from pipeline_building.series_dependencies_builder import SeriesDependenciesBuilder
+
+# (start index, end index, row delta) of a range, None when every row reads the whole range
+RowWindow = Optional[Tuple[int, int, int]]
+
+
+class IncrementalModel:
+    """Keep a pipeline model in memory and recalculate only the series and rows affected by input changes."""
+
+    def __init__(
+        self,
+        generic_formula_dictionary: Dict[SeriesId, xlcalculator.ast_nodes.ASTNode],
+        series_values_dict: Dict[str, List[Any]],
+        vectorized: bool = True,
+    ):
+        self.generic_formula_dictionary = {
+            series_id: formula_ast
+            for series_id, formula_ast in generic_formula_dictionary.items()
+            if formula_ast
+        }
+        # Value lists are replaced, never mutated, so the caller's lists stay untouched
+        self.series_values_dict = dict(series_values_dict)
+        self.vectorized_evaluator = (
+            VectorizedEvaluator(self.series_values_dict) if vectorized else None
+        )
+
+        self.dependencies = SeriesDependenciesBuilder.build_dependencies(
+            self.generic_formula_dictionary
+        )
+        self.sorted_series = [
+            series_id
+            for series_id in DAGSorter.sort_dag(self.dependencies)
+            if series_id in self.generic_formula_dictionary
+        ]
+        self.series_order = {
+            series_id: index for index, series_id in enumerate(self.sorted_series)
+        }
+        self.row_windows = {
+            series_id: IncrementalModel.get_row_windows(formula_ast)
+            for series_id, formula_ast in self.generic_formula_dictionary.items()
+        }
+        self.dependents: Dict[str, Set[SeriesId]] = {}
+        for series_id, windows in self.row_windows.items():
+            for dependency_string in windows:
+                self.dependents.setdefault(dependency_string, set()).add(series_id)
+
+    @staticmethod
+    def get_row_windows(
+        formula_ast: xlcalculator.ast_nodes.ASTNode,
+    ) -> Dict[str, List[RowWindow]]:
+        """Get, per series a formula reads, the windows of rows each formula row refers to."""
+        row_windows: Dict[str, List[RowWindow]] = {}
+        for reference in SeriesDependenciesBuilder.extract_range_values(formula_ast):
+            delta = reference.deltas[0]
+            if reference.is_column_range or delta is None or delta <= 0:
+                window = None
+            else:
+                window = (reference.indexes[0], reference.indexes[1], delta)
+            for series_id_string in reference.series_id_strings:
+                row_windows.setdefault(series_id_string, []).append(window)
+        return row_windows
+
+    def get_values(self, series_id: SeriesId) -> List[Any]:
+        return self.series_values_dict[str(series_id)]
+
+    def recalculate_all(self) -> None:
+        """Evaluate every formula series in dependency order, later formulas read the new results."""
+        for series_id in self.sorted_series:
+            row_count = len(self.series_values_dict[str(series_id)])
+            self.set_values(series_id, self.evaluate_rows(series_id, 0, row_count))
+
+    def update_series_values(
+        self, changes: Dict[SeriesId, List[Any]]
+    ) -> Dict[SeriesId, List[int]]:
+        """Replace the values of input series and recalculate the dependent rows.
+
+        Returns the rows that changed, per series, including the updated inputs.
+        """
+        changed_rows: Dict[SeriesId, Set[int]] = {}
+        for series_id, values in changes.items():
+            if series_id in self.generic_formula_dictionary:
+                raise ValueError(f"Series {series_id} is calculated by a formula")
+            old_values = self.series_values_dict[str(series_id)]
+            rows = IncrementalModel.get_changed_rows(old_values, values)
+            if rows:
+                self.set_values(series_id, list(values))
+                changed_rows[series_id] = rows
+
+        pending_rows: Dict[SeriesId, Set[int]] = {}
+        for series_id, rows in changed_rows.items():
+            self.add_affected_rows(series_id, rows, pending_rows)
+
+        while pending_rows:
+            series_id = min(pending_rows, key=self.series_order.__getitem__)
+            rows = self.recalculate_rows(series_id, pending_rows.pop(series_id))
+            if rows:
+                changed_rows[series_id] = changed_rows.get(series_id, set()) | rows
+                self.add_affected_rows(series_id, rows, pending_rows)
+
+        return {series_id: sorted(rows) for series_id, rows in changed_rows.items()}
+
+    def add_affected_rows(
+        self,
+        series_id: SeriesId,
+        rows: Set[int],
+        pending_rows: Dict[SeriesId, Set[int]],
+    ) -> None:
+        """Add the rows of the dependent formulas reading any of the changed rows of a series."""
+        series_id_string = str(series_id)
+        for dependent_id in self.dependents.get(series_id_string, ()):
+            row_count = len(self.series_values_dict[str(dependent_id)])
+            affected_rows = pending_rows.setdefault(dependent_id, set())
+            for window in self.row_windows[dependent_id][series_id_string]:
+                if window is None:
+                    affected_rows.update(range(row_count))
+                    break
+                start_index, end_index, delta = window
+                for row in rows:
+                    # Formula row i reads the rows start + delta * i to end + delta * i
+                    first = max(0, math.ceil((row - end_index) / delta))
+                    last = min(row_count - 1, (row - start_index) // delta)
+                    affected_rows.update(range(first, last + 1))
+
+    def recalculate_rows(self, series_id: SeriesId, rows: Set[int]) -> Set[int]:
+        """Recalculate the given rows of a formula series in consecutive blocks and return those that changed."""
+        old_values = self.series_values_dict[str(series_id)]
+        new_values = list(old_values)
+        for first_row, row_count in IncrementalModel.get_row_blocks(rows):
+            new_values[first_row : first_row + row_count] = self.evaluate_rows(
+                series_id, first_row, row_count
+            )
+        changed_rows = IncrementalModel.get_changed_rows(old_values, new_values)
+        if changed_rows:
+            self.set_values(series_id, new_values)
+        return changed_rows
+
+    def evaluate_rows(
+        self, series_id: SeriesId, first_row: int, row_count: int
+    ) -> List[Any]:
+        return PipelineBuilder.get_evaluated_rows_from_formula_ast(
+            self.generic_formula_dictionary[series_id],
+            self.series_values_dict,
+            first_row,
+            row_count,
+            self.vectorized_evaluator,
+        )
+
+    def set_values(self, series_id: SeriesId, values: List[Any]) -> None:
+        series_id_string = str(series_id)
+        self.series_values_dict[series_id_string] = values
+        if self.vectorized_evaluator is not None:
+            self.vectorized_evaluator.invalidate_series(series_id_string)
+
+    @staticmethod
+    def get_row_blocks(rows: Set[int]) -> List[Tuple[int, int]]:
+        """Group row indexes into (first row, row count) blocks of consecutive rows."""
+        blocks: List[Tuple[int, int]] = []
+        for row in sorted(rows):
+            if blocks and blocks[-1][0] + blocks[-1][1] == row:
+                blocks[-1] = (blocks[-1][0], blocks[-1][1] + 1)
+            else:
+                blocks.append((row, 1))
+        return blocks
+
+    @staticmethod
+    def get_changed_rows(old_values: List[Any], new_values: List[Any]) -> Set[int]:
+        changed_rows = {
+            row
+            for row, (old_value, new_value) in enumerate(zip(old_values, new_values))
+            if not IncrementalModel.values_equal(old_value, new_value)
+        }
+        shorter, longer = sorted((len(old_values), len(new_values)))
+        changed_rows.update(range(shorter, longer))
+        return changed_rows
+
+    @staticmethod
+    def values_equal(old_value: Any, new_value: Any) -> bool:
+        """Compare cell values, a value of another type such as 1 and True or an error is a change."""
+        if old_value is new_value:
+            return True
+        if type(old_value) is not type(new_value):
+            return False
+        try:
+            return bool(old_value == new_value)
+        except (TypeError, ValueError):
+            return repr(old_value) == repr(new_value)
@@ -0,0 +1,167 @@
+import hashlib
+import os
+import pickle
+import shutil
+import tempfile
+import time
+from typing import Iterator, List, Optional, Tuple
+
+import openpyxl
+from openpyxl.cell.cell import Cell
+from openpyxl.worksheet.formula import ArrayFormula
+
+from objects import ExcelFile
+from pipeline_building.model_compiler import CompiledModel, ModelCompiler
+
+
+class ModelCache:
+    """On-disk cache of compiled models keyed by a hash of the formula view of the workbook.
+
+    Entries live in a directory per FORMAT_VERSION, bump it whenever CompiledModel or
+    the way it is compiled changes so stale entries are never loaded.
+    """
+
+    FORMAT_VERSION = 4
+    ENTRY_SUFFIX = ".pickle"
+
+    def __init__(
+        self,
+        cache_directory: str,
+        max_size_bytes: int = 512 * 1024 * 1024,
+        max_age_seconds: float = 30 * 24 * 60 * 60,
+    ):
+        self.cache_directory = cache_directory
+        self.max_size_bytes = max_size_bytes
+        self.max_age_seconds = max_age_seconds
+
+    @property
+    def version_directory(self) -> str:
+        return os.path.join(self.cache_directory, f"v{self.FORMAT_VERSION}")
+
+    @staticmethod
+    def get_workbook_key(excel_file: ExcelFile) -> str:
+        """Hash the sheet names, cell positions, formulas and constants of the workbook loaded with formulas."""
+        digest = hashlib.sha256()
+        for worksheet in excel_file.workbook_with_formulas.worksheets:
+            digest.update(repr(("sheet", worksheet.title)).encode("utf-8"))
+            for cell in ModelCache.get_cells_in_order(worksheet):
+                value = cell.value
+                if value is None:
+                    continue
+                if isinstance(value, ArrayFormula):
+                    value = value.text
+                digest.update(
+                    repr((cell.row, cell.column, type(value).__name__, value)).encode(
+                        "utf-8"
+                    )
+                )
+        return digest.hexdigest()
+
+    @staticmethod
+    def get_cells_in_order(
+        worksheet: openpyxl.worksheet.worksheet.Worksheet,
+    ) -> Iterator[Cell]:
+        """Get the cells a worksheet holds row by row, as iter_rows yields them."""
+        # iter_rows creates a blank cell for every gap of the loaded worksheet's
+        # sparse (row, column) dictionary, read it directly in sorted order instead.
+        # Read-only worksheets have no such dictionary and stream their rows.
+        cells = getattr(worksheet, "_cells", None)
+        if cells is None:
+            return (cell for row in worksheet.iter_rows() for cell in row)
+        return (cells[position] for position in sorted(cells))
+
+    def get_entry_path(self, key: str) -> str:
+        return os.path.join(self.version_directory, key + self.ENTRY_SUFFIX)
+
+    def load(self, key: str) -> Optional[CompiledModel]:
+        """Load a cached model, a missing, expired or unreadable entry is a miss."""
+        entry_path = self.get_entry_path(key)
+        try:
+            if time.time() - os.path.getmtime(entry_path) > self.max_age_seconds:
+                os.remove(entry_path)
+                return None
+            with open(entry_path, "rb") as file:
+                compiled_model = pickle.load(file)
+        except FileNotFoundError:
+            return None
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+            self.remove_entry(entry_path)
+            return None
+
+        # Touch the entry so eviction removes the least recently used models first
+        os.utime(entry_path)
+        return compiled_model
+
+    def store(self, key: str, compiled_model: CompiledModel) -> None:
+        """Write a model atomically, then evict entries over the age and size limits."""
+        os.makedirs(self.version_directory, exist_ok=True)
+        file_descriptor, temporary_path = tempfile.mkstemp(
+            dir=self.version_directory, suffix=".tmp"
+        )
+        try:
+            with os.fdopen(file_descriptor, "wb") as file:
+                pickle.dump(compiled_model, file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temporary_path, self.get_entry_path(key))
+        except BaseException:
+            self.remove_entry(temporary_path)
+            raise
+        self.evict()
+
+    def load_or_compile(self, excel_file: ExcelFile) -> CompiledModel:
+        """Get the compiled model of a cleaned workbook, compiling and caching it on a miss."""
+        key = self.get_workbook_key(excel_file)
+        compiled_model = self.load(key)
+        if compiled_model is None:
+            compiled_model = ModelCompiler.compile_model(excel_file)
+            self.store(key, compiled_model)
+        return compiled_model
+
+    def evict(self) -> None:
+        """Remove other format versions, expired entries and then the least recently used ones over the size limit."""
+        if os.path.isdir(self.cache_directory):
+            for name in os.listdir(self.cache_directory):
+                path = os.path.join(self.cache_directory, name)
+                is_version_directory = name[:1] == "v" and name[1:].isdigit()
+                if is_version_directory and path != self.version_directory:
+                    shutil.rmtree(path, ignore_errors=True)
+
+        now = time.time()
+        entries: List[Tuple[float, int, str]] = []
+        for entry_path, modified_time, size in self.list_entries():
+            if now - modified_time > self.max_age_seconds:
+                self.remove_entry(entry_path)
+            else:
+                entries.append((modified_time, size, entry_path))
+
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, entry_path in sorted(entries):
+            if total_size <= self.max_size_bytes:
+                break
+            self.remove_entry(entry_path)
+            total_size -= size
+
+    def clear(self) -> None:
+        shutil.rmtree(self.cache_directory, ignore_errors=True)
+
+    def list_entries(self) -> List[Tuple[str, float, int]]:
+        """List the (path, modification time, size) of the entries of the current version."""
+        if not os.path.isdir(self.version_directory):
+            return []
+        entries = []
+        for name in os.listdir(self.version_directory):
+            if not name.endswith(self.ENTRY_SUFFIX):
+                continue
+            entry_path = os.path.join(self.version_directory, name)
+            try:
+                stat = os.stat(entry_path)
+            except FileNotFoundError:
+                continue
+            entries.append((entry_path, stat.st_mtime, stat.st_size))
+        return entries
+
+    @staticmethod
+    def remove_entry(entry_path: str) -> None:
+        try:
+            os.remove(entry_path)
+        except FileNotFoundError:
+            pass
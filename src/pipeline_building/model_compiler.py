@@ -0,0 +1,101 @@
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+import xlcalculator
+
+from ast_building.formula_parser import FormulaParser
+from ast_building.series_implementer import SeriesImplementer
+from ast_transformation.formula_generator import FormulaGenerator
+from ast_transformation.series_formula_generator_old import SeriesFormulaGenerator
+from objects import ExcelFile, Series, SeriesId, Table, Worksheet
+from pipeline_building.dag_sorter import DAGSorter
+from pipeline_building.series_dependencies_builder import SeriesDependenciesBuilder
+from series_extraction.series_extractor import SeriesExtractor
+from series_extraction.series_iterator import SeriesIterator
+from series_extraction.series_mapper import SeriesIntervalIndex, SeriesMapper
+from series_extraction.series_registry import SeriesRegistry
+from series_extraction.table_extractor import TableExtractor
+
+
+@dataclass
+class CompiledModel:
+    """Everything the pipeline derives from the formulas of a workbook, ready for evaluation."""
+
+    extracted_tables: Dict[Worksheet, List[Table]]
+    series_dict: Dict[str, List[Series]]
+    series_list: List[Series]
+    generic_formula_dictionary: Dict[SeriesId, xlcalculator.ast_nodes.ASTNode]
+    sorted_dag: List[SeriesId]
+    series_registry: SeriesRegistry
+
+    @property
+    def series_list_with_formulas(self) -> List[Series]:
+        return [
+            series for series in self.series_list if series.formulas != [None, None]
+        ]
+
+    @property
+    def series_list_with_values(self) -> List[Series]:
+        return [
+            series for series in self.series_list if series.formulas == [None, None]
+        ]
+
+
+class ModelCompiler:
+    @staticmethod
+    def compile_model(excel_file: ExcelFile) -> CompiledModel:
+        """Extract the series of a cleaned workbook, build their generic ASTs and sort their dependencies."""
+        extracted_tables, workbook_data = TableExtractor.extract_tables(excel_file)
+        series_dict = SeriesExtractor.extract_series(
+            extracted_tables=extracted_tables, workbook_data=workbook_data
+        )
+        series_registry = SeriesRegistry(series_dict)
+        series_index = SeriesMapper.map_series(series_dict)
+        series_list = list(SeriesIterator.iterate_series(series_dict))
+
+        generic_formula_dictionary = {}
+        for series in series_list:
+            if series.formulas == [None, None]:
+                continue
+            generic_formula_ast = ModelCompiler.build_generic_formula_ast(
+                series, series_index
+            )
+            if generic_formula_ast is not None:
+                generic_formula_dictionary[series.series_id] = generic_formula_ast
+
+        series_dependencies = SeriesDependenciesBuilder.build_dependencies(
+            generic_formula_dictionary
+        )
+        sorted_dag = DAGSorter.sort_dag(series_dependencies)
+
+        return CompiledModel(
+            extracted_tables=extracted_tables,
+            series_dict=series_dict,
+            series_list=series_list,
+            generic_formula_dictionary=generic_formula_dictionary,
+            sorted_dag=sorted_dag,
+            series_registry=series_registry,
+        )
+
+    @staticmethod
+    def build_generic_formula_ast(
+        series: Series,
+        series_index: SeriesIntervalIndex,
+    ) -> Optional[xlcalculator.ast_nodes.ASTNode]:
+        formula_1, formula_2 = SeriesFormulaGenerator.adjust_formulas(series.formulas)
+        if formula_1 is None or formula_2 is None:
+            return None
+
+        series_implementer = SeriesImplementer(
+            series_index, sheet_name=series.worksheet.sheet_name
+        )
+
+        formula_1_ast = FormulaParser.parse_formula(formula_1)
+        formula_1_ast_series = series_implementer.update_ast(formula_1_ast)
+
+        formula_2_ast = FormulaParser.parse_formula(formula_2)
+        formula_2_ast_series = series_implementer.update_ast(formula_2_ast)
+
+        return FormulaGenerator.traverse_and_replace(
+            formula_1_ast_series, formula_2_ast_series
+        )
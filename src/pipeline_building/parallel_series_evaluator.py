@@ -0,0 +1,210 @@
+import pickle
+from collections.abc import Mapping
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+from typing import Any, ClassVar, Dict, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+import xlcalculator
+from formulas.functions import Array, Error, XlError
+
+from ast_transformation.vectorized_evaluator import VectorizedEvaluator
+from instrumentation import Instrumentation
+from objects import SeriesId
+
+ColumnLayout = Dict[str, Tuple[int, int, str]]
+
+
+class SharedSeriesValues(Mapping):
+    """Series values dict reading every column from a shared memory buffer.
+
+    Numeric columns are handed out as read-only arrays over the buffer itself, other
+    columns are stored pickled and only loaded by the workers that read them.
+    """
+
+    OBJECT_DTYPE = "object"
+
+    def __init__(self, buffer: memoryview, column_layout: ColumnLayout):
+        self.buffer = buffer
+        self.column_layout = column_layout
+        self.object_columns: Dict[str, List[Any]] = {}
+
+    def __getitem__(self, series_id_string: str) -> Union[np.ndarray, List[Any]]:
+        offset, length, dtype = self.column_layout[series_id_string]
+        if dtype != self.OBJECT_DTYPE:
+            array: np.ndarray = np.ndarray(
+                (length,), dtype=dtype, buffer=self.buffer, offset=offset
+            )
+            array.flags.writeable = False
+            return array
+        if series_id_string not in self.object_columns:
+            self.object_columns[series_id_string] = pickle.loads(
+                self.buffer[offset : offset + length]
+            )
+        return self.object_columns[series_id_string]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.column_layout)
+
+    def __len__(self) -> int:
+        return len(self.column_layout)
+
+    @staticmethod
+    def get_numeric_dtype(values: List[Any]) -> Optional[str]:
+        """Get the dtype a column can be shared as without changing the type of its values."""
+        value_types = {type(value) for value in values}
+        if value_types == {float}:
+            return "float64"
+        if value_types == {int} and all(
+            np.iinfo(np.int64).min <= value <= np.iinfo(np.int64).max
+            for value in values
+        ):
+            return "int64"
+        return None
+
+    @staticmethod
+    def share(
+        series_values_dict: Dict[str, List[Any]]
+    ) -> Tuple[Optional[SharedMemory], ColumnLayout]:
+        """Copy every column into one shared memory block, numeric columns as arrays and others pickled."""
+        column_layout: ColumnLayout = {}
+        column_bytes: List[Tuple[int, bytes]] = []
+        offset = 0
+        for series_id_string, values in series_values_dict.items():
+            dtype = SharedSeriesValues.get_numeric_dtype(values)
+            if dtype is None:
+                dtype = SharedSeriesValues.OBJECT_DTYPE
+                data = pickle.dumps(values, protocol=pickle.HIGHEST_PROTOCOL)
+                length = len(data)
+            else:
+                data = np.asarray(values, dtype=dtype).tobytes()
+                length = len(values)
+            column_layout[series_id_string] = (offset, length, dtype)
+            column_bytes.append((offset, data))
+            offset += len(data)
+
+        if offset == 0:
+            return None, column_layout
+
+        shared_memory = SharedMemory(create=True, size=offset)
+        for column_offset, data in column_bytes:
+            shared_memory.buf[column_offset : column_offset + len(data)] = data
+        return shared_memory, column_layout
+
+
+class ParallelSeriesEvaluator:
+    """Evaluate the series of each dependency level concurrently on a process pool."""
+
+    worker_state: ClassVar[Dict[str, Any]] = {}
+
+    def __init__(
+        self, series_values_dict: Dict[str, List[Any]], max_workers: Optional[int]
+    ):
+        self.series_values_dict = series_values_dict
+        self.max_workers = max_workers
+
+    def evaluate_levels(
+        self,
+        levels: List[List[SeriesId]],
+        generic_formula_dictionary: Dict[SeriesId, xlcalculator.ast_nodes.ASTNode],
+    ) -> Dict[SeriesId, List[Any]]:
+        """Evaluate the series with formulas level by level, waiting for a level before starting the next."""
+        shared_memory, column_layout = SharedSeriesValues.share(self.series_values_dict)
+        shared_memory_name = shared_memory.name if shared_memory else None
+        results = {}
+        try:
+            with ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                initializer=ParallelSeriesEvaluator.initialize_worker,
+                initargs=(
+                    shared_memory_name,
+                    column_layout,
+                    Instrumentation.enabled,
+                ),
+            ) as executor:
+                for level in levels:
+                    futures = {
+                        series_id: executor.submit(
+                            ParallelSeriesEvaluator.evaluate_series,
+                            series_id,
+                            generic_formula_dictionary[series_id],
+                        )
+                        for series_id in level
+                        if generic_formula_dictionary.get(series_id)
+                    }
+                    for series_id, future in futures.items():
+                        values, counters = future.result()
+                        Instrumentation.merge_counters(counters)
+                        results[series_id] = [
+                            ParallelSeriesEvaluator.decode_value(value)
+                            for value in values
+                        ]
+        finally:
+            if shared_memory is not None:
+                shared_memory.close()
+                shared_memory.unlink()
+        return results
+
+    @staticmethod
+    def initialize_worker(
+        shared_memory_name: Optional[str],
+        column_layout: ColumnLayout,
+        instrumentation_enabled: bool,
+    ) -> None:
+        Instrumentation.enable_in_worker(instrumentation_enabled)
+        buffer = memoryview(b"")
+        if shared_memory_name is not None:
+            shared_memory = SharedMemory(name=shared_memory_name)
+            ParallelSeriesEvaluator.worker_state["shared_memory"] = shared_memory
+            buffer = shared_memory.buf
+
+        series_values = SharedSeriesValues(buffer, column_layout)
+        ParallelSeriesEvaluator.worker_state.update(
+            series_values=series_values,
+            vectorized_evaluator=VectorizedEvaluator(series_values),
+        )
+
+    @staticmethod
+    def evaluate_series(
+        series_id: SeriesId, formula_ast: xlcalculator.ast_nodes.ASTNode
+    ) -> Tuple[List[Any], Dict[str, int]]:
+        """Get the encoded values of a series and the counters incremented evaluating it."""
+        # Imported here as the pipeline builder imports this module
+        from pipeline_building.pipeline_builder import PipelineBuilder
+
+        state = ParallelSeriesEvaluator.worker_state
+        values = PipelineBuilder.get_evaluated_results_from_formula_ast(
+            series_id,
+            formula_ast,
+            state["series_values"],
+            state["vectorized_evaluator"],
+        )
+        return (
+            [ParallelSeriesEvaluator.encode_value(value) for value in values],
+            Instrumentation.take_counters(),
+        )
+
+    @staticmethod
+    def encode_value(value: Any) -> Any:
+        """Formula errors and arrays hold error tokens that cannot be pickled, send them as tagged tuples."""
+        if isinstance(value, XlError):
+            return ("XlError", str(value))
+        if isinstance(value, Array):
+            items = [
+                ParallelSeriesEvaluator.encode_value(item)
+                for item in np.asarray(value).ravel().tolist()
+            ]
+            return ("Array", items, value.shape, str(value.dtype))
+        return value
+
+    @staticmethod
+    def decode_value(value: Any) -> Any:
+        if isinstance(value, tuple) and value[0] == "XlError":
+            return Error.errors.get(value[1], XlError(value[1]))
+        if isinstance(value, tuple) and value[0] == "Array":
+            _, items, shape, dtype = value
+            array = np.empty(len(items), dtype=dtype)
+            for index, item in enumerate(items):
+                array[index] = ParallelSeriesEvaluator.decode_value(item)
+            return array.reshape(shape).view(Array)
+        return value
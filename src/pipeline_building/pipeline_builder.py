@@ -1,13 +1,21 @@
-import copy
+import dataclasses
 import xlcalculator
 import xlcalculator.ast_nodes
 
-from series_extraction.series_mapper import SeriesMapper
+from series_extraction.series_registry import SeriesRegistry
 from ast_transformation.formula_list_generator import FormulaListGenerator
-from ast_transformation.formula_evaluator import FormulaEvaluator
-
-from typing import List, Dict, Any
-
+from ast_transformation.formula_evaluator import CompiledFormula, FormulaEvaluator
+from ast_transformation.vectorized_evaluator import (
+    VectorizedEvaluator,
+    UnsupportedFormulaError,
+)
+from pipeline_building.dag_sorter import DAGSorter
+from pipeline_building.parallel_series_evaluator import ParallelSeriesEvaluator
+from pipeline_building.series_dependencies_builder import SeriesDependenciesBuilder
+
+from typing import List, Dict, Any, Optional
+
+from instrumentation import Instrumentation
 from objects import SeriesId, Series
 
 
@@ -18,59 +26,187 @@ class PipelineBuilder:
         series_id: SeriesId,
         formula_ast: xlcalculator.ast_nodes.ASTNode,
         series_values_dict: Dict[str, List[Any]],
-    ):
-        formula_list_generator = FormulaListGenerator(formula_ast, series_values_dict)
+        vectorized_evaluator: Optional[VectorizedEvaluator] = None,
+    ) -> List[Any]:
+        if vectorized_evaluator is not None:
+            try:
+                values = vectorized_evaluator.evaluate_series(series_id, formula_ast)
+                Instrumentation.count("rows_evaluated_vectorized", len(values))
+                return values
+            except UnsupportedFormulaError:
+                pass
+
         values_length = len(series_values_dict[str(series_id)])
-        formula_list = formula_list_generator.generate_formula_list(
-            0, values_length - 1
+        return PipelineBuilder.evaluate_formula_rows_one_by_one(
+            formula_ast, series_values_dict, 0, values_length
+        )
+
+    @staticmethod
+    def get_evaluated_rows_from_formula_ast(
+        formula_ast: xlcalculator.ast_nodes.ASTNode,
+        series_values_dict: Dict[str, List[Any]],
+        first_row: int,
+        row_count: int,
+        vectorized_evaluator: Optional[VectorizedEvaluator] = None,
+    ) -> List[Any]:
+        """Evaluate a block of consecutive rows of a series, used to recalculate only the rows that changed."""
+        if vectorized_evaluator is not None:
+            try:
+                return vectorized_evaluator.evaluate_rows(
+                    formula_ast, first_row, row_count
+                )
+            except UnsupportedFormulaError:
+                pass
+
+        return PipelineBuilder.evaluate_formula_rows_one_by_one(
+            formula_ast, series_values_dict, first_row, row_count
         )
-        formula_strings = [str(formula) for formula in formula_list]
 
+    @staticmethod
+    @Instrumentation.instrumented("row_by_row_evaluation")
+    def evaluate_formula_rows_one_by_one(
+        formula_ast: xlcalculator.ast_nodes.ASTNode,
+        series_values_dict: Dict[str, List[Any]],
+        first_row: int,
+        row_count: int,
+    ) -> List[Any]:
+        """Evaluate rows with the formulas library, compiling the generic formula once and binding each row's ranges.
+
+        Rows whose ranges cannot be bound are written out as formula text and evaluated on their own.
+        """
+        formula_list_generator = FormulaListGenerator(formula_ast, series_values_dict)
         formula_evaluator = FormulaEvaluator()
 
-        results = [
-            formula_evaluator.evaluate_formula(f"={formula_string}")
-            for formula_string in formula_strings
-        ]
+        template_function: Optional[CompiledFormula] = None
+        input_names: List[str] = []
+        template = formula_list_generator.generate_template()
+        try:
+            template_function = FormulaEvaluator.compile_formula(
+                template.formula_string
+            )
+            input_names = FormulaEvaluator.get_input_names(template_function)
+        except Exception:
+            # Leave formulas the parser cannot compile with names in place of ranges to the text path
+            pass
+        if set(input_names) != set(template.input_names):
+            template_function = None
+
+        results = []
+        for row in range(first_row, first_row + row_count):
+            template_inputs = (
+                formula_list_generator.generate_template_inputs(template, row)
+                if template_function is not None
+                else None
+            )
+            if template_function is None or template_inputs is None:
+                formula = formula_list_generator.generate_single_formula(row)
+                results.append(formula_evaluator.evaluate_formula(f"={formula}"))
+            else:
+                results.append(
+                    FormulaEvaluator.evaluate_compiled(
+                        template_function,
+                        [template_inputs[input_name] for input_name in input_names],
+                    )
+                )
 
         return results
 
     @staticmethod
+    def evaluate_series_sequentially(
+        sorted_dag: List[SeriesId],
+        generic_formula_dictionary: Dict[SeriesId, xlcalculator.ast_nodes.ASTNode],
+        series_values_dict: Dict[str, List[Any]],
+        vectorized: bool = True,
+    ) -> Dict[SeriesId, List[Any]]:
+        vectorized_evaluator = (
+            VectorizedEvaluator(series_values_dict) if vectorized else None
+        )
+
+        evaluated_values = {}
+        for series_id in sorted_dag:
+            formula_ast = generic_formula_dictionary.get(series_id)
+            if formula_ast:
+                evaluated_values[series_id] = (
+                    PipelineBuilder.get_evaluated_results_from_formula_ast(
+                        series_id,
+                        formula_ast,
+                        series_values_dict,
+                        vectorized_evaluator,
+                    )
+                )
+        return evaluated_values
+
+    @staticmethod
+    def evaluate_series_levels(
+        sorted_dag: List[SeriesId],
+        generic_formula_dictionary: Dict[SeriesId, xlcalculator.ast_nodes.ASTNode],
+        series_values_dict: Dict[str, List[Any]],
+        max_workers: Optional[int] = None,
+    ) -> Dict[SeriesId, List[Any]]:
+        """Evaluate the series of each dependency level concurrently on a process pool."""
+        series_to_evaluate = set(sorted_dag)
+        dependencies = SeriesDependenciesBuilder.build_dependencies(
+            generic_formula_dictionary
+        )
+        levels = [
+            [series_id for series_id in level if series_id in series_to_evaluate]
+            for level in DAGSorter.sort_dag_levels(dependencies)
+        ]
+        parallel_evaluator = ParallelSeriesEvaluator(series_values_dict, max_workers)
+        return parallel_evaluator.evaluate_levels(levels, generic_formula_dictionary)
+
+    @staticmethod
+    @Instrumentation.instrumented("evaluation")
     def create_series_list(
         sorted_dag: List[SeriesId],
         generic_formula_dictionary: Dict[SeriesId, xlcalculator.ast_nodes.ASTNode],
         series_dict: Dict[str, List[Series]],
         series_values_dict_raw: Dict[str, List[Any]],
         series_list_with_values: List[Series],
-    ):
-
-        sorted_dag = copy.deepcopy(sorted_dag)
-        generic_formula_dictionary = copy.deepcopy(generic_formula_dictionary)
-        series_dict = copy.deepcopy(series_dict)
-        series_values_dict_raw = copy.deepcopy(series_values_dict_raw)
-        series_list_with_values = copy.deepcopy(series_list_with_values)
+        vectorized: bool = True,
+        max_workers: Optional[int] = None,
+        series_registry: Optional[SeriesRegistry] = None,
+    ) -> List[Series]:
+        """Create the output series without deep copies, their values are tuples so no series can alter another or the inputs.
+
+        Series are looked up in series_registry, which is only read, built from series_dict when not given.
+        """
+        if series_registry is None:
+            series_registry = SeriesRegistry(series_dict)
+
+        if max_workers is not None:
+            evaluated_values = PipelineBuilder.evaluate_series_levels(
+                sorted_dag,
+                generic_formula_dictionary,
+                series_values_dict_raw,
+                max_workers,
+            )
+        else:
+            evaluated_values = PipelineBuilder.evaluate_series_sequentially(
+                sorted_dag,
+                generic_formula_dictionary,
+                series_values_dict_raw,
+                vectorized,
+            )
 
         series_list_new_raw = []
         for series_id in sorted_dag:
-            formula_ast = generic_formula_dictionary.get(series_id)
-
-            series = SeriesMapper.get_series_from_series_id(series_id, series_dict)
-            if formula_ast:
-                values = PipelineBuilder.get_evaluated_results_from_formula_ast(
-                    series_id, formula_ast, series_values_dict_raw
+            if series_id in evaluated_values:
+                values = tuple(evaluated_values[series_id])
+                series = series_registry.get_series_by_id(series_id)
+                series_list_new_raw.append(
+                    dataclasses.replace(
+                        series, values=values, series_length=len(values)
+                    )
                 )
-                series.values = values
-                series.series_length = len(values)
-                series_list_new_raw.append(series)
 
         series_list_with_values_raw = []
 
         for series in series_list_with_values:
-            series_id = series.series_id
-            values = series_values_dict_raw[str(series_id)]
-            series.values = values
-            series.series_length = len(values)
-            series_list_with_values_raw.append(series)
+            values = tuple(series_values_dict_raw[str(series.series_id)])
+            series_list_with_values_raw.append(
+                dataclasses.replace(series, values=values, series_length=len(values))
+            )
 
         series_list_updated_raw = series_list_new_raw + series_list_with_values_raw
 
@@ -1,11 +1,12 @@
 import xlcalculator
-import ast
-from ast_transformation.formula_generator_old import SeriesIdLoader
+
+from instrumentation import Instrumentation
 
 
 class SeriesDependenciesBuilder:
 
     @staticmethod
+    @Instrumentation.instrumented("dependency_build")
     def build_dependencies(formula_1_ast_series_list):
 
         series_dependencies = {}
@@ -34,17 +35,13 @@ class SeriesDependenciesBuilder:
     @staticmethod
     def get_series_ids(formula_1_ast_series):
 
-        series_range_strings = SeriesDependenciesBuilder.extract_range_values(
+        series_range_references = SeriesDependenciesBuilder.extract_range_values(
             formula_1_ast_series
         )
 
         series_ids = []
-        for series_range_string in series_range_strings:
-
-            series_id_strings = ast.literal_eval(str(series_range_string))[0]
-            for series_id_string in series_id_strings:
-                series_id = SeriesIdLoader.load_series_id_from_string(series_id_string)
-                series_ids.append(series_id)
+        for series_range_reference in series_range_references:
+            series_ids.extend(series_range_reference.series_ids)
         return series_ids
 
     @staticmethod
@@ -66,7 +63,7 @@ class SeriesDependenciesBuilder:
 
     @staticmethod
     def handle_range_node(node, range_values):
-        """Extract the value from a RangeNode and add it to the list."""
+        """Extract the SeriesRangeReference from a RangeNode and add it to the list."""
         range_values.append(node.tvalue)
 
     @staticmethod
@@ -1,9 +1,58 @@
+import sys
+
 import openpyxl
-from objects import ExcelFile
+from openpyxl.worksheet._read_only import ReadOnlyWorksheet
+from openpyxl.worksheet._reader import WorkSheetParser, FORMULA_TAG
+from openpyxl.worksheet.formula import ArrayFormula
+from objects import ExcelFile, SheetCellBuffer
+from instrumentation import Instrumentation
+from series_extraction.excel_cleaner import ExcelCleaner
+
+from typing import Any, Dict, Iterator, List, Optional
+
+
+class DualViewSheetParser(WorkSheetParser):
+    """Worksheet XML parser returning the cached value and the formula of each cell in one pass.
+
+    With clean_formulas, formulas are cleaned as ExcelCleaner does as they are parsed.
+    """
+
+    def __init__(
+        self,
+        *args: Any,
+        include_formulas: bool = True,
+        clean_formulas: bool = False,
+        **kwargs: Any,
+    ) -> None:
+        super().__init__(*args, data_only=True, **kwargs)
+        self.include_formulas = include_formulas
+        self.clean_formulas = clean_formulas
+
+    # Elements are from lxml or ElementTree, depending on which openpyxl found
+    def parse_cell(self, element: Any) -> Dict[str, Any]:
+        cell = super().parse_cell(element)
+        cell["formula"] = (
+            self.parse_cell_formula(element) if self.include_formulas else None
+        )
+        return cell
+
+    def parse_cell_formula(self, element: Any) -> Optional[str]:
+        if element.find(FORMULA_TAG) is None:
+            return None
+        formula = self.parse_formula(element)
+        if isinstance(formula, ArrayFormula):
+            formula = formula.text
+        elif not isinstance(formula, str) or not formula.startswith("="):
+            return None
+        if self.clean_formulas:
+            # Shared formulas are translated before cleaning, their absolute references must not move
+            return ExcelCleaner.clean_formula(formula)
+        return formula
 
 
 class ExcelLoader:
     @staticmethod
+    @Instrumentation.instrumented("load")
     def load_file(file_path: str) -> ExcelFile:
         "Load an Excel file into an ExcelFile object, capturing both formulae and values."
         workbook_with_formulas = openpyxl.load_workbook(file_path, data_only=False)
@@ -13,3 +62,84 @@ class ExcelLoader:
             workbook_with_formulas=workbook_with_formulas,
             workbook_with_values=workbook_with_values,
         )
+
+    @staticmethod
+    def stream_file(
+        file_path: str, include_formulas: bool = True, clean_formulas: bool = False
+    ) -> Iterator[SheetCellBuffer]:
+        "Stream an Excel file one sheet at a time, reading formulae and values in a single pass."
+        workbook = openpyxl.load_workbook(file_path, read_only=True)
+        try:
+            for worksheet in workbook.worksheets:
+                yield ExcelLoader._read_sheet_buffer(
+                    worksheet, include_formulas, clean_formulas
+                )
+        finally:
+            workbook.close()
+
+    @staticmethod
+    def get_sheet_names(file_path: str) -> List[str]:
+        "Get the names of the worksheets of an Excel file, in workbook order, without reading their cells."
+        workbook = openpyxl.load_workbook(file_path, read_only=True)
+        try:
+            return [worksheet.title for worksheet in workbook.worksheets]
+        finally:
+            workbook.close()
+
+    @staticmethod
+    def read_sheet(
+        file_path: str,
+        sheet_name: str,
+        include_formulas: bool = True,
+        clean_formulas: bool = False,
+    ) -> SheetCellBuffer:
+        "Read a single worksheet of an Excel file into a buffer, as stream_file does for each sheet."
+        workbook = openpyxl.load_workbook(file_path, read_only=True)
+        try:
+            return ExcelLoader._read_sheet_buffer(
+                workbook[sheet_name], include_formulas, clean_formulas
+            )
+        finally:
+            workbook.close()
+
+    @staticmethod
+    def _read_sheet_buffer(
+        worksheet: ReadOnlyWorksheet,
+        include_formulas: bool,
+        clean_formulas: bool = False,
+    ) -> SheetCellBuffer:
+        """Parse the XML of a read-only worksheet into a buffer of its non-empty cells."""
+        buffer = SheetCellBuffer(sheet_name=worksheet.title)
+        source = worksheet._get_source()
+        try:
+            parser = DualViewSheetParser(
+                source,
+                worksheet._shared_strings,
+                epoch=worksheet.parent.epoch,
+                date_formats=worksheet.parent._date_formats,
+                timedelta_formats=worksheet.parent._timedelta_formats,
+                include_formulas=include_formulas,
+                clean_formulas=clean_formulas,
+            )
+            # Rows and columns start at 1, so max_row stays 0 for a sheet without cells
+            min_row = min_column = sys.maxsize
+            max_row = max_column = 0
+            for _, row_cells in parser.parse():
+                for cell in row_cells:
+                    row, column = cell["row"], cell["column"]
+                    min_row, max_row = min(min_row, row), max(max_row, row)
+                    min_column = min(min_column, column)
+                    max_column = max(max_column, column)
+                    if cell["value"] is None and cell["formula"] is None:
+                        continue
+                    buffer.rows.append(row)
+                    buffer.columns.append(column)
+                    buffer.values.append(cell["value"])
+                    buffer.formulas.append(cell["formula"])
+        finally:
+            source.close()
+
+        if max_row:
+            buffer.min_row, buffer.max_row = min_row, max_row
+            buffer.min_column, buffer.max_column = min_column, max_column
+        return buffer
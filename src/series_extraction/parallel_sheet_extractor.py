@@ -0,0 +1,97 @@
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from typing import Dict, List, Optional, Tuple
+
+from instrumentation import Instrumentation
+from objects import Series, SheetData, Table, WorkbookData, Worksheet
+from series_extraction.excel_loader import ExcelLoader
+from series_extraction.series_extractor import SeriesExtractor
+from series_extraction.table_extractor import TableExtractor
+
+# Cell data, tables and series of one sheet
+SheetExtraction = Tuple[SheetData, List[Table], List[Series]]
+
+
+class ParallelSheetExtractor:
+    """Extract the cells, tables and series of each sheet of an Excel file on a process pool.
+
+    Sheets are independent until formulas are resolved, so each worker reads one sheet
+    from the file and the results are merged in workbook order, as the sequential
+    streamed extraction produces them.
+    """
+
+    @staticmethod
+    @Instrumentation.instrumented("sheet_extraction")
+    def extract_workbook(
+        file_path: str, max_workers: Optional[int] = None, clean: bool = True
+    ) -> Tuple[Dict[Worksheet, List[Table]], WorkbookData, Dict[str, List[Series]]]:
+        """Get the tables, workbook cell data and series of every sheet, cleaning formulas first unless the file is clean."""
+        sheet_names = ExcelLoader.get_sheet_names(file_path)
+
+        if max_workers == 1 or len(sheet_names) < 2:
+            sheet_extractions = [
+                ParallelSheetExtractor.extract_sheet(file_path, sheet_name, clean)
+                for sheet_name in sheet_names
+            ]
+        else:
+            with ProcessPoolExecutor(
+                max_workers=max_workers,
+                initializer=Instrumentation.enable_in_worker,
+                initargs=(Instrumentation.enabled,),
+            ) as executor:
+                sheet_extractions = []
+                for sheet_extraction, counters in executor.map(
+                    ParallelSheetExtractor.extract_sheet_in_worker,
+                    repeat(file_path),
+                    sheet_names,
+                    repeat(clean),
+                ):
+                    Instrumentation.merge_counters(counters)
+                    sheet_extractions.append(sheet_extraction)
+
+        return ParallelSheetExtractor.merge_sheet_extractions(
+            sheet_names, sheet_extractions
+        )
+
+    @staticmethod
+    def extract_sheet(file_path: str, sheet_name: str, clean: bool) -> SheetExtraction:
+        sheet_buffer = ExcelLoader.read_sheet(
+            file_path, sheet_name, clean_formulas=clean
+        )
+
+        extracted_tables, workbook_data = TableExtractor.extract_tables_from_buffers(
+            [sheet_buffer]
+        )
+        series_dict = SeriesExtractor.extract_series(
+            extracted_tables=extracted_tables, workbook_data=workbook_data
+        )
+        return (
+            workbook_data.get_sheet_data(sheet_name),
+            extracted_tables[Worksheet(sheet_name=sheet_name)],
+            series_dict[sheet_name],
+        )
+
+    @staticmethod
+    def extract_sheet_in_worker(
+        file_path: str, sheet_name: str, clean: bool
+    ) -> Tuple[SheetExtraction, Dict[str, int]]:
+        """Extract a sheet on a pool worker, with the counters incremented extracting it."""
+        sheet_extraction = ParallelSheetExtractor.extract_sheet(
+            file_path, sheet_name, clean
+        )
+        return sheet_extraction, Instrumentation.take_counters()
+
+    @staticmethod
+    def merge_sheet_extractions(
+        sheet_names: List[str], sheet_extractions: List[SheetExtraction]
+    ) -> Tuple[Dict[Worksheet, List[Table]], WorkbookData, Dict[str, List[Series]]]:
+        extracted_tables = {}
+        workbook_data = WorkbookData()
+        series_dict = {}
+        for sheet_name, (sheet_data, tables, series) in zip(
+            sheet_names, sheet_extractions
+        ):
+            workbook_data.add_sheet_data(sheet_name, sheet_data)
+            extracted_tables[Worksheet(sheet_name=sheet_name)] = tables
+            series_dict[sheet_name] = series
+        return extracted_tables, workbook_data, series_dict
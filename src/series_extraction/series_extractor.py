@@ -7,9 +7,10 @@ from objects import (
     SeriesId,
     SeriesDataType,
 )
-from openpyxl.utils import get_column_letter
+from excel_utils import ExcelUtils
 
 from typing import Dict, List, Tuple
+from instrumentation import Instrumentation
 
 
 class SeriesExtractor:
@@ -30,10 +31,9 @@ class SeriesExtractor:
         row_formulas, row_values = [], []
         sheet_data = workbook_data.get_sheet_data(sheet.sheet_name)
         for offset in range(1, 3):
-            cell_key = f"{get_column_letter(index)}{start_row_or_column + offset}"
-            cell = sheet_data.get(cell_key)
-            row_formulas.append(cell.formula if cell else None)
-            row_values.append(cell.value if cell else None)
+            row = start_row_or_column + offset
+            row_formulas.append(sheet_data.get_formula(row, index))
+            row_values.append(sheet_data.get_value(row, index))
 
         series_header_cell_row, series_header_cell_column = (
             SeriesExtractor.calculate_header_cell(start_cell_row, start_cell_column)
@@ -79,7 +79,8 @@ class SeriesExtractor:
         """Handle the series extraction."""
         series_data = {}
         for index, header in enumerate(header_values, start=start_column):
-            range_identifier = f"{get_column_letter(index)}{start_row}:{get_column_letter(index)}{end_row}"
+            column_letter = ExcelUtils.get_column_letter_from_number(index)
+            range_identifier = f"{column_letter}{start_row}:{column_letter}{end_row}"
             series = SeriesExtractor.build_series(
                 workbook_data,
                 sheet,
@@ -122,6 +123,7 @@ class SeriesExtractor:
         return (series_starting_cell_row - 1, series_starting_cell_column)
 
     @staticmethod
+    @Instrumentation.instrumented("series_extraction")
     def extract_series(
         extracted_tables: Dict[Worksheet, List[Table]],
         workbook_data: WorkbookData,
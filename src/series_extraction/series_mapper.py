@@ -1,47 +1,127 @@
-from typing import List, Tuple
+from bisect import bisect_left, bisect_right
+from typing import Dict, List, Optional, Tuple
 
-from objects import Cell, Series, SeriesId, Worksheet
+from instrumentation import Instrumentation
+from objects import Series, SeriesRange
 
 
-class SeriesMapper:
+class ColumnSpans:
+    """Series of one column sorted by their first row, with the rows each one covers."""
 
-    @staticmethod
-    def get_cells(series: Series) -> List[Cell]:
-        """Get list of all Excel cells in a series"""
-        cells = []
-        offset = range(series.series_length)
-
-        for i in offset:
-            cell = Cell(
-                column=series.series_starting_cell.column + i,
-                row=series.series_starting_cell.row + i,
-                coordinate=None,
-                value=None,
-                value_type=None,
-            )
-            cells.append(cell)
-        return cells
+    def __init__(self) -> None:
+        self.start_rows: List[int] = []
+        self.end_rows: List[int] = []
+        self.series: List[Series] = []
 
-    @staticmethod
-    def map_series(
-        series_dict: dict[str, Series]
-    ) -> dict[Worksheet, dict[Cell, Tuple[int, Series]]]:
-        """Get mapping from Cell to row index and Series"""
-        series_mapping = {}
-        for sheet_name, series in series_dict.items():
-            worksheet = Worksheet(sheet_name=sheet_name)
-            series_mapping[worksheet] = {}
-            for _, s in enumerate(series):
-                cells = SeriesMapper.get_cells(s)
-                for index, cell in enumerate(cells):
-                    series_mapping[worksheet][cell] = (index, s)
-        return series_mapping
+    def add_series(self, series: Series) -> None:
+        start_row = series.series_starting_cell.row
+        position = bisect_right(self.start_rows, start_row)
+        self.start_rows.insert(position, start_row)
+        self.end_rows.insert(position, start_row + series.series_length - 1)
+        self.series.insert(position, series)
+
+    def find_spans(self, start_row: int, end_row: int) -> range:
+        """Get the positions of the series covering rows between start_row and end_row."""
+        # Series of a column do not overlap, so their end rows are sorted as well
+        return range(
+            bisect_left(self.end_rows, start_row),
+            bisect_right(self.start_rows, end_row),
+        )
+
+
+class SeriesIntervalIndex:
+    """Series of each sheet by column, to find the series and rows under a cell range without visiting its cells.
+
+    A range is resolved by bisecting the sorted columns of its sheet, then the row spans
+    of each column it covers, so it costs O(log n + k) for the k series it holds.
+    """
+
+    def __init__(self) -> None:
+        self.sheet_columns: Dict[str, List[int]] = {}
+        self.sheet_column_spans: Dict[str, Dict[int, ColumnSpans]] = {}
+
+    def add_series(self, sheet_name: str, series: Series) -> None:
+        if series.series_length < 1:
+            return
+        columns = self.sheet_columns.setdefault(sheet_name, [])
+        column_spans = self.sheet_column_spans.setdefault(sheet_name, {})
+        column = series.series_starting_cell.column
+        if column not in column_spans:
+            columns.insert(bisect_left(columns, column), column)
+            column_spans[column] = ColumnSpans()
+        column_spans[column].add_series(series)
+
+    def find_series(
+        self,
+        sheet_name: str,
+        start_column: int,
+        start_row: int,
+        end_column: int,
+        end_row: int,
+    ) -> List[Tuple[int, int, int, Series]]:
+        """Get the column, first and last row index of each series under a range, ordered by column."""
+        columns = self.sheet_columns.get(sheet_name, [])
+        column_spans = self.sheet_column_spans.get(sheet_name, {})
+        found_series = []
+        for column in columns[
+            bisect_left(columns, start_column) : bisect_right(columns, end_column)
+        ]:
+            spans = column_spans[column]
+            for position in spans.find_spans(start_row, end_row):
+                series_start_row = spans.start_rows[position]
+                found_series.append(
+                    (
+                        column,
+                        max(start_row, series_start_row) - series_start_row,
+                        min(end_row, spans.end_rows[position]) - series_start_row,
+                        spans.series[position],
+                    )
+                )
+        return found_series
+
+    def get_series_range(
+        self,
+        sheet_name: str,
+        start_column: int,
+        start_row: int,
+        end_column: int,
+        end_row: int,
+        is_column_range: bool,
+    ) -> Optional[SeriesRange]:
+        """Get the series under a range, indexed from its first to its last cell in row-major order.
+
+        Returns None when no series lies under the range.
+        """
+        found_series = self.find_series(
+            sheet_name, start_column, start_row, end_column, end_row
+        )
+        if not found_series:
+            return None
+        # Cells are read row by row, so the first cell is on the lowest row and leftmost column
+        _, start_index, _, _ = min(
+            found_series,
+            key=lambda item: (item[3].series_starting_cell.row + item[1], item[0]),
+        )
+        _, _, end_index, _ = max(
+            found_series,
+            key=lambda item: (item[3].series_starting_cell.row + item[2], item[0]),
+        )
+        return SeriesRange(
+            series=[series for _, _, _, series in found_series],
+            start_index=start_index,
+            end_index=end_index,
+            is_column_range=is_column_range,
+        )
+
+
+class SeriesMapper:
 
     @staticmethod
-    def get_series_from_series_id(
-        series_id: SeriesId, series_dict: dict[str, List[Series]]
-    ) -> Series:
-        sheet_name = series_id.sheet_name
-        series_list = series_dict[sheet_name]
-        series = next(series for series in series_list if series.series_id == series_id)
-        return series
+    @Instrumentation.instrumented("series_mapping")
+    def map_series(series_dict: dict[str, List[Series]]) -> SeriesIntervalIndex:
+        """Index the series of every sheet by column and row span"""
+        series_index = SeriesIntervalIndex()
+        for sheet_name, series in series_dict.items():
+            for s in series:
+                series_index.add_series(sheet_name, s)
+        return series_index
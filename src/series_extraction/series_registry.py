@@ -0,0 +1,29 @@
+from typing import Dict, List, Optional
+
+from objects import Series, SeriesId
+
+
+class SeriesRegistry:
+    """Every series of a workbook keyed by its id.
+
+    Each lookup is a dictionary access instead of a scan of the series of a sheet.
+    """
+
+    def __init__(self, series_dict: Optional[Dict[str, List[Series]]] = None) -> None:
+        self.series: Dict[SeriesId, Series] = {}
+        for series_list in (series_dict or {}).values():
+            for series in series_list:
+                self.register(series)
+
+    def __len__(self) -> int:
+        return len(self.series)
+
+    def __contains__(self, series_id: SeriesId) -> bool:
+        return series_id in self.series
+
+    def register(self, series: Series) -> None:
+        """Add a series, a series registered again replaces the previous one."""
+        self.series[series.series_id] = series
+
+    def get_series_by_id(self, series_id: SeriesId) -> Series:
+        return self.series[series_id]
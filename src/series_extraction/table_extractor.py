@@ -6,84 +6,74 @@ from objects import (
     Cell,
     CellRange,
     WorkbookData,
+    SheetCellBuffer,
+    SheetData,
 )
-from excel_utils import ExcelUtils
-from typing import Dict, List, Set, Tuple, Optional, Union
+from typing import Any, Dict, Iterable, List, Set, Tuple, Optional, Union
+from instrumentation import Instrumentation
 import openpyxl
 
 
 class CellOperations:
 
+    ADJACENT_OFFSETS = [
+        (row_offset, column_offset)
+        for row_offset in (-1, 0, 1)
+        for column_offset in (-1, 0, 1)
+        if (row_offset, column_offset) != (0, 0)
+    ]
+
     @staticmethod
-    def _cells_are_adjacent(cell1: Cell, cell2: Cell) -> bool:
-        """Check if two cells are adjacent based on their row and column indices."""
-        return abs(cell1.row - cell2.row) <= 1 and abs(cell1.column - cell2.column) <= 1
+    def _get_adjacent_positions(row: int, column: int) -> List[Tuple[int, int]]:
+        """Get the (row, column) positions of the eight cells around a cell."""
+        return [
+            (row + row_offset, column + column_offset)
+            for row_offset, column_offset in CellOperations.ADJACENT_OFFSETS
+        ]
 
     @staticmethod
-    def _extract_non_empty_cells(sheet_data: Dict) -> Set[Cell]:
-        """Extract non-empty cells from the sheet data."""
-        return {cell for cell in sheet_data.values() if cell.value is not None}
+    def _extract_non_empty_positions(sheet_data: SheetData) -> List[Tuple[int, int]]:
+        """Extract the (row, column) positions of non-empty cells, in sheet order."""
+        return sheet_data.get_non_empty_positions()
 
 
 class TableLocator:
 
-    @staticmethod
-    def _process_adjacent_cells(
-        frontier: Set[Cell], non_empty_cells: Set[Cell]
-    ) -> Set[Cell]:
-        """Identify and process all adjacent cells for the given frontier."""
-        new_frontier = set()
-        for frontier_cell in frontier:
-            adjacent_cells = {
-                cell
-                for cell in non_empty_cells
-                if CellOperations._cells_are_adjacent(cell, frontier_cell)
-            }
-            non_empty_cells.difference_update(adjacent_cells)
-            new_frontier.update(adjacent_cells)
-        return new_frontier
-
-    @staticmethod
-    def _update_cell_cluster(
-        cluster: Set[Cell], new_frontier: Set[Cell]
-    ) -> Tuple[Set[Cell], int, int, int, int]:
-        """Update the cluster with new cells and adjust the boundaries."""
-        cluster.update(new_frontier)
-        min_row = min(cluster, key=lambda x: x.row).row
-        max_row = max(cluster, key=lambda x: x.row).row
-        min_col = min(cluster, key=lambda x: x.column).column
-        max_col = max(cluster, key=lambda x: x.column).column
-        return cluster, min_row, max_row, min_col, max_col
-
     @staticmethod
     def _expand_cell_cluster(
-        frontier: Set[Cell], non_empty_cells: Set[Cell]
-    ) -> Tuple[Set[Cell], int, int, int, int]:
-        """Expand the cluster from the frontier cells, updating boundaries."""
-        cluster = set(frontier)
-        while frontier:
-            new_frontier = TableLocator._process_adjacent_cells(
-                frontier, non_empty_cells
-            )
-            cluster, min_row, max_row, min_col, max_col = (
-                TableLocator._update_cell_cluster(cluster, new_frontier)
-            )
-            frontier = new_frontier
+        initial_position: Tuple[int, int], unvisited_positions: Set[Tuple[int, int]]
+    ) -> Tuple[int, int, int, int]:
+        """Flood fill the cluster of adjacent non-empty cells from a position, returning its boundaries."""
+        unvisited_positions.discard(initial_position)
+        min_row = max_row = initial_position[0]
+        min_col = max_col = initial_position[1]
+        frontier = [initial_position]
 
-        return cluster, min_row, max_row, min_col, max_col
+        while frontier:
+            row, column = frontier.pop()
+            min_row, max_row = min(min_row, row), max(max_row, row)
+            min_col, max_col = min(min_col, column), max(max_col, column)
+            for adjacent_position in CellOperations._get_adjacent_positions(
+                row, column
+            ):
+                if adjacent_position in unvisited_positions:
+                    unvisited_positions.remove(adjacent_position)
+                    frontier.append(adjacent_position)
+
+        return min_row, max_row, min_col, max_col
 
     @staticmethod
-    def _find_table_boundaries(
-        sheet_name: str, sheet_data: Dict[str, Cell]
-    ) -> List[Table]:
+    def _find_table_boundaries(sheet_name: str, sheet_data: SheetData) -> List[Table]:
         """Identify table boundaries by clustering adjacent non-empty cells and return as Table objects."""
-        non_empty_cells = CellOperations._extract_non_empty_cells(sheet_data)
+        non_empty_positions = CellOperations._extract_non_empty_positions(sheet_data)
+        unvisited_positions = set(non_empty_positions)
         tables = []
 
-        while non_empty_cells:
-            initial_cell = non_empty_cells.pop()
-            cluster, min_row, max_row, min_col, max_col = (
-                TableLocator._expand_cell_cluster({initial_cell}, non_empty_cells)
+        for initial_position in non_empty_positions:
+            if initial_position not in unvisited_positions:
+                continue
+            min_row, max_row, min_col, max_col = TableLocator._expand_cell_cluster(
+                initial_position, unvisited_positions
             )
             table = Table(
                 name=f"{sheet_name}_{len(tables) + 1}",
@@ -121,7 +111,7 @@ class DataExtractor:
 
     @staticmethod
     def _are_first_row_values_strings(
-        range_input: CellRange, data_object: Dict[str, Cell]
+        range_input: CellRange, data_object: SheetData
     ) -> Tuple[bool, Optional[List[Union[int, str, float, bool]]]]:
 
         start_cell = range_input.start_cell
@@ -130,19 +120,16 @@ class DataExtractor:
         header_values = []
 
         for column in range(start_cell.column, end_cell.column + 1):
-            cell_coordinate = (
-                f"{ExcelUtils.get_column_letter_from_number(column)}{start_cell.row}"
-            )
-            if data_object[cell_coordinate].value_type != "str":
+            if data_object.get_value_type(start_cell.row, column) != "str":
                 return False, None
             else:
-                header_values.append(data_object[cell_coordinate].value)
+                header_values.append(data_object.get_value(start_cell.row, column))
 
         return True, header_values
 
     @staticmethod
     def _get_first_column_values(
-        range_input: CellRange, data_object: Dict[str, Cell]
+        range_input: CellRange, data_object: SheetData
     ) -> List[Union[int, str, float, bool]]:
         """Get values from the first column of a range."""
         start_cell = range_input.start_cell
@@ -151,10 +138,7 @@ class DataExtractor:
         first_column_values = []
 
         for row in range(start_cell.row, end_cell.row + 1):
-            cell_coordinate = (
-                f"{ExcelUtils.get_column_letter_from_number(start_cell.column)}{row}"
-            )
-            first_column_values.append(data_object[cell_coordinate].value)
+            first_column_values.append(data_object.get_value(row, start_cell.column))
 
         return first_column_values
 
@@ -181,6 +165,7 @@ class DataExtractor:
 class TableExtractor:
 
     @staticmethod
+    @Instrumentation.instrumented("table_extraction")
     def extract_tables(
         excel_file: ExcelFile,
     ) -> Tuple[Dict[Worksheet, List[Table]], WorkbookData]:
@@ -194,6 +179,24 @@ class TableExtractor:
             sheet_data = TableExtractor._extract_sheet_data(ws_values, ws_formulas)
             workbook_data.add_sheet_data(worksheet.sheet_name, sheet_data)
 
+        return TableExtractor._locate_tables(workbook_data), workbook_data
+
+    @staticmethod
+    @Instrumentation.instrumented("table_extraction")
+    def extract_tables_from_buffers(
+        sheet_buffers: Iterable[SheetCellBuffer],
+    ) -> Tuple[Dict[Worksheet, List[Table]], WorkbookData]:
+        """Extract tables from streamed sheet buffers, as extract_tables does for a loaded Excel file."""
+        workbook_data = WorkbookData()
+        for sheet_buffer in sheet_buffers:
+            sheet_data = TableExtractor._extract_sheet_data_from_buffer(sheet_buffer)
+            workbook_data.add_sheet_data(sheet_buffer.sheet_name, sheet_data)
+
+        return TableExtractor._locate_tables(workbook_data), workbook_data
+
+    @staticmethod
+    def _locate_tables(workbook_data: WorkbookData) -> Dict[Worksheet, List[Table]]:
+        """Locate the tables of every sheet and key them by worksheet."""
         located_tables = DataExtractor._get_header_location_and_values(workbook_data)
 
         extracted_tables = {}
@@ -202,42 +205,88 @@ class TableExtractor:
                 Worksheet(sheet_name=located_table.worksheet.sheet_name)
             ] = located_table.tables
 
-        return extracted_tables, workbook_data
+        return extracted_tables
 
     @staticmethod
-    def _extract_cell_data(
-        cell_with_value: openpyxl.cell.cell.Cell,
-        cell_with_formula: openpyxl.cell.cell.Cell,
-    ) -> Cell:
-        """Extract data from a cell and return as a Cell object."""
-        formula = (
-            cell_with_formula.value
-            if isinstance(cell_with_formula.value, str)
-            and cell_with_formula.value.startswith("=")
-            else None
+    def _get_formula(value_with_formula: Any) -> Optional[str]:
+        """Get the formula of a cell from its value in a workbook loaded with formulas."""
+        if isinstance(value_with_formula, str) and value_with_formula.startswith("="):
+            return value_with_formula
+        return None
+
+    @staticmethod
+    def _extract_sheet_data(
+        worksheet_with_values: openpyxl.worksheet.worksheet.Worksheet,
+        worksheet_with_formulas: openpyxl.worksheet.worksheet.Worksheet,
+    ) -> SheetData:
+        """Extract data from a worksheet into a SheetData covering the sheet from A1.
+
+        Only the cells openpyxl holds are visited, blanks between scattered tables are never read.
+        """
+        # Both views are read over the rectangle they share, as zipping their rows did
+        max_row = min(worksheet_with_values.max_row, worksheet_with_formulas.max_row)
+        max_column = min(
+            worksheet_with_values.max_column, worksheet_with_formulas.max_column
         )
-        return Cell(
-            column=cell_with_value.column,
-            row=cell_with_value.row,
-            coordinate=cell_with_value.coordinate,
-            sheet_name=cell_with_value.parent.title,
-            value=cell_with_value.value,
-            value_type=type(cell_with_value.value).__name__,
-            formula=formula,
+        value_cells = TableExtractor._get_populated_cells(worksheet_with_values)
+        formula_cells = TableExtractor._get_populated_cells(worksheet_with_formulas)
+
+        rows, columns, values, formulas = [], [], [], []
+        for row, column in sorted(value_cells.keys() | formula_cells.keys()):
+            if row > max_row or column > max_column:
+                continue
+            value = value_cells.get((row, column))
+            formula = TableExtractor._get_formula(formula_cells.get((row, column)))
+            if value is None and formula is None:
+                continue
+            rows.append(row)
+            columns.append(column)
+            values.append(value)
+            formulas.append(formula)
+        Instrumentation.count("cells_visited", len(value_cells) + len(formula_cells))
+        return SheetData.from_cells(
+            worksheet_with_values.title,
+            worksheet_with_values.max_row,
+            worksheet_with_values.max_column,
+            rows,
+            columns,
+            values,
+            formulas,
         )
 
     @staticmethod
-    def _extract_sheet_data(
-        worksheet_with_values: Worksheet, worksheet_with_formulas: Worksheet
-    ) -> Dict[str, Cell]:
-        """Extract data from a worksheet and return as a dictionary of cells."""
-        sheet_data = {}
-        for row_values, row_formulas in zip(
-            worksheet_with_values.iter_rows(), worksheet_with_formulas.iter_rows()
-        ):
-            for cell_with_value, cell_with_formula in zip(row_values, row_formulas):
-                cell = TableExtractor._extract_cell_data(
-                    cell_with_value, cell_with_formula
-                )
-                sheet_data[cell.coordinate] = cell
-        return sheet_data
+    def _get_populated_cells(
+        worksheet: openpyxl.worksheet.worksheet.Worksheet,
+    ) -> Dict[Tuple[int, int], Any]:
+        """Get the values of the cells stored in a worksheet keyed by (row, column), skipping empty ones."""
+        # A loaded worksheet keeps the cells it read in a sparse dictionary keyed by
+        # (row, column), filled once on load and only grown by cell access, which this
+        # read does not do. Read-only worksheets have no such dictionary and stream
+        # their rows, which only yield cells present in the XML or the fillers between.
+        cells = getattr(worksheet, "_cells", None)
+        if cells is None:
+            return {
+                (cell.row, cell.column): cell.value
+                for row in worksheet.iter_rows()
+                for cell in row
+                if cell.value is not None
+            }
+        return {
+            position: cell.value
+            for position, cell in cells.items()
+            if cell.value is not None
+        }
+
+    @staticmethod
+    def _extract_sheet_data_from_buffer(sheet_buffer: SheetCellBuffer) -> SheetData:
+        """Build the SheetData of a streamed sheet, covering the sheet from A1 as iter_rows does."""
+        Instrumentation.count("cells_visited", len(sheet_buffer.rows))
+        return SheetData.from_cells(
+            sheet_buffer.sheet_name,
+            sheet_buffer.max_row,
+            sheet_buffer.max_column,
+            sheet_buffer.rows,
+            sheet_buffer.columns,
+            sheet_buffer.values,
+            sheet_buffer.formulas,
+        )